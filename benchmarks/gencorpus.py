@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir))
+
+import hlrepack
+import hlvpk
+
+args = None
+
+FORMATS = ["pak", "wad", "vpk", "zip"]
+
+# Size of the block of random bytes that file contents are sliced from.
+RANDOM_BLOCK_SIZE = 1 << 20
+
+CHUNK_SIZE = 1 << 20
+
+PAK_MAX_NAME_LENGTH = 55
+WAD_MAX_NAME_LENGTH = 15
+WAD_LUMP_MIPTEX = 0x43
+
+
+def main():
+    global args
+    args = parse_arguments()
+
+    rng = random.Random(args.seed)
+    random_block = bytes(bytearray(rng.getrandbits(8)
+            for _ in range(RANDOM_BLOCK_SIZE)))
+    byte_count = 0
+
+    if args.format == "pak":
+        byte_count = write_pak(args.output, rng, random_block)
+    elif args.format == "wad":
+        byte_count = write_wad(args.output, rng, random_block)
+    elif args.format == "vpk":
+        byte_count = write_vpk(args.output, rng, random_block)
+    else:
+        byte_count = write_zip(args.output, rng, random_block)
+
+    print("Wrote {0} file{1} ({2} B) to {3}.".format(args.count,
+            "" if args.count == 1 else "s", byte_count, args.output))
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Write a synthetic "
+            "package for benchmarking. The same arguments and seed always "
+            "produce the same package.")
+
+    parser.add_argument('format', choices=FORMATS,
+            help='Package format. WAD packages hold WAD3 textures.')
+
+    parser.add_argument('output',
+            help='Package to write. For VPK, the path without the '
+            '"_dir.vpk" suffix.')
+
+    parser.add_argument('-n', '--count', type=int, default=1000,
+            help='Number of files.')
+
+    parser.add_argument('--distribution', default='lognormal',
+            choices=('fixed', 'uniform', 'lognormal'),
+            help='File size distribution: all --size, uniform between 0 '
+            'and twice --size, or log-normal with median --size.')
+
+    parser.add_argument('--size', type=int, default=16 << 10,
+            help='Typical file size in bytes, see --distribution.')
+
+    parser.add_argument('--sigma', type=float, default=1.5,
+            help='Standard deviation of log(size) for the log-normal '
+            'distribution.')
+
+    parser.add_argument('--max-size', type=int, default=64 << 20,
+            help='Maximum file size in bytes.')
+
+    parser.add_argument('--depth', type=int, default=3,
+            help='Directory depth. Ignored for WAD, which is flat.')
+
+    parser.add_argument('--fanout', type=int, default=8,
+            help='Number of subdirectories per directory.')
+
+    parser.add_argument('--compressibility', type=float, default=0.5,
+            help='Fraction of each file that is zeros rather than random '
+            'bytes, from 0 (incompressible) to 1.')
+
+    parser.add_argument('-c', '--compression', default='store',
+            choices=sorted(hlrepack.COMPRESSION_METHODS),
+            help='Compression method for ZIP entries.')
+
+    parser.add_argument('--seed', type=int, default=0,
+            help='Random seed.')
+
+    return parser
+
+
+def parse_arguments():
+    parser = get_argument_parser()
+    args = parser.parse_args()
+
+    if args.count < 0:
+        parser.error("--count must not be negative.")
+
+    if not 0 <= args.compressibility <= 1:
+        parser.error("--compressibility must be between 0 and 1.")
+
+    if args.depth < 0 or args.fanout < 1:
+        parser.error("--depth must not be negative and --fanout must be "
+                "at least 1.")
+
+    if args.compression == "lzma" and hlrepack.lzma is None:
+        parser.error("LZMA compression requires the lzma module.")
+
+    return args
+
+
+def get_size(rng):
+    """Returns a random file size according to args."""
+    if args.distribution == "fixed":
+        size = args.size
+    elif args.distribution == "uniform":
+        size = rng.randint(0, 2 * args.size)
+    else:
+        size = int(rng.lognormvariate(math.log(max(args.size, 1)),
+                args.sigma))
+
+    return min(size, args.max_size)
+
+
+def get_path(rng, index, extension):
+    """Returns a random path for the index-th file."""
+    parts = ["d{0:x}".format(rng.randrange(args.fanout))
+            for _ in range(args.depth)]
+    parts.append("f{0:x}.{1}".format(index, extension))
+    return "/".join(parts)
+
+
+def iter_data(rng, size, random_block):
+    """Yields size bytes of file contents in chunks.
+
+    Each chunk is args.compressibility zeros, and otherwise a slice of
+    random_block at a random offset.
+    """
+    while size > 0:
+        length = min(size, CHUNK_SIZE)
+        random_length = int(round(length * (1 - args.compressibility)))
+        offset = rng.randrange(RANDOM_BLOCK_SIZE - random_length + 1)
+        yield (random_block[offset:offset + random_length] +
+                b"\0" * (length - random_length))
+        size -= length
+
+
+def write_pak(path, rng, random_block):
+    """Writes a Quake PAK package and returns the number of bytes stored."""
+    entries = []
+    byte_count = 0
+
+    with open(path, "wb") as f:
+        # The header is rewritten once the directory offset is known.
+        f.write(struct.pack("<4sII", b"PACK", 0, 0))
+        offset = 12
+
+        for index in range(args.count):
+            name = get_path(rng, index, "dat").encode("ascii")
+
+            if len(name) > PAK_MAX_NAME_LENGTH:
+                raise ValueError("PAK names are limited to {0} characters, "
+                        "reduce --depth.".format(PAK_MAX_NAME_LENGTH))
+
+            size = get_size(rng)
+
+            for chunk in iter_data(rng, size, random_block):
+                f.write(chunk)
+
+            entries.append(struct.pack("<56sII", name, offset, size))
+            offset += size
+            byte_count += size
+
+        for entry in entries:
+            f.write(entry)
+
+        f.seek(0)
+        f.write(struct.pack("<4sII", b"PACK", offset, 64 * len(entries)))
+
+    return byte_count
+
+
+def write_wad(path, rng, random_block):
+    """Writes a WAD3 package of textures and returns the bytes stored.
+
+    Texture dimensions are multiples of 16, picked so that the lump
+    (four mip levels and a palette) is close to a random file size.
+    """
+    entries = []
+    byte_count = 0
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"WAD3", 0, 0))
+        offset = 12
+
+        for index in range(args.count):
+            name = "t{0:x}".format(index).encode("ascii")
+
+            if len(name) > WAD_MAX_NAME_LENGTH:
+                raise ValueError("Too many textures for WAD3 names.")
+
+            # Mip levels take 85/64 bytes per pixel of the full image.
+            pixels = get_size(rng) * 64 // 85
+            side = max(1, int(round(math.sqrt(pixels) / 16))) * 16
+            width = height = side
+            lump = bytearray(struct.pack("<16sII", name, width, height))
+            mip_offset = 40
+
+            for level in range(4):
+                lump += struct.pack("<I", mip_offset)
+                mip_offset += (width >> level) * (height >> level)
+
+            for chunk in iter_data(rng, mip_offset - 40, random_block):
+                lump += chunk
+
+            palette_offset = rng.randrange(RANDOM_BLOCK_SIZE - 768)
+            lump += struct.pack("<H", 256)
+            lump += random_block[palette_offset:palette_offset + 768]
+            lump += b"\0\0"
+
+            f.write(lump)
+            entries.append(struct.pack("<IIIBBH16s", offset, len(lump),
+                    len(lump), WAD_LUMP_MIPTEX, 0, 0, name))
+            offset += len(lump)
+            byte_count += len(lump)
+
+        for entry in entries:
+            f.write(entry)
+
+        f.seek(0)
+        f.write(struct.pack("<4sII", b"WAD3", len(entries), offset))
+
+    return byte_count
+
+
+def write_vpk(path, rng, random_block):
+    """Writes a VPK package with hlvpk and returns the bytes stored."""
+    writer = hlvpk.VPKWriter(path)
+    byte_count = 0
+
+    for index in range(args.count):
+        size = get_size(rng)
+        writer.add_file(get_path(rng, index, "dat"), size,
+                iter_data(rng, size, random_block))
+        byte_count += size
+
+    writer.close()
+    return byte_count
+
+
+def write_zip(path, rng, random_block):
+    """Writes a ZIP archive with hlrepack and returns the bytes stored."""
+    method = hlrepack.COMPRESSION_METHODS[args.compression]
+    byte_count = 0
+
+    with open(path, "wb") as f:
+        writer = hlrepack.ZipWriter(f)
+
+        for index in range(args.count):
+            size = get_size(rng)
+            data = bytearray()
+
+            for chunk in iter_data(rng, size, random_block):
+                data += chunk
+
+            entry_method, crc, payload = hlrepack.compress(data, method, 6)
+            writer.write_entry(get_path(rng, index, "dat"), entry_method,
+                    crc, size, payload)
+            byte_count += size
+
+        writer.close()
+
+    return byte_count
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1057 @@
+"""
+A pure Python stand-in for the HLLib C library.
+
+MockLibrary implements the functions hllib.py calls, over a synthetic VPK
+package held in memory. Items are generated from a seed, and stream reads
+copy from a small block of random bytes, so the mock does close to no
+work of its own. Timing or profiling hllib.py against it measures the
+cost of the binding alone (item wrappers, argument conversion, string
+decoding, etc.), and works on hosts without the C library.
+
+Usage:
+    import mockhl
+    hl = mockhl.import_hllib(mockhl.MockLibrary(count=10000))
+
+    hl.initialize()
+    package_id = hl.Package.create_package(hl.HLPackageType.HL_PACKAGE_VPK)
+    hl.Package.bind_package(package_id)
+    hl.Package.open_file("synthetic.vpk", hl.HLFileMode.HL_MODE_READ)
+
+The package name passed to open_file() is ignored; every package opened
+serves the same tree. Streams are read-only.
+"""
+
+import ctypes
+import fnmatch
+import functools
+import os
+import random
+import zlib
+
+# The C library version the mock claims to be, see HL_VERSION_NUMBER.
+VERSION_NUMBER = (2 << 24) | (4 << 16) | (5 << 8) | 0
+VERSION_STRING = b"2.4.5"
+
+# Size of the block of random bytes that file contents are copied from.
+BLOCK_SIZE = 1 << 16
+
+# Bytes processed between progress callbacks, as HLLib does.
+COPY_BUFFER_SIZE = 131072
+VIEW_SIZE = 131072
+
+# Values of the HLLib enumerations used by the mock.
+HL_VERSION = 0
+HL_ERROR = 1
+HL_ERROR_SYSTEM = 2
+HL_ERROR_SHORT_FORMATED = 3
+HL_ERROR_LONG_FORMATED = 4
+HL_PROC_EXTRACT_ITEM_START = 12
+HL_PROC_EXTRACT_ITEM_END = 13
+HL_PROC_EXTRACT_FILE_PROGRESS = 14
+HL_PROC_VALIDATE_FILE_PROGRESS = 15
+HL_OVERWRITE_FILES = 16
+HL_PACKAGE_BOUND = 17
+HL_PACKAGE_ID = 18
+HL_PACKAGE_SIZE = 19
+HL_PACKAGE_TOTAL_ALLOCATIONS = 20
+HL_PACKAGE_TOTAL_MEMORY_ALLOCATED = 21
+HL_PACKAGE_TOTAL_MEMORY_USED = 22
+HL_READ_ENCRYPTED = 23
+HL_FORCE_DEFRAGMENT = 24
+HL_PROC_DEFRAGMENT_PROGRESS = 25
+HL_PROC_DEFRAGMENT_PROGRESS_EX = 26
+
+HL_MODE_READ = 0x01
+HL_MODE_WRITE = 0x02
+HL_MODE_NO_FILEMAPPING = 0x10
+HL_MODE_QUICK_FILEMAPPING = 0x20
+
+HL_SEEK_BEGINNING = 0
+HL_SEEK_CURRENT = 1
+HL_SEEK_END = 2
+
+HL_ITEM_FOLDER = 1
+HL_ITEM_FILE = 2
+
+HL_ORDER_DESCENDING = 1
+HL_FIELD_SIZE = 1
+
+HL_FIND_FILES = 0x01
+HL_FIND_FOLDERS = 0x02
+HL_FIND_NO_RECURSE = 0x04
+HL_FIND_CASE_SENSITIVE = 0x08
+HL_FIND_MODE_STRING = 0x10
+HL_FIND_MODE_SUBSTRING = 0x20
+
+HL_STREAM_MAPPING = 3
+
+HL_PACKAGE_NONE = 0
+HL_PACKAGE_VPK = 9
+
+HL_ATTRIBUTE_BOOLEAN = 1
+HL_ATTRIBUTE_INTEGER = 2
+HL_ATTRIBUTE_UNSIGNED_INTEGER = 3
+HL_ATTRIBUTE_FLOAT = 4
+HL_ATTRIBUTE_STRING = 5
+
+HL_VALIDATES_OK = 0
+HL_VALIDATES_CANCELED = 4
+
+# Attributes of the package and of its items, as (name, value, hexadecimal)
+# where value is a function of the library and the item.
+PACKAGE_ATTRIBUTES = [
+    (b"Archives", lambda library: 1, False),
+    (b"Version", lambda library: 2, False),
+]
+
+ITEM_ATTRIBUTES = [
+    (b"Preload Bytes", lambda library, item: 0, False),
+    (b"Archive", lambda library, item: 0, False),
+    (b"CRC", lambda library, item: library._get_crc(item), True),
+]
+
+
+class _Item(object):
+    """A file or folder of the synthetic package."""
+
+    __slots__ = ["handle", "name", "parent", "children", "names", "size",
+            "offset", "crc", "order", "end"]
+
+    def __init__(self, handle, name, parent, size=None, offset=0):
+        self.handle = handle
+        self.name = name
+        self.parent = parent
+        # Folders have children, and map lower case names to children.
+        self.children = [] if size is None else None
+        self.names = {} if size is None else None
+        self.size = size
+        self.offset = offset
+        self.crc = None
+        # Position in a depth first walk of the tree, and the position
+        # after the item's last descendant.
+        self.order = 0
+        self.end = 0
+
+
+class _Stream(object):
+    __slots__ = ["item", "opened", "mode", "pointer"]
+
+    def __init__(self, item):
+        self.item = item
+        self.opened = False
+        self.mode = 0
+        self.pointer = 0
+
+
+class _Package(object):
+    __slots__ = ["package_type", "opened", "mode"]
+
+    def __init__(self, package_type):
+        self.package_type = package_type
+        self.opened = False
+        self.mode = 0
+
+
+def import_hllib(library=None):
+    """Imports hllib and loads library in place of the C library.
+
+    Args:
+        library: The MockLibrary to use, or None for one with the
+            default tree.
+
+    Returns:
+        The hllib module.
+
+    Raises:
+        hllib.HLError: If hllib already loaded another library.
+    """
+    import hllib
+    hllib.load(MockLibrary() if library is None else library)
+    return hllib
+
+
+def _handle(obj):
+    """Returns the integer handle of an item or stream argument."""
+    obj = getattr(obj, "_as_parameter_", obj)
+
+    if isinstance(obj, ctypes.c_void_p):
+        return obj.value
+
+    return obj
+
+
+def _target(pointer):
+    """Returns the ctypes object a byref() or pointer() argument refers to."""
+    try:
+        return pointer._obj
+    except AttributeError:
+        return pointer.contents
+
+
+def _address(data):
+    """Returns the address of a buffer argument."""
+    if isinstance(data, int):
+        return data
+
+    # byref() of the first element.
+    data = getattr(data, "_obj", data)
+    return ctypes.addressof(data)
+
+
+def _matches(name, pattern, find_type):
+    if not find_type & HL_FIND_CASE_SENSITIVE:
+        name = name.lower()
+        pattern = pattern.lower()
+
+    if find_type & HL_FIND_MODE_STRING:
+        return name == pattern
+    elif find_type & HL_FIND_MODE_SUBSTRING:
+        return pattern in name
+    else:
+        return fnmatch.fnmatchcase(name, pattern)
+
+
+class MockLibrary(object):
+    """A synthetic VPK package behind HLLib's C interface.
+
+    Files are laid out like benchmarks/gencorpus.py lays them out:
+    depth levels of directories named d0, d1, ... with fanout
+    subdirectories each, and files named f0.dat, f1.dat, ... placed in
+    random directories at the deepest level. The same arguments always
+    produce the same tree and contents.
+
+    Every hl* function is an attribute of the instance that accepts
+    argtypes and restype being set, like a ctypes function. Arguments
+    arrive unconverted, so handles may be wrapper objects, ctypes
+    objects or integers.
+    """
+
+    def __init__(self, count=1000, size=16 << 10, depth=3, fanout=8,
+            seed=0):
+        """Generates the tree.
+
+        Args:
+            count: The number of files.
+
+            size: The mean file size in bytes. Sizes are uniform between
+                0 and twice this.
+
+            depth: The number of directory levels.
+
+            fanout: The number of subdirectories per directory.
+
+            seed: The random seed.
+        """
+        rng = random.Random(seed)
+        block = bytes(bytearray(rng.getrandbits(8) for _ in range(BLOCK_SIZE)))
+        self._buffer = (ctypes.c_char * BLOCK_SIZE).from_buffer_copy(block)
+        self._buffer_address = ctypes.addressof(self._buffer)
+
+        # Handles index into _items. 0 is the null pointer.
+        self._items = [None]
+        self._order = []
+        self._root = self._add_item(b"root", None)
+
+        for index in range(count):
+            folder = self._root
+
+            for _ in range(depth):
+                name = "d{0:x}".format(rng.randrange(fanout)).encode("ascii")
+                child = folder.names.get(name)
+                folder = child or self._add_item(name, folder)
+
+            self._add_item("f{0:x}.dat".format(index).encode("ascii"),
+                    folder, rng.randint(0, 2 * size),
+                    rng.randrange(BLOCK_SIZE))
+
+        self._update_order()
+        self._size = sum(item.size for item in self._iter_files(self._root))
+
+        self._streams = {}
+        self._next_stream = 1
+        self._packages = {}
+        self._next_package = 0
+        self._bound = None
+        self._error = b""
+        self._options = {HL_OVERWRITE_FILES: False, HL_READ_ENCRYPTED: False,
+                HL_FORCE_DEFRAGMENT: False}
+        self._procs = {}
+
+        for name in dir(type(self)):
+            if name.startswith("hl"):
+                setattr(self, name,
+                        functools.partial(getattr(type(self), name), self))
+
+    def _add_item(self, name, parent, size=None, offset=0):
+        item = _Item(len(self._items), name, parent, size, offset)
+        self._items.append(item)
+
+        if parent is not None:
+            parent.children.append(item)
+            parent.names[name.lower()] = item
+
+        return item
+
+    def _update_order(self):
+        self._order = []
+
+        def visit(item):
+            item.order = len(self._order)
+            self._order.append(item)
+
+            for child in item.children or ():
+                visit(child)
+
+            item.end = len(self._order)
+
+        visit(self._root)
+
+    def _get_item(self, obj):
+        handle = _handle(obj)
+        return self._items[handle] if handle else None
+
+    def _get_stream(self, obj):
+        return self._streams.get(_handle(obj))
+
+    def _get_package(self):
+        return self._packages.get(self._bound)
+
+    def _fail(self, message, result=False):
+        self._error = message
+        return result
+
+    def _iter_files(self, folder):
+        for item in self._order[folder.order:folder.end]:
+            if item.children is None:
+                yield item
+
+    def _copy(self, item, position, address, count):
+        """Copies count bytes of item's contents from position."""
+        while count > 0:
+            offset = (item.offset + position) % BLOCK_SIZE
+            length = min(count, BLOCK_SIZE - offset)
+            ctypes.memmove(address, self._buffer_address + offset, length)
+            address += length
+            position += length
+            count -= length
+
+    def _read(self, item, position, count):
+        """Returns count bytes of item's contents from position."""
+        buf = ctypes.create_string_buffer(count)
+        self._copy(item, position, ctypes.addressof(buf), count)
+        return buf.raw
+
+    def _get_crc(self, item):
+        if item.crc is None:
+            crc = 0
+
+            for position in range(0, item.size, COPY_BUFFER_SIZE):
+                crc = zlib.crc32(self._read(item, position,
+                        min(COPY_BUFFER_SIZE, item.size - position)), crc)
+
+            item.crc = crc & 0xffffffff
+
+        return item.crc
+
+    def _get_path(self, item):
+        names = []
+
+        while item is not None:
+            names.append(item.name)
+            item = item.parent
+
+        return b"/".join(reversed(names))
+
+    def _progress(self, option, item, *args):
+        """Calls the progress callback for option, if any.
+
+        Returns:
+            Whether the callback asked to cancel.
+        """
+        proc = self._procs.get(option)
+
+        if proc is None:
+            return False
+
+        cancel = ctypes.c_ubyte(0)
+        proc(item.handle, *(args + (ctypes.byref(cancel),)))
+        return bool(cancel.value)
+
+    def _extract(self, item, path):
+        start = self._procs.get(HL_PROC_EXTRACT_ITEM_START)
+        end = self._procs.get(HL_PROC_EXTRACT_ITEM_END)
+        path = os.path.join(path, item.name)
+
+        if start is not None:
+            start(item.handle)
+
+        success = True
+
+        try:
+            if item.children is not None:
+                if not os.path.isdir(path):
+                    os.makedirs(path)
+
+                for child in item.children:
+                    if not self._extract(child, path):
+                        success = False
+
+                return success
+
+            with open(path, "wb") as f:
+                for position in range(0, item.size, COPY_BUFFER_SIZE):
+                    length = min(COPY_BUFFER_SIZE, item.size - position)
+                    f.write(self._read(item, position, length))
+
+                    if self._progress(HL_PROC_EXTRACT_FILE_PROGRESS, item,
+                            position + length, item.size):
+                        success = False
+                        break
+
+                if item.size == 0:
+                    self._progress(HL_PROC_EXTRACT_FILE_PROGRESS, item, 0, 0)
+
+            return success
+        except (IOError, OSError) as ex:
+            success = False
+            return self._fail(str(ex).encode("utf-8", "replace"))
+        finally:
+            if end is not None:
+                end(item.handle, success)
+
+    def _fill_attribute(self, pointer, description, value):
+        name, _, hexadecimal = description
+        attribute = _target(pointer)
+        attribute._attribute_type = HL_ATTRIBUTE_UNSIGNED_INTEGER
+        attribute._name = name
+        attribute._value.UnsignedInteger.value = value
+        attribute._value.UnsignedInteger.hexadecimal = hexadecimal
+        return True
+
+    def _get_option(self, option):
+        """Returns the value of a numeric option, or None."""
+        package = self._get_package()
+
+        if option == HL_VERSION:
+            return VERSION_NUMBER
+        elif option in self._options:
+            return self._options[option]
+        elif option == HL_PACKAGE_BOUND:
+            return package is not None
+        elif package is None:
+            return None
+        elif option == HL_PACKAGE_ID:
+            return self._bound
+        elif not package.opened:
+            return None
+
+        size = self._size
+
+        if package.mode & HL_MODE_NO_FILEMAPPING:
+            allocated = 0
+        elif package.mode & HL_MODE_QUICK_FILEMAPPING:
+            allocated = size
+        else:
+            allocated = min(size, VIEW_SIZE)
+
+        return {
+            HL_PACKAGE_SIZE: size,
+            HL_PACKAGE_TOTAL_ALLOCATIONS: 1 if allocated else 0,
+            HL_PACKAGE_TOTAL_MEMORY_ALLOCATED: allocated,
+            HL_PACKAGE_TOTAL_MEMORY_USED: allocated,
+        }.get(option)
+
+    def _get_validate(self, option, pointer, convert):
+        value = self._get_option(option)
+
+        if value is None:
+            return self._fail(b"Option not supported.")
+
+        _target(pointer).value = convert(value)
+        return True
+
+    # Initialization
+
+    def hlInitialize(self):
+        pass
+
+    def hlShutdown(self):
+        pass
+
+    # Get/Set
+
+    def hlGetBoolean(self, option):
+        return bool(self._get_option(option))
+
+    def hlGetBooleanValidate(self, option, pointer):
+        if option not in self._options and option != HL_PACKAGE_BOUND:
+            return self._fail(b"Option not supported.")
+
+        return self._get_validate(option, pointer, int)
+
+    def hlSetBoolean(self, option, value):
+        if option in self._options:
+            self._options[option] = bool(value)
+
+    def hlGetInteger(self, option):
+        return 0
+
+    def hlGetIntegerValidate(self, option, pointer):
+        return self._fail(b"Option not supported.")
+
+    def hlSetInteger(self, option, value):
+        pass
+
+    def hlGetUnsignedInteger(self, option):
+        return self._get_option(option) or 0
+
+    def hlGetUnsignedIntegerValidate(self, option, pointer):
+        return self._get_validate(option, pointer, int)
+
+    def hlSetUnsignedInteger(self, option, value):
+        pass
+
+    def hlGetLongLong(self, option):
+        return 0
+
+    def hlGetLongLongValidate(self, option, pointer):
+        return self._fail(b"Option not supported.")
+
+    def hlSetLongLong(self, option, value):
+        pass
+
+    def hlGetUnsignedLongLong(self, option):
+        return self._get_option(option) or 0
+
+    def hlGetUnsignedLongLongValidate(self, option, pointer):
+        return self._get_validate(option, pointer, int)
+
+    def hlSetUnsignedLongLong(self, option, value):
+        pass
+
+    def hlGetFloat(self, option):
+        return 0.0
+
+    def hlGetFloatValidate(self, option, pointer):
+        return self._fail(b"Option not supported.")
+
+    def hlSetFloat(self, option, value):
+        pass
+
+    def hlGetString(self, option):
+        if option == HL_VERSION:
+            return VERSION_STRING
+        elif option in (HL_ERROR, HL_ERROR_SHORT_FORMATED,
+                HL_ERROR_LONG_FORMATED):
+            return self._error
+        elif option == HL_ERROR_SYSTEM:
+            return b""
+
+        return None
+
+    def hlGetStringValidate(self, option, pointer):
+        value = self.hlGetString(option)
+
+        if value is None:
+            return self._fail(b"Option not supported.")
+
+        _target(pointer).value = value
+        return True
+
+    def hlSetString(self, option, value):
+        pass
+
+    def hlGetVoid(self, option):
+        proc = self._procs.get(option)
+        return None if proc is None else ctypes.cast(proc,
+                ctypes.c_void_p).value
+
+    def hlGetVoidValidate(self, option, pointer):
+        _target(pointer).value = self.hlGetVoid(option)
+        return True
+
+    def hlSetVoid(self, option, value):
+        self._procs[option] = value
+
+    # Attributes
+
+    def hlAttributeGetBoolean(self, pointer):
+        return _target(pointer)._value.Boolean.value
+
+    def hlAttributeSetBoolean(self, pointer, name, value):
+        self._set_attribute(pointer, name, HL_ATTRIBUTE_BOOLEAN, "Boolean",
+                value)
+
+    def hlAttributeGetInteger(self, pointer):
+        return _target(pointer)._value.Integer.value
+
+    def hlAttributeSetInteger(self, pointer, name, value):
+        self._set_attribute(pointer, name, HL_ATTRIBUTE_INTEGER, "Integer",
+                value)
+
+    def hlAttributeGetUnsignedInteger(self, pointer):
+        return _target(pointer)._value.UnsignedInteger.value
+
+    def hlAttributeSetUnsignedInteger(self, pointer, name, value,
+            hexadecimal):
+        attribute = self._set_attribute(pointer, name,
+                HL_ATTRIBUTE_UNSIGNED_INTEGER, "UnsignedInteger", value)
+        attribute._value.UnsignedInteger.hexadecimal = hexadecimal
+
+    def hlAttributeGetFloat(self, pointer):
+        return _target(pointer)._value.Float.value
+
+    def hlAttributeSetFloat(self, pointer, name, value):
+        self._set_attribute(pointer, name, HL_ATTRIBUTE_FLOAT, "Float", value)
+
+    def hlAttributeGetString(self, pointer):
+        return _target(pointer)._value.String.value
+
+    def hlAttributeSetString(self, pointer, name, value):
+        self._set_attribute(pointer, name, HL_ATTRIBUTE_STRING, "String",
+                value)
+
+    def _set_attribute(self, pointer, name, attribute_type, field, value):
+        attribute = _target(pointer)
+        attribute._attribute_type = attribute_type
+
+        if name is not None:
+            attribute._name = name
+
+        getattr(attribute._value, field).value = value
+        return attribute
+
+    # Directory Item
+
+    def hlItemGetType(self, obj):
+        item = self._get_item(obj)
+
+        if item is None:
+            return 0
+
+        return HL_ITEM_FILE if item.children is None else HL_ITEM_FOLDER
+
+    def hlItemGetName(self, obj):
+        return self._get_item(obj).name
+
+    def hlItemGetID(self, obj):
+        return self._get_item(obj).handle
+
+    def hlItemGetData(self, obj):
+        return None
+
+    def hlItemGetPackage(self, obj):
+        return 0xffffffff if self._bound is None else self._bound
+
+    def hlItemGetParent(self, obj):
+        parent = self._get_item(obj).parent
+        return None if parent is None else parent.handle
+
+    def hlItemGetSize(self, obj, pointer):
+        item = self._get_item(obj)
+
+        if item.children is None:
+            _target(pointer).value = item.size
+        else:
+            _target(pointer).value = self.hlFolderGetSizeEx(obj, True)
+
+        return True
+
+    hlItemGetSizeEx = hlItemGetSize
+    hlItemGetSizeOnDisk = hlItemGetSize
+    hlItemGetSizeOnDiskEx = hlItemGetSize
+
+    def hlItemGetPath(self, obj, buf, size):
+        buf.value = self._get_path(self._get_item(obj))[:size - 1]
+
+    def hlItemExtract(self, obj, path):
+        return self._extract(self._get_item(obj), path)
+
+    # Directory Folder
+
+    def hlFolderGetCount(self, obj):
+        return len(self._get_item(obj).children)
+
+    def hlFolderGetItem(self, obj, index):
+        children = self._get_item(obj).children
+
+        if not 0 <= index < len(children):
+            return self._fail(b"Index out of bounds.", None)
+
+        return children[index].handle
+
+    def hlFolderGetItemByName(self, obj, name, find_type):
+        item = self._get_item(obj).names.get(name.lower())
+
+        if item is None or (find_type & HL_FIND_CASE_SENSITIVE and
+                item.name != name):
+            return None
+
+        if item.children is None:
+            return item.handle if find_type & HL_FIND_FILES else None
+
+        return item.handle if find_type & HL_FIND_FOLDERS else None
+
+    def hlFolderGetItemByPath(self, obj, path, find_type):
+        names = [name for name in path.replace(b"\\", b"/").split(b"/")
+                if name]
+        item = self._get_item(obj)
+
+        for name in names[:-1]:
+            item = item.names.get(name.lower())
+
+            if item is None or item.children is None:
+                return None
+
+        if not names:
+            return None
+
+        return self.hlFolderGetItemByName(item.handle, names[-1], find_type)
+
+    def hlFolderSort(self, obj, sort_field, sort_order, recurse):
+        folders = [self._get_item(obj)]
+
+        if sort_field == HL_FIELD_SIZE:
+            key = lambda item: item.size or 0
+        else:
+            key = lambda item: item.name.lower()
+
+        while folders:
+            folder = folders.pop()
+            folder.children.sort(key=key,
+                    reverse=sort_order == HL_ORDER_DESCENDING)
+
+            if recurse:
+                folders.extend(item for item in folder.children
+                        if item.children is not None)
+
+        self._update_order()
+
+    def _find(self, folder, start, pattern, find_type):
+        for item in self._order[start:folder.end]:
+            if find_type & HL_FIND_NO_RECURSE and item.parent is not folder:
+                continue
+
+            if item.children is None:
+                if not find_type & HL_FIND_FILES:
+                    continue
+            elif not find_type & HL_FIND_FOLDERS:
+                continue
+
+            if _matches(item.name, pattern, find_type):
+                return item.handle
+
+        return None
+
+    def hlFolderFindFirst(self, obj, pattern, find_type):
+        folder = self._get_item(obj)
+        return self._find(folder, folder.order + 1, pattern, find_type)
+
+    def hlFolderFindNext(self, obj, relative, pattern, find_type):
+        folder = self._get_item(obj)
+        return self._find(folder, self._get_item(relative).order + 1,
+                pattern, find_type)
+
+    def hlFolderGetSize(self, obj, recurse):
+        folder = self._get_item(obj)
+
+        if recurse:
+            return sum(item.size for item in self._iter_files(folder))
+
+        return sum(item.size for item in folder.children
+                if item.children is None)
+
+    hlFolderGetSizeEx = hlFolderGetSize
+    hlFolderGetSizeOnDisk = hlFolderGetSize
+    hlFolderGetSizeOnDiskEx = hlFolderGetSize
+
+    def hlFolderGetFolderCount(self, obj, recurse):
+        folder = self._get_item(obj)
+        items = (self._order[folder.order + 1:folder.end] if recurse
+                else folder.children)
+        return sum(1 for item in items if item.children is not None)
+
+    def hlFolderGetFileCount(self, obj, recurse):
+        folder = self._get_item(obj)
+        items = (self._order[folder.order + 1:folder.end] if recurse
+                else folder.children)
+        return sum(1 for item in items if item.children is None)
+
+    # Directory File
+
+    def hlFileGetExtractable(self, obj):
+        return 1
+
+    def hlFileGetValidation(self, obj):
+        item = self._get_item(obj)
+
+        for position in range(0, item.size, COPY_BUFFER_SIZE):
+            if self._progress(HL_PROC_VALIDATE_FILE_PROGRESS, item,
+                    min(position + COPY_BUFFER_SIZE, item.size), item.size):
+                return HL_VALIDATES_CANCELED
+
+        return HL_VALIDATES_OK
+
+    def hlFileGetSize(self, obj):
+        return self._get_item(obj).size
+
+    hlFileGetSizeOnDisk = hlFileGetSize
+
+    def hlFileCreateStream(self, obj, pointer):
+        handle = self._next_stream
+        self._next_stream += 1
+        self._streams[handle] = _Stream(self._get_item(obj))
+        _target(pointer).value = handle
+        return True
+
+    def hlFileReleaseStream(self, obj, stream):
+        self._streams.pop(_handle(stream), None)
+
+    # Stream
+
+    def hlStreamGetType(self, obj):
+        return HL_STREAM_MAPPING
+
+    def hlStreamGetOpened(self, obj):
+        return self._get_stream(obj).opened
+
+    def hlStreamGetMode(self, obj):
+        return self._get_stream(obj).mode
+
+    def hlStreamOpen(self, obj, mode):
+        stream = self._get_stream(obj)
+
+        if mode & HL_MODE_WRITE or not mode & HL_MODE_READ:
+            return self._fail(b"Stream is read-only.")
+
+        stream.opened = True
+        stream.mode = mode
+        stream.pointer = 0
+        return True
+
+    def hlStreamClose(self, obj):
+        stream = self._get_stream(obj)
+        stream.opened = False
+        stream.mode = 0
+
+    def hlStreamGetStreamSize(self, obj):
+        return self._get_stream(obj).item.size
+
+    hlStreamGetStreamSizeEx = hlStreamGetStreamSize
+
+    def hlStreamGetStreamPointer(self, obj):
+        return self._get_stream(obj).pointer
+
+    hlStreamGetStreamPointerEx = hlStreamGetStreamPointer
+
+    def hlStreamSeek(self, obj, offset, seek_mode):
+        stream = self._get_stream(obj)
+
+        if not stream.opened:
+            return 0
+
+        if seek_mode == HL_SEEK_CURRENT:
+            offset += stream.pointer
+        elif seek_mode == HL_SEEK_END:
+            offset += stream.item.size
+
+        stream.pointer = max(0, min(offset, stream.item.size))
+        return stream.pointer
+
+    hlStreamSeekEx = hlStreamSeek
+
+    def hlStreamReadChar(self, obj, pointer):
+        stream = self._get_stream(obj)
+
+        if not stream.opened or stream.pointer >= stream.item.size:
+            return False
+
+        _target(pointer).value = self._read(stream.item, stream.pointer, 1)
+        stream.pointer += 1
+        return True
+
+    def hlStreamRead(self, obj, data, count):
+        stream = self._get_stream(obj)
+
+        if not stream.opened:
+            return 0
+
+        count = max(0, min(count, stream.item.size - stream.pointer))
+        self._copy(stream.item, stream.pointer, _address(data), count)
+        stream.pointer += count
+        return count
+
+    def hlStreamWriteChar(self, obj, char):
+        return self._fail(b"Stream is read-only.")
+
+    def hlStreamWrite(self, obj, data, count):
+        return self._fail(b"Stream is read-only.", 0)
+
+    # Package
+
+    def hlBindPackage(self, package_id):
+        if package_id not in self._packages:
+            return self._fail(b"Invalid package.")
+
+        self._bound = package_id
+        return True
+
+    def hlGetPackageTypeFromName(self, name):
+        return HL_PACKAGE_VPK
+
+    def hlGetPackageTypeFromMemory(self, buf, size):
+        return HL_PACKAGE_VPK
+
+    def hlGetPackageTypeFromStream(self, stream):
+        return HL_PACKAGE_VPK
+
+    def hlCreatePackage(self, package_type, pointer):
+        if package_type == HL_PACKAGE_NONE:
+            return self._fail(b"Invalid package type.")
+
+        package_id = self._next_package
+        self._next_package += 1
+        self._packages[package_id] = _Package(package_type)
+        _target(pointer).value = package_id
+        return True
+
+    def hlDeletePackage(self, package_id):
+        self._packages.pop(package_id, None)
+
+        if self._bound == package_id:
+            self._bound = None
+
+    def hlPackageGetType(self):
+        package = self._get_package()
+        return HL_PACKAGE_NONE if package is None else package.package_type
+
+    def hlPackageGetExtension(self):
+        return None if self._get_package() is None else b"vpk"
+
+    def hlPackageGetDescription(self):
+        return (None if self._get_package() is None
+                else b"Valve Package File (mock)")
+
+    def hlPackageGetOpened(self):
+        package = self._get_package()
+        return package is not None and package.opened
+
+    def _open(self, mode):
+        package = self._get_package()
+
+        if package is None:
+            return self._fail(b"No package bound.")
+
+        package.opened = True
+        package.mode = mode
+        return True
+
+    def hlPackageOpenFile(self, name, mode):
+        return self._open(mode)
+
+    def hlPackageOpenMemory(self, data, size, mode):
+        return self._open(mode)
+
+    def hlPackageOpenProc(self, user_data, mode):
+        return self._open(mode)
+
+    def hlPackageOpenStream(self, stream, mode):
+        return self._open(mode)
+
+    def hlPackageClose(self):
+        package = self._get_package()
+
+        if package is not None:
+            package.opened = False
+            package.mode = 0
+
+    def hlPackageDefragment(self):
+        if not self.hlPackageGetOpened():
+            return self._fail(b"Package not opened.")
+
+        files = list(self._iter_files(self._root))
+        bytes_total = sum(item.size for item in files)
+        bytes_done = 0
+
+        for index, item in enumerate(files):
+            bytes_done += item.size
+
+            for option in (HL_PROC_DEFRAGMENT_PROGRESS,
+                    HL_PROC_DEFRAGMENT_PROGRESS_EX):
+                if self._progress(option, item, index + 1, len(files),
+                        bytes_done, bytes_total):
+                    return False
+
+        return True
+
+    def hlPackageGetRoot(self):
+        if not self.hlPackageGetOpened():
+            return self._fail(b"Package not opened.", None)
+
+        return self._root.handle
+
+    def hlPackageGetAttributeCount(self):
+        return len(PACKAGE_ATTRIBUTES)
+
+    def hlPackageGetAttributeName(self, index):
+        if not 0 <= index < len(PACKAGE_ATTRIBUTES):
+            return None
+
+        return PACKAGE_ATTRIBUTES[index][0]
+
+    def hlPackageGetAttribute(self, index, pointer):
+        if not 0 <= index < len(PACKAGE_ATTRIBUTES):
+            return self._fail(b"Invalid attribute.")
+
+        attribute = PACKAGE_ATTRIBUTES[index]
+        return self._fill_attribute(pointer, attribute, attribute[1](self))
+
+    def hlPackageGetItemAttributeCount(self):
+        return len(ITEM_ATTRIBUTES)
+
+    def hlPackageGetItemAttributeName(self, index):
+        if not 0 <= index < len(ITEM_ATTRIBUTES):
+            return None
+
+        return ITEM_ATTRIBUTES[index][0]
+
+    def hlPackageGetItemAttribute(self, obj, index, pointer):
+        item = self._get_item(obj)
+
+        if not 0 <= index < len(ITEM_ATTRIBUTES) or item.children is not None:
+            return self._fail(b"Invalid attribute.")
+
+        attribute = ITEM_ATTRIBUTES[index]
+        return self._fill_attribute(pointer, attribute,
+                attribute[1](self, item))
+
+    def hlPackageGetExtractable(self, obj, pointer):
+        _target(pointer).value = 1
+        return True
+
+    def hlPackageGetFileSize(self, obj, pointer):
+        _target(pointer).value = self._get_item(obj).size
+        return True
+
+    hlPackageGetFileSizeOnDisk = hlPackageGetFileSize
+
+    def hlPackageCreateStream(self, obj, pointer):
+        return self.hlFileCreateStream(obj, pointer)
+
+    def hlPackageReleaseStream(self, stream):
+        self._streams.pop(_handle(stream), None)
+
+    # Package type specific
+
+    def hlNCFFileGetRootPath(self):
+        return None
+
+    def hlNCFFileSetRootPath(self, root_path=None):
+        pass
+
+    def hlWADFileGetImageSizePaletted(self, obj, *pointers):
+        return self._fail(b"Not a WAD package.")
+
+    hlWADFileGetImageDataPaletted = hlWADFileGetImageSizePaletted
+    hlWADFileGetImageSize = hlWADFileGetImageSizePaletted
+    hlWADFileGetImageData = hlWADFileGetImageSizePaletted
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir))
+
+import mockhl
+
+args = None
+hl = None
+
+timer = getattr(time, "perf_counter", time.time)
+
+CALLS = ["get_item", "get_name", "get_path", "get_item_by_name",
+        "stream_open", "stream_read", "attribute_get", "item_attribute",
+        "walk"]
+
+
+def main():
+    global args, hl
+    args = parse_arguments()
+
+    library = mockhl.MockLibrary(count=args.count, seed=args.seed)
+    hl = mockhl.import_hllib(library)
+    hl.initialize()
+
+    try:
+        package_id = hl.Package.create_package(
+                hl.HLPackageType.HL_PACKAGE_VPK)
+        hl.Package.bind_package(package_id)
+        hl.Package.open_file("mock.vpk", hl.HLFileMode.HL_MODE_READ)
+
+        try:
+            results = [time_call(name) for name in args.call]
+        finally:
+            hl.Package.close()
+            hl.Package.delete_package(package_id)
+
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "files": args.count,
+            "repeat": args.repeat,
+            "results": results,
+        }
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write("\n")
+        else:
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+            print()
+
+    finally:
+        hl.shutdown()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Time the per-call "
+            "overhead of hllib.py's wrappers against the mock C library in "
+            "benchmarks/mockhl.py, and write the results as JSON. The mock "
+            "does next to no work, so the times are those of the binding.")
+
+    parser.add_argument('-c', '--call', action='append', choices=CALLS,
+            help='Call(s) to time (default: all).')
+
+    parser.add_argument('-n', '--count', type=int, default=1000,
+            help='Number of files in the mock package.')
+
+    parser.add_argument('-N', '--number', type=int, default=100000,
+            help='Number of calls per timed run.')
+
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+            help='Number of timed runs of each call.')
+
+    parser.add_argument('-o', '--output',
+            help='File to write the JSON results to (default: stdout).')
+
+    parser.add_argument('--seed', type=int, default=0,
+            help='Random seed for the mock package.')
+
+    return parser
+
+
+def parse_arguments():
+    parser = get_argument_parser()
+    args = parser.parse_args()
+
+    if args.count < 1:
+        parser.error("--count must be at least 1.")
+
+    if args.number < 1 or args.repeat < 1:
+        parser.error("--number and --repeat must be at least 1.")
+
+    if not args.call:
+        args.call = CALLS
+
+    return args
+
+
+def time_call(name):
+    """Times args.repeat runs of the named call.
+
+    Returns:
+        A result dict with the nanoseconds per call of each run.
+    """
+    function, calls = globals()["bench_" + name]()
+    per_call = []
+
+    for _ in range(args.repeat):
+        start = timer()
+        function()
+        per_call.append((timer() - start) / calls * 1e9)
+
+    per_call.sort()
+    result = {
+        "call": name,
+        "calls": calls,
+        "ns_per_call": per_call,
+        "min": per_call[0],
+        "median": per_call[len(per_call) // 2],
+    }
+
+    print("  {0}: {1:.0f} ns/call".format(name, result["median"]),
+            file=sys.stderr)
+
+    return result
+
+
+# Each bench_* function sets up a call and returns a function making
+# args.number calls, along with that number.
+
+def get_folder():
+    """Returns the folder with the most items."""
+    folders = [hl.Package.get_root()]
+    best = folders[0]
+
+    while folders:
+        folder = folders.pop()
+
+        if folder.get_count() > best.get_count():
+            best = folder
+
+        for index in range(folder.get_count()):
+            item = folder.get_item(index)
+
+            if isinstance(item, hl.HLDirectoryFolder):
+                folders.append(item)
+
+    return best
+
+
+def get_file():
+    return next(hl.Package.get_root().iter_files())[1]
+
+
+def bench_get_item():
+    folder = get_folder()
+    count = folder.get_count()
+    indices = [index % count for index in range(args.number)]
+
+    def run():
+        get_item = folder.get_item
+
+        for index in indices:
+            get_item(index)
+
+    return run, args.number
+
+
+def bench_get_name():
+    get_name = get_file().get_name
+
+    def run():
+        for _ in range(args.number):
+            get_name()
+
+    return run, args.number
+
+
+def bench_get_path():
+    get_path = get_file().get_path
+
+    def run():
+        for _ in range(args.number):
+            get_path()
+
+    return run, args.number
+
+
+def bench_get_item_by_name():
+    folder = get_folder()
+    names = [folder.get_item(index).get_name()
+            for index in range(folder.get_count())]
+    names = [names[index % len(names)] for index in range(args.number)]
+
+    def run():
+        get_item_by_name = folder.get_item_by_name
+
+        for name in names:
+            get_item_by_name(name, hl.HLFindType.HL_FIND_ALL)
+
+    return run, args.number
+
+
+def bench_stream_open():
+    directory_file = get_file()
+
+    def run():
+        open_stream = directory_file.open
+
+        for _ in range(args.number):
+            with open_stream():
+                pass
+
+    return run, args.number
+
+
+def bench_stream_read():
+    directory_file = get_file()
+    stream = directory_file.create_stream()
+    stream.open(hl.HLFileMode.HL_MODE_READ)
+    buf = bytearray(64)
+
+    def run():
+        read = stream.read
+        seek = stream.seek
+
+        for _ in range(args.number):
+            if not read(buf, 64)[0]:
+                seek(0, hl.HLSeekMode.HL_SEEK_BEGINNING)
+
+    return run, args.number
+
+
+def bench_attribute_get():
+    attribute = hl.Package.get_item_attribute(get_file(),
+            hl.HLPackageAttribute.HL_VPK_ITEM_CRC)
+
+    def run():
+        get = attribute.get
+
+        for _ in range(args.number):
+            get()
+
+    return run, args.number
+
+
+def bench_item_attribute():
+    directory_file = get_file()
+    crc = hl.HLPackageAttribute.HL_VPK_ITEM_CRC
+
+    def run():
+        get_item_attribute = hl.Package.get_item_attribute
+
+        for _ in range(args.number):
+            get_item_attribute(directory_file, crc)
+
+    return run, args.number
+
+
+def bench_walk():
+    root = hl.Package.get_root()
+    items = args.count + root.get_folder_count(True)
+    walks = max(1, args.number // items)
+
+    def run():
+        for _ in range(walks):
+            for path, directory_file in root.iter_files():
+                pass
+
+    return run, walks * items
+
+
+if __name__ == '__main__':
+    main()
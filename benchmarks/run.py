@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+        os.pardir))
+
+import hllib as hl
+
+args = None
+
+timer = getattr(time, "perf_counter", time.time)
+
+MAPPING_MODES = [
+    ("no-filemapping", hl.HLFileMode.HL_MODE_NO_FILEMAPPING),
+    ("filemapping", 0),
+    ("quick-filemapping", hl.HLFileMode.HL_MODE_QUICK_FILEMAPPING),
+]
+
+BENCHMARKS = ["open", "walk", "lookup", "read", "extract", "validate",
+        "defragment"]
+
+PACKAGE_TYPE_NAMES = dict((value, name[len("HL_PACKAGE_"):].lower())
+        for name, value in vars(hl.HLPackageType).items()
+        if name.startswith("HL_PACKAGE_"))
+
+
+def main():
+    global args
+    args = parse_arguments()
+
+    hl.initialize()
+
+    try:
+        results = []
+
+        for path in args.packages:
+            results.extend(run_package(path))
+
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "hllib_version": hl.get_value(hl.HLOption.HL_VERSION, hl.hlUInt),
+            "repeat": args.repeat,
+            "results": results,
+        }
+
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write("\n")
+        else:
+            json.dump(report, sys.stdout, indent=2, sort_keys=True)
+            print()
+
+    finally:
+        hl.shutdown()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Time core HLLib "
+            "operations on packages and write the results as JSON.")
+
+    parser.add_argument('packages', nargs='+', metavar='PACKAGE',
+            help='Package(s) to benchmark.')
+
+    parser.add_argument('-o', '--output',
+            help='File to write the JSON results to (default: stdout).')
+
+    parser.add_argument('-b', '--benchmark', action='append',
+            choices=BENCHMARKS,
+            help='Benchmark(s) to run (default: all).')
+
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+            help='Number of timed runs of each benchmark.')
+
+    parser.add_argument('--chunk-sizes', default='4096,65536,1048576',
+            help='Comma separated chunk sizes for the read benchmark.')
+
+    parser.add_argument('--lookups', type=int, default=1000,
+            help='Number of paths looked up per run of the lookup '
+            'benchmark.')
+
+    parser.add_argument('--seed', type=int, default=0,
+            help='Random seed for picking lookup paths.')
+
+    return parser
+
+
+def parse_arguments():
+    parser = get_argument_parser()
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1.")
+
+    try:
+        args.chunk_sizes = [int(size) for size in args.chunk_sizes.split(",")]
+    except ValueError:
+        parser.error("Invalid --chunk-sizes value: {0}".format(
+                args.chunk_sizes))
+
+    if not args.benchmark:
+        args.benchmark = BENCHMARKS
+
+    return args
+
+
+def run_package(path):
+    """Runs the selected benchmarks on one package.
+
+    Returns:
+        A list of result dicts, see make_result().
+    """
+    package_type = hl.Package.get_package_type_from_file(path)
+
+    if package_type == hl.HLPackageType.HL_PACKAGE_NONE:
+        print("Skipping {0}: unsupported package type.".format(path),
+                file=sys.stderr)
+        return []
+
+    with open_package(path, package_type, hl.HLFileMode.HL_MODE_READ):
+        files = [(item_path, directory_file.get_size()) for item_path,
+                directory_file in hl.Package.get_root().iter_files()]
+
+    package = {
+        "path": path,
+        "type": PACKAGE_TYPE_NAMES.get(package_type, str(package_type)),
+        "size": os.path.getsize(path),
+        "files": len(files),
+        "bytes": sum(size for _, size in files),
+    }
+    results = []
+
+    print("Benchmarking {0} ({1} files)...".format(path, len(files)),
+            file=sys.stderr)
+
+    if "open" in args.benchmark:
+        for mode_name, mode in MAPPING_MODES:
+            results.append(make_result(package, "open", {"mode": mode_name},
+                    time_runs(lambda: bench_open(path, package_type, mode)),
+                    None))
+
+    with open_package(path, package_type, hl.HLFileMode.HL_MODE_READ):
+        root = hl.Package.get_root()
+
+        if "walk" in args.benchmark:
+            results.append(make_result(package, "walk", {},
+                    time_runs(lambda: bench_walk(root)), None))
+
+        if "lookup" in args.benchmark and files:
+            rng = random.Random(args.seed)
+            paths = [rng.choice(files)[0] for _ in range(args.lookups)]
+            results.append(make_result(package, "lookup",
+                    {"lookups": len(paths)},
+                    time_runs(lambda: bench_lookup(root, paths)), None))
+
+        if "read" in args.benchmark:
+            for chunk_size in args.chunk_sizes:
+                results.append(make_result(package, "read",
+                        {"chunk_size": chunk_size},
+                        time_runs(lambda: bench_read(root, chunk_size)),
+                        package["bytes"]))
+
+        if "validate" in args.benchmark:
+            results.append(make_result(package, "validate", {},
+                    time_runs(lambda: bench_validate(root)),
+                    package["bytes"]))
+
+        if "extract" in args.benchmark:
+            results.append(make_result(package, "extract", {},
+                    time_runs(lambda: bench_extract(root)),
+                    package["bytes"]))
+
+    if ("defragment" in args.benchmark and
+            package_type == hl.HLPackageType.HL_PACKAGE_GCF):
+        results.append(make_result(package, "defragment", {},
+                time_runs(lambda: bench_defragment(path, package_type)),
+                package["size"]))
+
+    return results
+
+
+@contextlib.contextmanager
+def open_package(path, package_type, file_mode):
+    """Creates, binds and opens a package for the body of a with."""
+    package_id = hl.Package.create_package(package_type)
+
+    try:
+        hl.Package.bind_package(package_id)
+        hl.Package.open_file(path, file_mode)
+
+        try:
+            yield package_id
+        finally:
+            hl.Package.bind_package(package_id)
+            hl.Package.close()
+    finally:
+        hl.Package.delete_package(package_id)
+
+
+def time_runs(function):
+    """Returns the wall times of args.repeat calls of function.
+
+    function may return a number of seconds to subtract, for time
+    spent on setup inside the call.
+    """
+    seconds = []
+
+    for _ in range(args.repeat):
+        start = timer()
+        setup_seconds = function() or 0.0
+        seconds.append(timer() - start - setup_seconds)
+
+    return seconds
+
+
+def make_result(package, benchmark, params, seconds, byte_count):
+    seconds = sorted(seconds)
+    median = seconds[len(seconds) // 2]
+    result = {
+        "package": package,
+        "benchmark": benchmark,
+        "params": params,
+        "seconds": seconds,
+        "min": seconds[0],
+        "median": median,
+    }
+
+    if byte_count is not None:
+        result["bytes"] = byte_count
+        result["mb_per_second"] = (byte_count / median / 1e6
+                if median > 0 else None)
+
+    print("  {0} {1}: {2:.6f} s".format(benchmark, json.dumps(params,
+            sort_keys=True), median), file=sys.stderr)
+
+    return result
+
+
+def bench_open(path, package_type, mode):
+    with open_package(path, package_type, hl.HLFileMode.HL_MODE_READ | mode):
+        pass
+
+
+def bench_walk(root):
+    for _ in root.iter_files():
+        pass
+
+
+def bench_lookup(root, paths):
+    for path in paths:
+        root.get_item_by_path(path, hl.HLFindType.HL_FIND_FILES)
+
+
+def bench_read(root, chunk_size):
+    buf = bytearray(chunk_size)
+
+    for _, directory_file in root.iter_files():
+        with directory_file.open() as stream:
+            while stream.read(buf, chunk_size)[0]:
+                pass
+
+
+def bench_validate(root):
+    for _, directory_file in root.iter_files():
+        directory_file.get_validation()
+
+
+def bench_extract(root):
+    directory = tempfile.mkdtemp(prefix="hlbench-")
+
+    try:
+        root.extract(directory)
+    finally:
+        start = timer()
+        shutil.rmtree(directory)
+        cleanup_seconds = timer() - start
+
+    return cleanup_seconds
+
+
+def bench_defragment(path, package_type):
+    # Defragmenting modifies the package, so each run gets a fresh copy.
+    start = timer()
+    directory = tempfile.mkdtemp(prefix="hlbench-")
+    copy_path = os.path.join(directory, os.path.basename(path))
+    shutil.copyfile(path, copy_path)
+    setup_seconds = timer() - start
+
+    try:
+        with open_package(copy_path, package_type,
+                hl.HLFileMode.HL_MODE_READ | hl.HLFileMode.HL_MODE_WRITE):
+            hl.Package.defragment()
+    finally:
+        start = timer()
+        shutil.rmtree(directory)
+        setup_seconds += timer() - start
+
+    return setup_seconds
+
+
+if __name__ == '__main__':
+    main()
@@ -2,17 +2,45 @@
 
 from __future__ import print_function
 import argparse
+import errno
+import hashlib
 import hllib as hl
+import json
+import math
+import random
 import shlex
+import shutil
 import sys
 import os
+import tempfile
+import time
 
 args = None
 progress_last = 0
 
+# Validation results computed by worker processes when -j/--jobs is used
+# with -t/--validate, keyed by path relative to the package root.
+validations = None
+
+# The hl.ValidationCache used with --validation-cache.
+validation_cache = None
+
+# The JobProgress of the current phase when --progress is used.
+job_progress = None
+
+# The hl.MemoryBudgetPolicy used with --memory-budget.
+memory_policy = None
+
+# Files up to this size are hashed in memory before being written to the
+# content-addressed store, so duplicates are never written at all.
+STORE_BUFFER_SIZE = 64 << 20
+
+# Minimum number of seconds between progress updates.
+PROGRESS_INTERVAL = 0.1
+
 
 def main():
-    global args
+    global args, memory_policy
     args = parse_arguments()
 
     hl.initialize()
@@ -20,6 +48,9 @@ def main():
     package_opened = False
     package_created = False
 
+    if args.trace:
+        hl.set_trace_recorder(hl.TraceRecorder())
+
     try:
         set_options()
 
@@ -34,7 +65,13 @@ def main():
 
         hl.Package.bind_package(package_id)
 
-        hl.Package.open_file(args.package, get_file_mode())
+        if args.memory_budget:
+            memory_policy = hl.MemoryBudgetPolicy(args.memory_budget)
+            memory_policy.open_file(args.package, get_file_mode(),
+                    args.ncfroot)
+        else:
+            hl.Package.open_file(args.package, get_file_mode())
+
         package_opened = True
 
         if package_type == hl.HLPackageType.HL_PACKAGE_NCF:
@@ -43,17 +80,38 @@ def main():
         if not args.silent:
             print(args.package + " opened.")
 
+            if memory_policy is not None:
+                print("Using {0} to stay within {1} B of mapping "
+                        "memory.".format(get_mapping_mode_string(),
+                        memory_policy.budget))
+
         if args.extract:
-            extract_items()
+            with hl.trace_span("extract", "hlextract"):
+                extract_items()
 
         if args.validate:
-            validate_items()
+            with hl.trace_span("validate", "hlextract"):
+                validate_items()
+
+        if args.verify_crc:
+            with hl.trace_span("verify-crc", "hlextract"):
+                verify_crcs()
+
+        if args.validate_sample:
+            check_memory_budget()
+
+            with hl.trace_span("validate-sample", "hlextract"):
+                validate_sample()
 
         if args.list:
+            check_memory_budget()
             list_items()
 
         if args.defragment:
-            defragment()
+            check_memory_budget()
+
+            with hl.trace_span("defragment", "hlextract"):
+                defragment()
 
         if args.console:
             enter_console(package_id)
@@ -70,6 +128,9 @@ def main():
 
         hl.shutdown()
 
+        if args.trace:
+            hl.get_trace_recorder().save(args.trace)
+
 
 def get_argument_parser():
     parser = argparse.ArgumentParser()
@@ -84,9 +145,44 @@ def get_argument_parser():
     parser.add_argument('-e', '--extract', action='append',
             help='Item(s) in package to extract.')
 
+    parser.add_argument('--store',
+            help='Content-addressed store directory. Extracted files are '
+            'stored once, under their SHA-256, and linked into the '
+            'destination directory.')
+
+    parser.add_argument('--link', choices=('hard', 'sym'), default='hard',
+            help='How to link stored files into the destination '
+            'directory. Hard links share the stored copy, so do not '
+            'modify extracted files in place.')
+
     parser.add_argument('-t', '--validate', action='append',
             help='Item(s) in package to validate.')
 
+    parser.add_argument('--validation-cache', nargs='?', const=True,
+            metavar='PATH',
+            help='Reuse -t/--validate results stored in PATH (default: '
+            'next to the package) while the package file, and the '
+            'archive holding each file, are unchanged.')
+
+    parser.add_argument('--validate-sample', metavar='SAMPLE',
+            help='Validate the package metadata and a random sample of '
+            'files, stratified by size, and estimate the corrupt '
+            'fraction. SAMPLE is a percentage of files (e.g. 5%%) or a '
+            'number of bytes to read (e.g. 500M). Either way, at least '
+            'one file of each size is validated.')
+
+    parser.add_argument('--seed', type=int,
+            help='Random seed for --validate-sample.')
+
+    parser.add_argument('-k', '--verify-crc', action='store_true',
+            help='Verify the CRC-32 recorded for each file (VPK, ZIP, '
+            'BSP and SGA packages).')
+
+    parser.add_argument('-j', '--jobs', type=int,
+            help='Number of worker processes for --verify-crc and '
+            '-t/--validate. Defaults to the number of CPUs for '
+            '--verify-crc; -t/--validate runs in-process unless given.')
+
     list_group.add_argument('-l', '--list', nargs='?', const=True,
             help='List the contents of the package.')
 
@@ -99,6 +195,11 @@ def get_argument_parser():
     parser.add_argument('-f', '--defragment', action='store_true',
             help='Defragment package.')
 
+    parser.add_argument('--defragment-budget', type=float, metavar='SECONDS',
+            help='Stop defragmenting after SECONDS. Running again '
+            'continues where the previous run stopped. Implies '
+            '-f/--defragment.')
+
     parser.add_argument('-c', '--console', action='store_true',
             help='Console mode.')
 
@@ -108,6 +209,19 @@ def get_argument_parser():
     parser.add_argument('-s', '--silent', action='store_true',
             help='Silent mode.')
 
+    parser.add_argument('--progress', choices=('text', 'json'),
+            help='Periodically report overall progress, throughput and '
+            'ETA to stderr, as text or as JSON lines.')
+
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+            metavar='SECONDS',
+            help='Seconds between --progress reports.')
+
+    parser.add_argument('--trace', metavar='PATH',
+            help='Write a timeline of package opening and closing, '
+            'extraction, validation and defragmentation to PATH, in Chrome '
+            'trace event format.')
+
     parser.add_argument('-m', '--filemapping', action='store_true',
             help='Use file mapping.')
 
@@ -117,6 +231,16 @@ def get_argument_parser():
     parser.add_argument('-v', '--volatile', action='store_true',
             help='Allow volatile access.')
 
+    parser.add_argument('--memory-budget', metavar='SIZE',
+            help='Pick the file mapping mode to keep mapping memory '
+            'within SIZE (e.g. 512M), reopening the package in a cheaper '
+            'mode between operations if it grows beyond. The budget is '
+            'checked before each phase and between -e/-t items, not '
+            'during a single item or a whole --list, --verify-crc or '
+            '--validate-sample pass, so one such pass over a large '
+            'package may exceed it. Overrides -m/--filemapping and '
+            '-q/--quick-filemapping.')
+
     parser.add_argument('-o', '--overwrite', action='store_false',
             help="Don't overwrite files.")
 
@@ -136,7 +260,7 @@ def parse_arguments():
     if args.quick_filemapping:
         args.filemapping = True
 
-    if args.force_defragment:
+    if args.force_defragment or args.defragment_budget is not None:
         args.defragment = True
 
     if not args.dest:
@@ -152,23 +276,91 @@ def parse_arguments():
         args.list = args.list_files
         args.list_files = True
 
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
+    if args.memory_budget:
+        try:
+            args.memory_budget = parse_size(args.memory_budget)
+        except ValueError:
+            parser.error("Invalid --memory-budget value: {0}".format(
+                    args.memory_budget))
+
+    if args.validate_sample:
+        try:
+            args.validate_sample = parse_sample(args.validate_sample)
+        except ValueError:
+            parser.error("Invalid --validate-sample value: {0}".format(
+                    args.validate_sample))
+
     if (not args.extract and not args.validate and not args.list
-            and not args.defragment and not args.console):
+            and not args.defragment and not args.console
+            and not args.verify_crc and not args.validate_sample):
         args.console = True
 
     return args
 
 
+def parse_sample(value):
+    """Parses a --validate-sample value.
+
+    Returns:
+        A tuple of "percent" or "bytes", and the amount.
+
+    Raises:
+        ValueError: If value is malformed or out of range.
+    """
+    if value.endswith("%"):
+        percent = float(value[:-1])
+
+        if not 0 < percent <= 100:
+            raise ValueError(value)
+
+        return "percent", percent
+
+    return "bytes", parse_size(value)
+
+
+def parse_size(value):
+    """Parses a number of bytes with an optional K, M, G or T suffix.
+
+    Raises:
+        ValueError: If value is malformed or not positive.
+    """
+    multipliers = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    suffix = value[-1:].upper()
+
+    if suffix in multipliers:
+        amount = int(float(value[:-1]) * multipliers[suffix])
+    else:
+        amount = int(value.rstrip("bB"))
+
+    if amount <= 0:
+        raise ValueError(value)
+
+    return amount
+
+
 def set_options():
     hlo = hl.HLOption
     hl.set_value(hlo.HL_OVERWRITE_FILES, args.overwrite)
     hl.set_value(hlo.HL_FORCE_DEFRAGMENT, args.force_defragment)
-    hl.set_value(hlo.HL_PROC_EXTRACT_ITEM_START, extract_item_start_callback)
     hl.set_value(hlo.HL_PROC_EXTRACT_ITEM_END, extract_item_end_callback)
-    hl.set_value(hlo.HL_PROC_EXTRACT_FILE_PROGRESS, file_progress_callback)
-    hl.set_value(hlo.HL_PROC_VALIDATE_FILE_PROGRESS, file_progress_callback)
-    hl.set_value(hlo.HL_PROC_DEFRAGMENT_PROGRESS_EX,
-            defragment_progress_callback)
+
+    if not args.silent:
+        hl.set_value(hlo.HL_PROC_EXTRACT_ITEM_START,
+                extract_item_start_callback)
+
+    # Progress is only needed in verbose mode or for --progress. Leaving
+    # the callbacks unset saves a trip through ctypes for every tick.
+    if not args.silent or args.progress:
+        hl.set_progress_throttle(min_seconds=PROGRESS_INTERVAL)
+        hl.set_value(hlo.HL_PROC_EXTRACT_FILE_PROGRESS,
+                file_progress_callback)
+        hl.set_value(hlo.HL_PROC_VALIDATE_FILE_PROGRESS,
+                file_progress_callback)
+        hl.set_value(hlo.HL_PROC_DEFRAGMENT_PROGRESS_EX,
+                defragment_progress_callback)
 
 
 def get_file_mode():
@@ -189,40 +381,322 @@ def get_file_mode():
     return file_mode
 
 
+def get_worker_file_mode():
+    if memory_policy is not None:
+        file_mode = memory_policy.file_mode
+    else:
+        file_mode = get_file_mode()
+
+    # Worker processes only read, even if this process may defragment.
+    return file_mode & ~hl.HLFileMode.HL_MODE_WRITE
+
+
+def check_memory_budget():
+    """Reopens the package in a cheaper mode if over --memory-budget.
+
+    Items looked up before this returns True are no longer valid.
+    """
+    if memory_policy is None or not memory_policy.check():
+        return False
+
+    if not args.silent:
+        print("Mapping memory over budget, reopened {0} using {1}.".format(
+                args.package, get_mapping_mode_string()))
+
+    return True
+
+
+def find_items_again(items):
+    """Looks (item_path, item) tuples up again after a reopen.
+
+    Reopening the package frees every item looked up before, so all
+    items still to be processed must be replaced, not just the next.
+    """
+    package_root = hl.Package.get_root()
+    return [(item_path, package_root.get_item_by_path(item_path,
+            hl.HLFindType.HL_FIND_ALL)) for item_path, _ in items]
+
+
+def get_mapping_mode_string():
+    file_mode = memory_policy.file_mode
+
+    if file_mode & hl.HLFileMode.HL_MODE_NO_FILEMAPPING:
+        return "no file mapping"
+    elif file_mode & hl.HLFileMode.HL_MODE_QUICK_FILEMAPPING:
+        return "quick file mapping"
+    else:
+        return "file mapping"
+
+
 def extract_items():
     package_root = hl.Package.get_root()
+    items = []
 
     for item_path in args.extract:
-        try:
-            item = package_root.get_item_by_path(
-                    item_path, hl.HLFindType.HL_FIND_ALL)
-        except HLError:
+        item = package_root.get_item_by_path(
+                item_path, hl.HLFindType.HL_FIND_ALL)
+
+        if item is None:
             print(item_path + " not found in package.")
             continue
 
+        items.append((item_path, item))
+
+    start_job_progress("extract", [item for _, item in items])
+
+    for index in range(len(items)):
+        if check_memory_budget():
+            items[index:] = find_items_again(items[index:])
+
+        item_path, item = items[index]
+
         if not args.silent:
             print("Extracting {0}...\n".format(item_path))
 
         try:
-            item.extract(args.dest)
-        except HLError:
+            if args.store:
+                store_extract(item, args.dest)
+            else:
+                item.extract(args.dest)
+        except (hl.HLError, EnvironmentError):
             print("Failed to extract {0}.".format(item_path))
 
         if not args.silent:
             print("\nDone.\n")
 
+    finish_job_progress()
+
+
+def store_extract(item, path):
+    """Extracts item to path through the content-addressed store.
+
+    Mirrors the layout of HLDirectoryItem.extract(), but each file's
+    contents are written to the store only if no identical file is
+    there yet, and then linked into place.
+    """
+    make_directories(args.store)
+
+    if isinstance(item, hl.HLDirectoryFile):
+        items = [(item.get_name(), item)]
+    else:
+        items = iter_items(item, item.get_name())
+
+    for item_path, sub_item in items:
+        if isinstance(sub_item, hl.HLDirectoryFolder):
+            # Created even if empty, as HLDirectoryItem.extract() does.
+            make_directories(os.path.join(path, *item_path.split("/")))
+            continue
+
+        store_extract_file(item_path, sub_item, path)
+
+        if job_progress is not None:
+            # Skipped files count as done too.
+            job_progress.advance(1, sub_item.get_size())
+
+
+def iter_items(folder, folder_path):
+    """Yields (path, item) for folder and everything in it.
+
+    Each folder is yielded before its contents.
+    """
+    yield folder_path, folder
+
+    for idx in range(folder.get_count()):
+        item = folder.get_item(idx)
+        item_path = folder_path + "/" + item.get_name()
+
+        if isinstance(item, hl.HLDirectoryFolder):
+            for sub_item in iter_items(item, item_path):
+                yield sub_item
+        else:
+            yield item_path, item
+
+
+def store_extract_file(item_path, directory_file, path):
+    target = os.path.join(path, *item_path.split("/"))
+
+    if not args.silent:
+        print("  Extracting {0}: ".format(item_path), end="")
+
+    if os.path.lexists(target):
+        if not args.overwrite:
+            if not args.silent:
+                print("Skipped (exists).")
+            return
+
+        os.remove(target)
+
+    if not directory_file.get_extractable():
+        if not args.silent:
+            print("Errored.\n    File is not extractable.")
+        else:
+            print("  Error extracting {0}:\n    File is not "
+                    "extractable.".format(item_path))
+        return
+
+    object_path, stored = store_file(directory_file)
+    make_directories(os.path.dirname(target))
+    link_file(object_path, target)
+
+    if not args.silent:
+        print("OK ({0} B{1})".format(directory_file.get_size(),
+                ", stored" if stored else ", deduplicated"))
+
+
+def store_file(directory_file):
+    """Adds directory_file's contents to the store.
+
+    The contents are hashed as they are read. Small files are buffered
+    in memory and written only if the store lacks them. Larger files
+    are spooled to a temporary file in the store and discarded if
+    they turn out to be duplicates.
+
+    Returns:
+        A tuple of the path of the stored object and whether or not
+        it was newly written.
+    """
+    digest = hashlib.sha256()
+    spool = None
+    spool_path = None
+    data = []
+
+    try:
+        if directory_file.get_size() > STORE_BUFFER_SIZE:
+            fd, spool_path = tempfile.mkstemp(dir=args.store, suffix=".tmp")
+            spool = os.fdopen(fd, "wb")
+
+        for chunk in directory_file.iter_chunks():
+            digest.update(chunk)
+
+            if job_progress is not None:
+                job_progress.update(len(chunk), relative=True)
+
+            if spool is None:
+                data.append(chunk)
+            else:
+                spool.write(chunk)
+
+        name = digest.hexdigest()
+        object_path = os.path.join(args.store, name[:2], name)
+
+        if os.path.exists(object_path):
+            return object_path, False
+
+        make_directories(os.path.dirname(object_path))
+
+        if spool is None:
+            fd, spool_path = tempfile.mkstemp(dir=args.store, suffix=".tmp")
+            spool = os.fdopen(fd, "wb")
+
+            for chunk in data:
+                spool.write(chunk)
+
+        spool.close()
+        spool = None
+
+        try:
+            os.rename(spool_path, object_path)
+        except OSError:
+            # Another process stored the same file in the meantime, and
+            # renaming over it fails on Windows. The store is content
+            # addressed, so its copy will do.
+            if not os.path.exists(object_path):
+                raise
+
+            return object_path, False
+
+        spool_path = None
+        return object_path, True
+    finally:
+        if spool is not None:
+            spool.close()
+
+        if spool_path is not None:
+            os.remove(spool_path)
+
+
+def link_file(object_path, target):
+    """Links target to object_path, copying if linking fails."""
+    try:
+        if args.link == "hard":
+            os.link(object_path, target)
+        else:
+            os.symlink(os.path.abspath(object_path), target)
+    except (OSError, AttributeError, NotImplementedError):
+        # E.g. store and destination on different file systems, or no
+        # link support on this platform.
+        shutil.copyfile(object_path, target)
+
+
+def make_directories(path):
+    try:
+        os.makedirs(path)
+    except OSError as ex:
+        if ex.errno != errno.EEXIST:
+            raise
+
 
 def validate_items():
+    global validation_cache
     package_root = hl.Package.get_root()
 
+    if args.validation_cache:
+        cache_path = (args.validation_cache
+                if isinstance(args.validation_cache, str) else None)
+        validation_cache = hl.ValidationCache(args.package, cache_path)
+
+    try:
+        validate_items_with_cache(package_root)
+    finally:
+        if validation_cache is not None:
+            validation_cache.save()
+
+
+def validate_items_with_cache(package_root):
+    global validations
+    items = []
+
     for item_path in args.validate:
-        try:
-            item = package_root.get_item_by_path(
-                    item_path, hl.HLFindType.HL_FIND_ALL)
-        except HLError:
+        item = package_root.get_item_by_path(
+                item_path, hl.HLFindType.HL_FIND_ALL)
+
+        if item is None:
             print(item_path + " not found in package.")
             continue
 
+        items.append((item_path, item))
+
+    start_job_progress("validate", [item for _, item in items])
+
+    if args.jobs is not None:
+        paths = []
+
+        for item_path, item in items:
+            if isinstance(item, hl.HLDirectoryFile):
+                files = [(get_relative_path(item), item)]
+            else:
+                prefix = get_relative_path(item)
+                files = item.iter_files(prefix + "/" if prefix else "")
+
+            paths.extend(path for path, directory_file in files
+                    if validation_cache is None or
+                    validation_cache.lookup(directory_file) is None)
+
+        if not args.silent:
+            print("Validating {0} file{1} with {2} job{3}...\n".format(
+                    len(paths), "" if len(paths) == 1 else "s",
+                    args.jobs, "" if args.jobs == 1 else "s"))
+
+        validations = hl.validate_files(args.package, paths,
+                get_worker_file_mode(), args.jobs, args.ncfroot,
+                job_progress and job_progress.advance)
+
+    for index in range(len(items)):
+        if check_memory_budget():
+            items[index:] = find_items_again(items[index:])
+
+        item_path, item = items[index]
+
         if not args.silent:
             print("Validating {0}...\n".format(item_path))
 
@@ -231,6 +705,8 @@ def validate_items():
         if not args.silent:
             print("\nDone.\n")
 
+    finish_job_progress()
+
 
 def validate(item):
     validation = hl.HLValidation.HL_VALIDATES_OK
@@ -240,9 +716,10 @@ def validate(item):
             name = item.get_name()
             print("  Validating {0}:".format(name))
 
-        for idx in range(item.get_count()):
-            sub_validation = validate(item.get_item(idx))
-            validation = max(validation, sub_validation)
+        with hl.trace_span(item.get_name(), "validate"):
+            for idx in range(item.get_count()):
+                sub_validation = validate(item.get_item(idx))
+                validation = max(validation, sub_validation)
 
         if not args.silent:
             print("  Done {0}: {1}".format(name,
@@ -252,9 +729,11 @@ def validate(item):
         if not args.silent:
             name = item.get_name()
             print("  Validating {0}: ".format(name), end="")
-            progress_start()
 
-        validation = item.get_validation()
+            if validations is None:
+                progress_start()
+
+        validation = get_file_validation(item)
 
         if args.silent:
             # Only print on bad validation.
@@ -267,6 +746,231 @@ def validate(item):
         else:
             print(get_validation_string(validation))
 
+    return validation
+
+
+def validate_sample():
+    kind, amount = args.validate_sample
+    package_root = hl.Package.get_root()
+
+    if not args.silent:
+        print("Validating sample...\n")
+
+    # Package metadata: every attribute, and the whole directory tree.
+    metadata_errors = 0
+
+    for idx in range(hl.Package.get_attribute_count()):
+        try:
+            hl.Package.get_attribute(idx)
+        except hl.HLError as ex:
+            print("  Metadata: {0}".format(ex))
+            metadata_errors += 1
+
+    files = [(path, directory_file, directory_file.get_size())
+            for path, directory_file in package_root.iter_files()]
+    total_bytes = sum(size for _, _, size in files)
+
+    # Stratify by size (powers of two) so that small and large files
+    # are both represented.
+    strata = {}
+
+    for f in files:
+        strata.setdefault(f[2].bit_length(), []).append(f)
+
+    rng = random.Random(args.seed)
+    samples = []
+
+    if kind == "percent":
+        # The same fraction of each stratum, at least one file.
+        fraction = amount / 100.0
+
+        for key in sorted(strata):
+            stratum = strata[key]
+            count = min(len(stratum),
+                    int(math.ceil(fraction * len(stratum))))
+            samples.append((len(stratum), rng.sample(stratum, count)))
+    else:
+        # Each stratum gets a share of the byte budget in proportion to
+        # its bytes, plus whatever smaller strata left unused. Files are
+        # picked at random until the next one would not fit, but every
+        # stratum gets at least one, so that none is left out of the
+        # estimate. What that overspends is taken from larger strata.
+        budget = 0.0
+
+        for key in sorted(strata):
+            stratum = strata[key]
+            budget += (float(amount) * sum(size for _, _, size in stratum) /
+                    max(total_bytes, 1))
+            sample = []
+
+            for f in rng.sample(stratum, len(stratum)):
+                if sample and f[2] > budget:
+                    break
+
+                sample.append(f)
+                budget -= f[2]
+
+            samples.append((len(stratum), sample))
+
+    start_job_progress("validate-sample", [directory_file
+            for _, sample in samples for _, directory_file, _ in sample])
+
+    if args.jobs is not None:
+        results = hl.validate_files(args.package,
+                [path for _, sample in samples for path, _, _ in sample],
+                get_worker_file_mode(), args.jobs, args.ncfroot,
+                job_progress and job_progress.advance)
+    else:
+        results = {}
+
+        for _, sample in samples:
+            for path, directory_file, size in sample:
+                results[path] = directory_file.get_validation()
+
+                if job_progress is not None:
+                    job_progress.advance(1, size)
+
+    finish_job_progress()
+
+    v = hl.HLValidation
+    good = (v.HL_VALIDATES_OK, v.HL_VALIDATES_ASSUMED_OK)
+    sampled = sampled_bytes = bad = assumed = 0
+    estimate = variance = 0.0
+
+    for stratum_size, sample in samples:
+        stratum_bad = 0
+
+        for path, _, size in sample:
+            validation = results[path]
+
+            if validation not in good:
+                print("  Validating {0}: {1}".format(path,
+                        get_validation_string(validation)))
+                stratum_bad += 1
+            elif validation == v.HL_VALIDATES_ASSUMED_OK:
+                assumed += 1
+
+            sampled_bytes += size
+
+        count = len(sample)
+        sampled += count
+        bad += stratum_bad
+
+        if count == 0:
+            continue
+
+        # Stratified estimate of the corrupt fraction, with the finite
+        # population correction.
+        weight = float(stratum_size) / len(files)
+        p = float(stratum_bad) / count
+        estimate += weight * p
+
+        # A single file says nothing about the spread within its
+        # stratum, so assume the worst, p * (1 - p) = 1/4.
+        if count > 1:
+            variance += (weight ** 2 * (1 - float(count) / stratum_size) *
+                    p * (1 - p) / (count - 1))
+        else:
+            variance += weight ** 2 * (1 - 1.0 / stratum_size) * 0.25
+
+    if sampled == len(files):
+        # Every file was validated, so the estimate is exact.
+        interval = (estimate, estimate)
+    elif bad == 0:
+        # No failures observed: bound each stratum's corrupt fraction by
+        # the exact one-sided upper bound (the "rule of three" for large
+        # samples), at 95% / strata each so that all bounds hold at
+        # once with 95% confidence, and weight the bounds.
+        alpha = 0.05 / len(samples)
+        interval = (0.0, sum(float(stratum_size) / len(files) *
+                (1 - alpha ** (1.0 / len(sample)))
+                for stratum_size, sample in samples))
+    elif bad >= 5 and sampled - bad >= 5:
+        margin = 1.96 * math.sqrt(variance)
+        interval = (max(0.0, estimate - margin),
+                min(1.0, estimate + margin))
+    else:
+        # Too few failures (or successes) for the normal approximation.
+        interval = None
+
+    if not args.silent and bad:
+        print()
+
+    print("  Sampled {0} of {1} files ({2} of {3} B), {4} assumed OK.".format(
+            sampled, len(files), sampled_bytes, total_bytes, assumed))
+    print("  Metadata errors: {0}. Bad files in sample: {1}.".format(
+            metadata_errors, bad))
+    print("  Estimated corrupt: {0:.3%}{1}, about {2:.0f} file{3}.".format(
+            estimate, "" if interval is None else
+            " (95% CI {0:.3%} - {1:.3%})".format(*interval),
+            estimate * len(files), "" if estimate * len(files) == 1 else "s"))
+
+    if interval is None:
+        print("  Too few bad files in the sample for a confidence "
+                "interval.")
+
+    if not args.silent:
+        print("\nDone.\n")
+
+
+def get_file_validation(directory_file):
+    validation = None
+
+    if validation_cache is not None:
+        validation = validation_cache.lookup(directory_file)
+
+    # Files validated by worker processes were counted as their shards
+    # completed.
+    counted = validation is None and validations is not None
+
+    if validation is None:
+        if validations is None:
+            validation = directory_file.get_validation()
+        else:
+            validation = validations[get_relative_path(directory_file)]
+
+        if validation_cache is not None:
+            validation_cache.store(directory_file, validation)
+
+    if job_progress is not None and not counted:
+        job_progress.advance(1, directory_file.get_size())
+
+    return validation
+
+
+def verify_crcs():
+    if not args.silent:
+        print("Verifying CRCs...\n")
+
+    start_job_progress("verify-crc", [hl.Package.get_root()])
+    result = hl.verify_crcs(args.package, get_worker_file_mode(),
+            args.jobs, args.ncfroot, job_progress and job_progress.advance)
+    finish_job_progress()
+
+    for path, expected, actual in result.mismatches:
+        if actual is None:
+            print("  {0}: Error".format(path))
+        else:
+            print("  {0}: Corrupt (expected {1:#010x}, got {2:#010x})".format(
+                    path, expected, actual))
+
+    if not args.silent:
+        if result.mismatches:
+            print()
+
+        print("  {0} file{1} checked, {2} mismatched, {3} without CRC.".format(
+                result.files, "" if result.files == 1 else "s",
+                len(result.mismatches), len(result.unchecked)))
+        print("  {0} B in {1:.1f} s ({2:.1f} MB/s).".format(result.bytes,
+                result.seconds, result.throughput / 1e6))
+        print("\nDone.\n")
+
+
+def get_relative_path(item):
+    """Returns item's path relative to the package root, "/" separated."""
+    path = item.get_path().replace("\\", "/")
+    return path.partition("/")[2]
+
 
 def get_validation_string(validation):
     v = hl.HLValidation
@@ -324,10 +1028,21 @@ def defragment():
         # XXX Check output this is diff from original prog.
         progress_start()
 
+    completed = True
+
+    # Totals are reported by the defragment progress callback.
+    start_job_progress("defragment", [])
+
     try:
-        hl.Package.defragment()
-    except HLError:
-        print(" " + hl.get_value(HLOption.HL_ERROR_SHORT_FORMATED), end="")
+        completed = hl.Package.defragment(args.defragment_budget)
+    except hl.HLError:
+        print(" " + hl.get_value(hl.HLOption.HL_ERROR_SHORT_FORMATED), end="")
+
+    finish_job_progress()
+
+    if not completed:
+        print("\n\n  Time budget of {0} s used up. Run again to "
+                "continue.".format(args.defragment_budget), end="")
 
     if not args.silent:
         print("\n\nDone.\n")
@@ -602,32 +1317,19 @@ def console_type(item, name):
     if not args.silent:
         print("Type for {0}:\n".format(sub_item.get_path()))
 
-    stream_created = False
-    stream_opened = False
-
     try:
-        stream = sub_item.create_stream()
-        stream_created = True
-        stream.open(hl.HLFileMode.HL_MODE_READ)
-        stream_opened = True
-
-        while True:
-            try:
-                c = stream.read_char().decode("utf-8")
+        with sub_item.open() as stream:
+            while True:
+                try:
+                    c = stream.read_char().decode("utf-8")
 
-                if (c >= " " and c <= "~") or c == "\n" or c == "\t":
-                    print(c, end='')
+                    if (c >= " " and c <= "~") or c == "\n" or c == "\t":
+                        print(c, end='')
 
-            except hl.HLError:
-                break
+                except hl.HLError:
+                    break
     except hl.HLError as ex:
         print(ex)
-    finally:
-        if stream_opened:
-            stream.close()
-
-        if stream_created:
-            sub_item.release_stream(stream)
 
     if not args.silent:
         print("\nDone.")
@@ -769,6 +1471,9 @@ def extract_item_start_callback(item):
 
 
 def extract_item_end_callback(item, success):
+    if job_progress is not None and isinstance(item, hl.HLDirectoryFile):
+        job_progress.advance(1, item.get_size())
+
     if success:
         if not args.silent:
             name = item.get_name()
@@ -802,12 +1507,19 @@ def extract_item_end_callback(item, success):
 
 
 def file_progress_callback(item, bytes_extracted, bytes_total):
+    if job_progress is not None:
+        job_progress.update(bytes_extracted)
+
     progress_update(bytes_extracted, bytes_total)
 
 
 def defragment_progress_callback(item, files_defragmented,
-        files_total, bytes_defragmented, bytes_total, cancel):
-    progress_update(bytes_extracted, bytes_total)
+        files_total, bytes_defragmented, bytes_total):
+    if job_progress is not None:
+        job_progress.set_position(files_defragmented, bytes_defragmented,
+                files_total, bytes_total)
+
+    progress_update(bytes_defragmented, bytes_total)
 
 
 def progress_start():
@@ -836,5 +1548,150 @@ def progress_update(bytes_extracted, bytes_total):
                 print(".", end="")
 
 
+def start_job_progress(phase, items):
+    """Starts tracking overall progress for --progress.
+
+    Args:
+        phase: The name of the phase, e.g. "extract".
+
+        items: The HLDirectoryItems the phase will process. Their file
+            counts and sizes are summed up front for percentages and
+            ETA. HLLib sums up folders itself, so they are not walked
+            here.
+    """
+    global job_progress
+
+    if not args.progress:
+        return
+
+    total_files = total_bytes = 0
+
+    for item in items:
+        if isinstance(item, hl.HLDirectoryFile):
+            total_files += 1
+            total_bytes += item.get_size()
+        else:
+            total_files += item.get_file_count(True)
+            total_bytes += item.get_size(True)
+
+    job_progress = JobProgress(phase, total_files, total_bytes,
+            args.progress, args.progress_interval)
+
+
+def finish_job_progress():
+    global job_progress
+
+    if job_progress is not None:
+        job_progress.report(done=True)
+        job_progress = None
+
+
+class JobProgress(object):
+    """Overall progress, throughput and ETA of one phase of the job.
+
+    Completed files are added with advance(), and progress within the
+    file in flight is set with update(). A report is written to stderr
+    at most every interval seconds.
+    """
+
+    def __init__(self, phase, total_files, total_bytes, output_format,
+            interval):
+        self.phase = phase
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files = 0
+        self.bytes = 0
+        self.current_bytes = 0
+        self._format = output_format
+        self._interval = interval
+        self._start = self._last_report = time.time()
+
+    def advance(self, files, byte_count):
+        """Adds completed files."""
+        self.files += files
+        self.bytes += byte_count
+        self.current_bytes = 0
+        self._maybe_report()
+
+    def update(self, byte_count, relative=False):
+        """Sets (or with relative, adds to) the in-flight file's bytes."""
+        if relative:
+            self.current_bytes += byte_count
+        else:
+            self.current_bytes = byte_count
+
+        self._maybe_report()
+
+    def set_position(self, files, byte_count, total_files, total_bytes):
+        """Sets counts and totals reported by HLLib itself."""
+        self.files = files
+        self.bytes = byte_count
+        self.current_bytes = 0
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self._maybe_report()
+
+    def _maybe_report(self):
+        if time.time() - self._last_report >= self._interval:
+            self.report()
+
+    def report(self, done=False):
+        now = self._last_report = time.time()
+        elapsed = max(now - self._start, 1e-6)
+        byte_count = self.bytes + self.current_bytes
+        byte_rate = byte_count / elapsed
+        file_rate = self.files / elapsed
+
+        if self.total_bytes:
+            fraction = min(1.0, float(byte_count) / self.total_bytes)
+            remaining = self.total_bytes - byte_count
+            eta = remaining / byte_rate if byte_rate > 0 else None
+        elif self.total_files:
+            fraction = min(1.0, float(self.files) / self.total_files)
+            remaining = self.total_files - self.files
+            eta = remaining / file_rate if file_rate > 0 else None
+        else:
+            fraction = 1.0 if done else 0.0
+            eta = None
+
+        if done:
+            eta = 0.0
+
+        if self._format == "json":
+            line = json.dumps({
+                "phase": self.phase,
+                "done": done,
+                "elapsed_seconds": round(elapsed, 3),
+                "files": self.files,
+                "total_files": self.total_files,
+                "bytes": byte_count,
+                "total_bytes": self.total_bytes,
+                "fraction": round(fraction, 6),
+                "bytes_per_second": round(byte_rate, 1),
+                "files_per_second": round(file_rate, 3),
+                "eta_seconds": None if eta is None else round(eta, 1),
+            }, sort_keys=True)
+        else:
+            line = ("[{0}] {1:.1%}, {2} of {3} files, {4:.1f} of {5:.1f} MB, "
+                    "{6:.1f} MB/s, {7:.1f} files/s, {8} {9}".format(
+                    self.phase, fraction, self.files, self.total_files,
+                    byte_count / 1e6, self.total_bytes / 1e6,
+                    byte_rate / 1e6, file_rate,
+                    "took" if done else "ETA",
+                    format_duration(elapsed if done else eta)))
+
+        print(line, file=sys.stderr)
+        sys.stderr.flush()
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return "{0}:{1:02d}:{2:02d}".format(hours, minutes, seconds)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import hllib as hl
+import json
+import sys
+
+args = None
+
+
+def main():
+    global args
+    args = parse_arguments()
+
+    hl.initialize()
+
+    try:
+        reports = []
+
+        for path in args.packages:
+            try:
+                reports.append((path, read_report(path)))
+            except hl.HLError as ex:
+                print("Error reading {0}: {1}".format(path, ex),
+                        file=sys.stderr)
+
+        # Rank by the estimated time spent seeking to fragmented blocks.
+        reports.sort(key=lambda r: r[1].fragmented_blocks, reverse=True)
+
+        if args.json:
+            print_json(reports)
+        else:
+            print_reports(reports)
+
+    finally:
+        hl.shutdown()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description="Report GCF fragmentation "
+            "and recommend which packages to defragment.")
+
+    parser.add_argument('packages', nargs='+', metavar='PACKAGE',
+            help='GCF package(s) to inspect.')
+
+    parser.add_argument('-t', '--threshold', type=float, default=5.0,
+            help='Recommend defragmenting packages with at least this '
+            'percentage of fragmented blocks.')
+
+    parser.add_argument('--seek-ms', type=float, default=8.0,
+            help='Estimated cost of one seek in milliseconds.')
+
+    parser.add_argument('-n', '--top', type=int, default=10,
+            help='Number of most fragmented files to list per '
+            'recommended package.')
+
+    parser.add_argument('--json', action='store_true',
+            help='Write the report as JSON.')
+
+    return parser
+
+
+def parse_arguments():
+    return get_argument_parser().parse_args()
+
+
+def read_report(path):
+    package_type = hl.Package.get_package_type_from_file(path)
+
+    if package_type != hl.HLPackageType.HL_PACKAGE_GCF:
+        raise hl.HLError("Not a GCF package.")
+
+    package_id = hl.Package.create_package(package_type)
+
+    try:
+        hl.Package.bind_package(package_id)
+        hl.Package.open_file(path, hl.HLFileMode.HL_MODE_READ |
+                hl.HLFileMode.HL_MODE_NO_FILEMAPPING)
+
+        try:
+            return hl.GCFFile.get_fragmentation_report()
+        finally:
+            hl.Package.close()
+    finally:
+        hl.Package.delete_package(package_id)
+
+
+def is_recommended(report):
+    return report.fragmentation * 100 >= args.threshold
+
+
+def get_seek_seconds(blocks):
+    return blocks * args.seek_ms / 1000.0
+
+
+def print_reports(reports):
+    print("{0:>8} {1:>12} {2:>10} {3:>4}  {4}".format(
+            "Frag.", "Frag. blocks", "Seek time", "Rec.", "Package"))
+
+    for path, report in reports:
+        print("{0:>7.2f}% {1:>12} {2:>9.1f}s {3:>4}  {4}".format(
+                report.fragmentation * 100, report.fragmented_blocks,
+                get_seek_seconds(report.fragmented_blocks),
+                "yes" if is_recommended(report) else "no", path))
+
+    recommended = [(path, report) for path, report in reports
+            if is_recommended(report)]
+
+    print("\n{0} of {1} package{2} recommended for defragmenting.".format(
+            len(recommended), len(reports), "" if len(reports) == 1 else "s"))
+
+    for path, report in recommended:
+        print("\n{0} ({1} B blocks, {2} used of {3} allocated):".format(path,
+                report.block_length, report.used_blocks,
+                report.allocated_blocks))
+
+        for file_path, size, blocks, fragmented in report.files[:args.top]:
+            print("  {0}/{1} blocks fragmented, {2:.2f}s: {3}".format(
+                    fragmented, blocks, get_seek_seconds(fragmented),
+                    file_path))
+
+
+def print_json(reports):
+    output = []
+
+    for path, report in reports:
+        output.append({
+            "package": path,
+            "allocated_blocks": report.allocated_blocks,
+            "used_blocks": report.used_blocks,
+            "block_length": report.block_length,
+            "fragmented_blocks": report.fragmented_blocks,
+            "fragmentation": report.fragmentation,
+            "seek_seconds": get_seek_seconds(report.fragmented_blocks),
+            "recommended": is_recommended(report),
+            "files": [{"path": file_path, "size": size, "blocks": blocks,
+                    "fragmented_blocks": fragmented}
+                    for file_path, size, blocks, fragmented
+                    in report.files[:args.top]],
+        })
+
+    json.dump(output, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
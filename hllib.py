@@ -7,15 +7,22 @@ Directions:
     See Package class for information on handling (e.g. opening,
     closing, inspecting) packages.
 
-    See NCFFile and WADFile for information on handling NCF and WAD
-    files which is specific to those package types.
+    See GCFFile, NCFFile and WADFile for information on handling GCF,
+    NCF and WAD files which is specific to those package types.
 
     See HLDirectoryItem, HLDirectoryFolder, and HLDirectoryFile for
     information on handling (e.g. validating, extracting) package
     contents.
 
     See HLStream for information on reading and writing package contents
-    using streams.
+    using streams, and StreamPool for managing many streams.
+
+Loading:
+    The C library is loaded when first needed, so importing this module
+    never fails for want of it. It is loaded from the path in the
+    HLLIB_LIBRARY environment variable if set, else from the system's
+    library search path. Call load() to load it from elsewhere, or to
+    check early that it is available.
 
 String arguments:
     Functions taking string arguments may be passed unicode strings. Before
@@ -40,6 +47,26 @@ Buffer arguments:
     Python 3. Functions taking buffers that will be written to should be
     passed mutable byte-oriented containers such as bytearrays.
 
+Progress callbacks:
+    Callbacks set for HL_PROC_EXTRACT_FILE_PROGRESS, etc. using
+    set_value() can be throttled using set_progress_throttle(). Setting
+    a callback to None unregisters it from the underlying C library.
+
+Tracing:
+    Set a TraceRecorder with set_trace_recorder() to record package
+    opening, extraction, validation, etc. as a Chrome trace.
+
+Metrics:
+    get_metrics() samples mapping memory for every package along with
+    wrapper and stream counts. MetricsExporter writes them in
+    Prometheus text format to a file or serves them over HTTP. Item
+    wrappers are only counted while a MetricsExporter is open.
+
+Profiling:
+    Call enable_profiling(), or set the HLLIB_PROFILE environment
+    variable, to count calls, time and bytes moved for each function of
+    the C library. See get_profile().
+
 Custom package functions:
     There is limited support for Package.open_proc(). The functions
     (open, read, write, etc.) can be set using set_value(), but the
@@ -73,9 +100,20 @@ HL types:
     hlVoidPtr
 """
 
+import atexit as _atexit
+import collections as _collections
+import contextlib as _contextlib
 import ctypes as _c
+import hashlib as _hashlib
+import heapq as _heapq
+import json as _json
+import multiprocessing as _multiprocessing
 import os as _os
 import sys as _sys
+import threading as _threading
+import time as _time
+import weakref as _weakref
+import zlib as _zlib
 
 
 # Exceptions
@@ -91,13 +129,82 @@ class HLCancel(Exception):
 # Load HLLib
 
 if _os.name == "posix":
-    _hl = _c.cdll.LoadLibrary("libhl.so")
-    _callback_factory = _c.CFUNCTYPE
+    _library_loader = _c.cdll
+    _default_library_path = "libhl.so"
+    _callback_type = _c.CFUNCTYPE
 elif _os.name == "nt":
-    _hl = _c.windll.HLLib
-    _callback_factory = _c.WINFUNCTYPE
+    _library_loader = _c.windll
+    _default_library_path = "HLLib"
+    _callback_type = _c.WINFUNCTYPE
 else:
-    raise HLError("Operating system ({0}) not supported.".format(os.name))
+    raise HLError("Operating system ({0}) not supported.".format(_os.name))
+
+
+def _callback_factory(restype, *argtypes):
+    """Returns a function making C callbacks from Python functions.
+
+    While profiling is enabled, the time spent in a callback is left out
+    of the C library call that made it (see _profile_callback()).
+    """
+    proc_type = _callback_type(restype, *argtypes)
+
+    def make_callback(function):
+        def callback(*args):
+            if _profile is None:
+                return function(*args)
+
+            return _profile_callback(function, args)
+
+        return proc_type(callback)
+
+    return make_callback
+
+_text_type = type(u"")
+_string_types = (str, bytes, _text_type)
+
+
+class _Library(object):
+    """The C library, loaded and bound on first use.
+
+    The library is loaded by load() the first time any of its functions
+    is needed. Each function is then given its argtypes and restype
+    from _signatures when first used, and stored on the instance so
+    that later lookups skip __getattr__().
+    """
+
+    def __init__(self):
+        self.library = None
+        self.path = None
+
+    def __getattr__(self, name):
+        if not name.startswith("hl"):
+            raise AttributeError(name)
+
+        if self.library is None:
+            load()
+
+        function = getattr(self.library, name)
+        signature = _signatures.get(name)
+
+        if signature is not None:
+            function.argtypes, function.restype = signature
+
+        if _profile is not None:
+            _profiled_functions[name] = function
+            function = _profile_function(name, function)
+
+        setattr(self, name, function)
+        return function
+
+    def clear(self):
+        """Forgets the library and every function bound so far."""
+        self.__dict__.clear()
+        _profiled_functions.clear()
+        self.__init__()
+
+
+_hl = _Library()
+_load_lock = _threading.Lock()
 
 
 # Defines
@@ -834,19 +941,20 @@ class HLAttribute(_c.Structure):
                 HL_ATTRIBUTE_INVALID or not a value in HLAttributeType.
         """
         hlat = HLAttributeType
+        attribute_type = self._attribute_type
 
-        if self.get_type() == hlat.HL_ATTRIBUTE_BOOLEAN:
+        if attribute_type == hlat.HL_ATTRIBUTE_UNSIGNED_INTEGER:
+            return _hl.hlAttributeGetUnsignedInteger(_c.byref(self))
+        elif attribute_type == hlat.HL_ATTRIBUTE_BOOLEAN:
             return bool(_hl.hlAttributeGetBoolean(_c.byref(self)))
-        elif self.get_type() == hlat.HL_ATTRIBUTE_INTEGER:
+        elif attribute_type == hlat.HL_ATTRIBUTE_INTEGER:
             return _hl.hlAttributeGetInteger(_c.byref(self))
-        elif (self.get_type() == hlat.HL_ATTRIBUTE_UNSIGNED_INTEGER):
-            return _hl.hlAttributeGetUnsignedInteger(_c.byref(self))
-        elif self.get_type() == hlat.HL_ATTRIBUTE_FLOAT:
+        elif attribute_type == hlat.HL_ATTRIBUTE_FLOAT:
             return _hl.hlAttributeGetFloat(_c.byref(self))
-        elif self.get_type() == hlat.HL_ATTRIBUTE_STRING:
+        elif attribute_type == hlat.HL_ATTRIBUTE_STRING:
             string = _hl.hlAttributeGetString(_c.byref(self))
             return string.decode(_unicode_encoding)
-        elif self.get_type() == hlat.HL_ATTRIBUTE_INVALID:
+        elif attribute_type == hlat.HL_ATTRIBUTE_INVALID:
             raise HLError("HLAttribute's type is invalid.")
         else:
             raise HLError("HLAttribute's type is unknown.")
@@ -911,13 +1019,28 @@ def _hl_directory_instance(handle):
 
     item_type = _hl.hlItemGetType(handle)
 
-    if item_type == HLDirectoryItemType.HL_ITEM_NONE:
-        raise HLError("Cannot create directory item "
-                "instance from indeterminate item type.")
+    # The type is known here, so the wrappers do not check it again.
+    if item_type == HLDirectoryItemType.HL_ITEM_FILE:
+        return HLDirectoryFile(handle)
     elif item_type == HLDirectoryItemType.HL_ITEM_FOLDER:
         return HLDirectoryFolder(handle)
-    elif item_type == HLDirectoryItemType.HL_ITEM_FILE:
-        return HLDirectoryFile(handle)
+    elif item_type == HLDirectoryItemType.HL_ITEM_NONE:
+        raise HLError("Cannot create directory item "
+                "instance from indeterminate item type.")
+
+
+_PATH_BUFFER_SIZE = 1024
+
+# Buffers for HLDirectoryItem.get_path(), one per thread.
+_path_buffers = _threading.local()
+
+
+def _get_path_buffer():
+    try:
+        return _path_buffers.buffer
+    except AttributeError:
+        _path_buffers.buffer = _c.create_string_buffer(_PATH_BUFFER_SIZE)
+        return _path_buffers.buffer
 
 
 class HLDirectoryItem(object):
@@ -969,26 +1092,96 @@ class HLDirectoryItem(object):
     #       hlChar *lpPath, hlUInt uiPathSize);
     def get_path(self):
         """Returns the item's path."""
-        buf_size = 1024
-        buf = _c.create_string_buffer(buf_size)
-        _hl.hlItemGetPath(self, buf, buf_size)
+        buf = _get_path_buffer()
+        _hl.hlItemGetPath(self, buf, _PATH_BUFFER_SIZE)
         return buf.value.decode(_unicode_encoding)
 
     # hlBool hlItemExtract(HLDirectoryItem *pItem, const hlChar *lpPath);
-    def extract(self, path):
+    def extract(self, path, deadline=None, cancel_event=None):
         """Extracts the item to the given directory.
 
         Args:
             path: The path of the directory to extract to.
 
+            deadline: The time.time() value at which to cancel
+                extraction, or None. Checked before each file and at
+                each HL_PROC_EXTRACT_FILE_PROGRESS tick.
+
+            cancel_event: An object with an is_set() method, such as a
+                threading.Event, that cancels extraction when set.
+                May be set from another thread.
+
         Raises:
+            HLCancel: If extraction was canceled by deadline or
+                cancel_event. The file being extracted at the time is
+                removed, and no further files are extracted.
+
             HLError: If there is an error extracting the item.
         """
-        path = _encode(path)
-        if not _hl.hlItemExtract(self, path):
+        with _cancellable(deadline, cancel_event,
+                _extract_file_progress) as cancellation:
+            if cancellation is None:
+                result = _hl.hlItemExtract(self, _encode(path))
+            else:
+                result = _extract_cancellable(self, path, cancellation)
+
+        if cancellation is not None and cancellation.triggered:
+            raise HLCancel("Extraction of {0} canceled.".format(path))
+
+        if not result:
             raise HLError("Failed to extract {0}.".format(path))
 
 
+def _extract_cancellable(item, path, cancellation):
+    """Extracts item to path one file at a time until canceled.
+
+    HLLib's cancel flag only stops copying the current file, after which
+    a folder extraction goes on with the next one, so folders are walked
+    here instead. The item start and end callbacks are called for
+    folders as HLLib would.
+
+    Returns:
+        Whether every item was extracted.
+    """
+    if isinstance(item, HLDirectoryFile):
+        try:
+            cancellation.check()
+        except HLCancel:
+            return False
+
+        result = _hl.hlItemExtract(item, _encode(path))
+
+        if cancellation.triggered:
+            # Remove the partially written file.
+            try:
+                _os.remove(_os.path.join(path, item.get_name()))
+            except OSError:
+                pass
+
+        return bool(result)
+
+    folder_path = _os.path.join(path, item.get_name())
+    _extract_item_start(item._as_parameter_)
+    result = True
+
+    try:
+        if not _os.path.isdir(folder_path):
+            _os.makedirs(folder_path)
+    except OSError:
+        result = False
+    else:
+        for idx in range(item.get_count()):
+            result = (_extract_cancellable(item.get_item(idx), folder_path,
+                    cancellation) and result)
+
+            if cancellation.triggered:
+                result = False
+                break
+
+    _extract_item_end(item._as_parameter_, result)
+    return result
+
+
 class HLDirectoryFolder(HLDirectoryItem):
     """Represents a folder within a package."""
 
@@ -998,11 +1191,6 @@ class HLDirectoryFolder(HLDirectoryItem):
             raise HLError()
         return self._as_parameter_
 
-    def __init__(self, handle):
-        """Initializes instance with handle to underlying item."""
-        super(HLDirectoryFolder, self).__init__(handle)
-        assert self.get_type() == HLDirectoryItemType.HL_ITEM_FOLDER
-
     # hlUInt hlFolderGetCount(const HLDirectoryItem *pItem);
     def get_count(self):
         """Returns the number of items in the directory."""
@@ -1107,6 +1295,28 @@ class HLDirectoryFolder(HLDirectoryItem):
         """Returns the number of files in the directory."""
         return _hl.hlFolderGetFileCount(self, recurse)
 
+    def iter_files(self, prefix=""):
+        """Yields every file in the directory and its subdirectories.
+
+        Files are yielded depth first, in directory order.
+
+        Args:
+            prefix: String prepended to each yielded path.
+
+        Yields:
+            Tuples of the file's path relative to this directory, using
+            "/" as the separator, and the file itself.
+        """
+        for idx in range(self.get_count()):
+            item = self.get_item(idx)
+            path = prefix + item.get_name()
+
+            if isinstance(item, HLDirectoryFolder):
+                for sub_item in item.iter_files(path + "/"):
+                    yield sub_item
+            else:
+                yield path, item
+
 
 class HLDirectoryFile(HLDirectoryItem):
     """Represents a file within a package."""
@@ -1117,20 +1327,35 @@ class HLDirectoryFile(HLDirectoryItem):
             raise HLError()
         return self._as_parameter_
 
-    def __init__(self, handle):
-        """Initializes instance with handle to underlying item."""
-        super(HLDirectoryFile, self).__init__(handle)
-        assert self.get_type() == HLDirectoryItemType.HL_ITEM_FILE
-
     # hlUInt hlFileGetExtractable(const HLDirectoryItem *pItem);
     def get_extractable(self):
         """Returns whether or not this file is extractable."""
         return _hl.hlFileGetExtractable(self)
 
     # HLValidation hlFileGetValidation(const HLDirectoryItem *pItem);
-    def get_validation(self):
-        """Returns file's validation value."""
-        return _hl.hlFileGetValidation(self)
+    def get_validation(self, deadline=None, cancel_event=None):
+        """Returns file's validation value.
+
+        Args:
+            deadline: The time.time() value at which to cancel
+                validation, or None. Checked at each
+                HL_PROC_VALIDATE_FILE_PROGRESS tick.
+
+            cancel_event: An object with an is_set() method, such as a
+                threading.Event, that cancels validation when set.
+                May be set from another thread.
+
+        Returns:
+            The file's HLValidation value, HL_VALIDATES_CANCELED if
+            validation was canceled.
+        """
+        with _cancellable(deadline, cancel_event,
+                _validate_file_progress):
+            if _trace_recorder is None:
+                return _hl.hlFileGetValidation(self)
+
+            with _trace_recorder.span(self.get_name(), "validate"):
+                return _hl.hlFileGetValidation(self)
 
     # hlUInt hlFileGetSize(const HLDirectoryItem *pItem);
     def get_size(self):
@@ -1160,16 +1385,67 @@ class HLDirectoryFile(HLDirectoryItem):
             raise HLError("Failed to create stream from "
                     "file at {0}.".format(self.get_path()))
 
+        _metric_counters["streams_created"] += 1
         return HLStream(pointer)
 
     # hlVoid hlFileReleaseStream(HLDirectoryItem *pItem, HLStream *pStream);
     def release_stream(self, stream):
         """Releases the given stream for this file."""
         _hl.hlFileReleaseStream(self, stream)
+        _metric_counters["streams_released"] += 1
+
+    def open(self, file_mode=HLFileMode.HL_MODE_READ):
+        """Returns an open stream for this file from the module's pool.
+
+        Use the stream in a with statement, which closes and releases
+        it at the end. See StreamPool.
+
+        Args:
+            file_mode: The mode(s) with which to open the stream.
+                See HLFileMode.
+
+        Raises:
+            HLError: If there is an error creating or opening the stream.
+        """
+        return _default_stream_pool.open(self, file_mode)
+
+    def iter_chunks(self, chunk_size=HL_DEFAULT_COPY_BUFFER_SIZE):
+        """Yields the file's contents in chunks.
+
+        A stream is opened for the duration of the iteration, and
+        released afterwards.
+
+        Args:
+            chunk_size: The maximum number of bytes in each chunk.
+
+        Yields:
+            The file's contents as consecutive bytes objects.
+
+        Raises:
+            HLError: If there is an error creating or opening the stream.
+        """
+        with self.open() as stream:
+            buf = bytearray(chunk_size)
+
+            while True:
+                bytes_read, _ = stream.read(buf, chunk_size)
+
+                if bytes_read == 0:
+                    break
+
+                yield bytes(buf[:bytes_read])
 
 
 class HLStream(object):
-    """Stream interface for interacting with data in various formats."""
+    """Stream interface for interacting with data in various formats.
+
+    A stream can be used in a with statement. Leaving it closes the
+    stream, and releases it too if it came from a StreamPool (see
+    HLDirectoryFile.open()).
+    """
+
+    # The StreamPool the stream came from, if any.
+    _pool = None
 
     @classmethod
     def from_param(cls, obj):
@@ -1181,6 +1457,15 @@ class HLStream(object):
         """Initializes instance with handle to underlying item."""
         self._as_parameter_ = handle
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            self.close()
+
     # HLStreamType hlStreamGetType(const HLStream *pStream);
     def get_type(self):
         """Returns stream's type (see HLStreamType)."""
@@ -1210,10 +1495,13 @@ class HLStream(object):
         if not _hl.hlStreamOpen(self, file_mode):
             raise HLError("Failed to open stream.")
 
+        _metric_counters["streams_opened"] += 1
+
     # hlVoid hlStreamClose(HLStream *pStream);
     def close(self):
         """Closes stream."""
         _hl.hlStreamClose(self)
+        _metric_counters["streams_closed"] += 1
 
     # hlUInt hlStreamGetStreamSize(const HLStream *pStream);
     def get_stream_size(self):
@@ -1270,8 +1558,16 @@ class HLStream(object):
         """
         if buf is None:
             buf = bytearray(n)
+        elif len(buf) < n:
+            raise HLError("Buffer length ({0}) is smaller than "
+                    "requested length ({1}).".format(len(buf), n))
 
-        c_buf = (_c.c_byte * n).from_buffer(buf)
+        if n == 0:
+            return 0, buf
+
+        # Pointing at the first byte avoids creating an array type of
+        # length n, which costs more than the call itself for small n.
+        c_buf = _c.byref(_c.c_char.from_buffer(buf))
         bytes_read = _hl.hlStreamRead(self, c_buf, n)
 
         return bytes_read, buf
@@ -1306,6 +1602,146 @@ class HLStream(object):
         return _hl.hlStreamWrite(self, c_buf, n)
 
 
+class StreamPool(object):
+    """Opens streams for files and makes sure that they are released.
+
+    A stream from open() is released when its with statement ends, or
+    when passed to release(). Any stream still outstanding when the
+    pool is closed, or when its package is closed or deleted, is
+    released then and counted as leaked (see get_metrics()). Wrappers
+    of released streams are reused for later streams.
+
+    HLDirectoryFile.open() uses a pool shared by the module, which is
+    closed by shutdown(). Like the rest of HLLib, pools must not be
+    used concurrently.
+
+    Usage:
+        with hllib.StreamPool() as pool:
+            for path, directory_file in root.iter_files():
+                with pool.open(directory_file) as stream:
+                    stream.read(buf, len(buf))
+    """
+
+    def __init__(self, max_free=64):
+        """Initializes the pool.
+
+        Args:
+            max_free: The maximum number of released stream wrappers
+                kept for reuse.
+        """
+        self._max_free = max_free
+        self._free = []
+
+        # Outstanding streams as id(stream) -> (stream, file).
+        self._streams = {}
+
+        _stream_pools.add(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        """Returns the number of outstanding streams."""
+        return len(self._streams)
+
+    def open(self, directory_file, file_mode=HLFileMode.HL_MODE_READ):
+        """Creates and opens a stream for a file.
+
+        Args:
+            directory_file: The file to create a stream for.
+
+            file_mode: The mode(s) with which to open the stream.
+                See HLFileMode.
+
+        Returns:
+            The open stream.
+
+        Raises:
+            HLError: If there is an error creating or opening the
+                stream.
+        """
+        if self._free:
+            stream = self._free.pop()
+        else:
+            stream = HLStream(hlVoidPtr())
+            stream._pool = self
+
+        if not _hl.hlFileCreateStream(directory_file,
+                _c.byref(stream._as_parameter_)):
+            self._free.append(stream)
+            raise HLError("Failed to create stream from "
+                    "file at {0}.".format(directory_file.get_path()))
+
+        _metric_counters["streams_created"] += 1
+        self._streams[id(stream)] = (stream, directory_file)
+
+        try:
+            stream.open(file_mode)
+        except HLError:
+            self.release(stream)
+            raise
+
+        return stream
+
+    def release(self, stream):
+        """Closes and releases a stream from open().
+
+        Releasing a stream again does nothing. The stream must not be
+        used afterwards, as its wrapper may be handed out again.
+        """
+        entry = self._streams.pop(id(stream), None)
+
+        if entry is None:
+            return
+
+        if _hl.hlStreamGetOpened(stream):
+            stream.close()
+
+        entry[1].release_stream(stream)
+        stream._as_parameter_.value = None
+
+        if len(self._free) < self._max_free:
+            self._free.append(stream)
+
+    def get_outstanding(self):
+        """Returns the files with streams not yet released."""
+        return [directory_file for _, directory_file in
+                self._streams.values()]
+
+    def close(self, package_id=None):
+        """Releases outstanding streams, counting them as leaked.
+
+        Args:
+            package_id: Only release streams for files in the package
+                with this ID, or None for all streams.
+        """
+        for stream, directory_file in list(self._streams.values()):
+            if (package_id is None or
+                    directory_file.get_package() == package_id):
+                self.release(stream)
+                _metric_counters["streams_leaked"] += 1
+
+
+def _release_streams(package_id=None):
+    """Releases the streams outstanding in every pool.
+
+    Called before HLLib frees the streams itself, so that no pool is
+    left holding freed streams.
+    """
+    for pool in list(_stream_pools):
+        pool.close(package_id)
+
+
+# Every StreamPool not yet garbage collected.
+_stream_pools = _weakref.WeakSet()
+
+# The pool used by HLDirectoryFile.open().
+_default_stream_pool = StreamPool()
+
+
 class Package(object):
     """A collection of static methods for dealing with packages.
 
@@ -1323,9 +1759,13 @@ class Package(object):
         Raises:
             HLError: If there is an error binding the package.
         """
+        global _bound_package_id
+
         if not _hl.hlBindPackage(package_id):
             raise HLError("Failed to bind package.")
 
+        _bound_package_id = package_id
+
     @staticmethod
     def get_package_type_from_file(path):
         """Returns the type of package given a path to the package."""
@@ -1382,13 +1822,20 @@ class Package(object):
             raise HLError("Failed to create package of "
                     "type {0}.".format(package_type))
 
+        _packages[result.value] = [package_type, None]
         return result.value
 
     @staticmethod
     # hlVoid hlDeletePackage(hlUInt uiPackage);
     def delete_package(package_id):
         """Deletes a package object given the ID."""
+        global _bound_package_id
+        _release_streams(package_id)
         _hl.hlDeletePackage(package_id)
+        _packages.pop(package_id, None)
+
+        if _bound_package_id == package_id:
+            _bound_package_id = None
 
     @staticmethod
     # HLPackageType hlPackageGetType();
@@ -1452,10 +1899,17 @@ class Package(object):
         Raises:
             HLError: If there is an error opening the package.
         """
-        file_name = _encode(file_name)
-        if not _hl.hlPackageOpenFile(file_name, file_mode):
+        with trace_span("open", "package", {"path": file_name}):
+            result = _hl.hlPackageOpenFile(_encode(file_name), file_mode)
+
+        if not result:
             raise HLError("Failed to open package file {0}.".format(file_name))
 
+        package = _packages.get(_bound_package_id)
+
+        if package is not None:
+            package[1] = file_name
+
     @staticmethod
     # hlBool hlPackageOpenMemory(hlVoid *lpData,
     #       hlUInt uiBufferSize, hlUInt uiMode);
@@ -1476,7 +1930,10 @@ class Package(object):
         """
         c_buf = (_c.c_byte * n).from_buffer(buf)
 
-        if not _hl.hlPackageOpenMemory(c_buf, n, file_mode):
+        with trace_span("open", "package", {"size": n}):
+            result = _hl.hlPackageOpenMemory(c_buf, n, file_mode)
+
+        if not result:
             raise HLError("Failed to open package from memory.")
 
     @staticmethod
@@ -1498,7 +1955,10 @@ class Package(object):
         Raises:
             HLError: If there is an error opening the package.
         """
-        if not _hl.hlPackageOpenProc(user_data, file_mode):
+        with trace_span("open", "package"):
+            result = _hl.hlPackageOpenProc(user_data, file_mode)
+
+        if not result:
             raise HLError("Failed to open package using procedure.""")
 
     @staticmethod
@@ -1515,26 +1975,75 @@ class Package(object):
         Raises:
             HLError: If there is an error opening the package.
         """
-        if not _hl.hlPackageOpenStream(stream, file_mode):
+        with trace_span("open", "package"):
+            result = _hl.hlPackageOpenStream(stream, file_mode)
+
+        if not result:
             raise HLError("Failed to open package from stream.")
 
     @staticmethod
     # hlVoid hlPackageClose();
     def close():
-        """Closes bound package."""
-        _hl.hlPackageClose()
+        """Closes bound package.
+
+        Streams from StreamPools for files in the package are released
+        first.
+        """
+        if _bound_package_id is not None:
+            _release_streams(_bound_package_id)
+
+        with trace_span("close", "package"):
+            _hl.hlPackageClose()
 
     @staticmethod
     # hlBool hlPackageDefragment();
-    def defragment():
+    def defragment(budget_seconds=None, deadline=None, cancel_event=None):
         """Defragments bound package.
 
+        Defragmentation can be stopped early by setting a time budget,
+        a deadline or a cancel event, which are checked at each
+        HL_PROC_DEFRAGMENT_PROGRESS_EX tick. Work done before stopping
+        is kept, and HLLib skips over files that are already in place,
+        so calling defragment() again continues where the previous call
+        stopped. HLLib decides the order in which files are
+        defragmented; see GCFFile.get_fragmentation_report() for
+        deciding whether a package is worth defragmenting at all.
+
+        Args:
+            budget_seconds: The maximum number of seconds to spend, or
+                None for no limit.
+
+            deadline: The time.time() value at which to stop, or None.
+
+            cancel_event: An object with an is_set() method, such as a
+                threading.Event, that stops defragmentation when set.
+                May be set from another thread.
+
+        Returns:
+            True if defragmentation completed, or False if it was
+            stopped early.
+
         Raises:
             HLError: If there is an error defragmenting the package.
         """
-        if not _hl.hlPackageDefragment():
+        if budget_seconds is not None:
+            budget_deadline = _time.time() + budget_seconds
+            deadline = (budget_deadline if deadline is None
+                    else min(deadline, budget_deadline))
+
+        with _cancellable(deadline, cancel_event,
+                _defragment_progress_ex) as cancellation:
+            with trace_span("defragment", "package"):
+                result = _hl.hlPackageDefragment()
+
+        if cancellation is not None and cancellation.triggered:
+            return False
+
+        if not result:
             raise HLError("Failed to defragment package.")
 
+        return True
+
     @staticmethod
     # HLDirectoryItem *hlPackageGetRoot();
     def get_root():
@@ -1553,6 +2062,193 @@ class Package(object):
 
         return _hl_directory_instance(item)
 
+    @staticmethod
+    def build_index(find_type=HLFindType.HL_FIND_ALL):
+        """Returns an index of the items in bound package by path.
+
+        Walks the whole package once. Pass the index to resolve_many()
+        to resolve paths without calling the C library at all.
+
+        Args:
+            find_type: Which items to index (see HLFindType). Only
+                HL_FIND_FILES, HL_FIND_FOLDERS and
+                HL_FIND_CASE_SENSITIVE apply. Without
+                HL_FIND_CASE_SENSITIVE, paths are indexed lower case.
+
+        Returns:
+            A dict mapping paths relative to the root, using "/" as the
+            separator, to items.
+        """
+        index = {}
+        folders = [("", Package.get_root())]
+
+        while folders:
+            prefix, folder = folders.pop()
+
+            for idx in range(folder.get_count()):
+                item = folder.get_item(idx)
+                path = prefix + item.get_name()
+
+                if isinstance(item, HLDirectoryFolder):
+                    folders.append((path + "/", item))
+
+                    if not find_type & HLFindType.HL_FIND_FOLDERS:
+                        continue
+                elif not find_type & HLFindType.HL_FIND_FILES:
+                    continue
+
+                index[_path_key(path, find_type)] = item
+
+        return index
+
+    @staticmethod
+    def resolve_many(paths, find_type=HLFindType.HL_FIND_ALL, index=None):
+        """Returns the items in bound package at each of the given paths.
+
+        Equivalent to calling get_item_by_path() on the root for each
+        path, but much faster for many paths. Paths are resolved in
+        sorted order, once each, and each folder on the way is looked
+        up only once rather than once per path beneath it.
+
+        Args:
+            paths: An iterable of paths relative to the root, using "/"
+                or "\\" as the separator.
+
+            find_type: Which items to find (see HLFindType). Only
+                HL_FIND_FILES, HL_FIND_FOLDERS and
+                HL_FIND_CASE_SENSITIVE apply.
+
+            index: An index from build_index() called with the same
+                find_type, to look paths up in instead of the package.
+
+        Returns:
+            A list holding the item at each path, or None where there
+            is no item to find.
+        """
+        keys = [_path_key(_normalize_path(path), find_type) for path in paths]
+
+        if index is not None:
+            return [index.get(key) for key in keys]
+
+        # Folders are only ever looked up as folders, whatever the type
+        # of item to find.
+        folder_find_type = HLFindType.HL_FIND_FOLDERS | (find_type &
+                HLFindType.HL_FIND_CASE_SENSITIVE)
+        folders = {"": Package.get_root()}
+        items = {}
+
+        def get_folder(path):
+            try:
+                return folders[path]
+            except KeyError:
+                pass
+
+            parent_path, _, name = path.rpartition("/")
+            parent = get_folder(parent_path)
+            folder = (None if parent is None else
+                    parent.get_item_by_name(name, folder_find_type))
+            folders[path] = folder
+            return folder
+
+        for key in sorted(set(keys)):
+            folder_path, _, name = key.rpartition("/")
+            folder = get_folder(folder_path) if name else None
+            items[key] = (None if folder is None else
+                    folder.get_item_by_name(name, find_type))
+
+        return [items[key] for key in keys]
+
+    @staticmethod
+    def read_many(paths_or_items):
+        """Reads the contents of many files in bound package at once.
+
+        All of the contents are read into a single bytearray, one file
+        after another, so that loading many small files costs one
+        allocation rather than one per file. Files are read in roughly
+        the order their contents are stored (by archive, then by ID),
+        each straight into its place in the bytearray, and files given
+        more than once are read once.
+
+        Args:
+            paths_or_items: An iterable of files, or of paths relative
+                to the root of files, or a mix of both.
+
+        Returns:
+            A tuple of the bytearray and a list holding a memoryview of
+            each file's contents within it, or None where there is no
+            file at the path. The bytearray cannot be resized while the
+            memoryviews exist.
+
+        Raises:
+            HLError: If an item is not a file, or if there is an error
+                reading a file.
+        """
+        items = list(paths_or_items)
+        paths = [(idx, item) for idx, item in enumerate(items)
+                if isinstance(item, _string_types)]
+
+        if paths:
+            resolved = Package.resolve_many([path for _, path in paths],
+                    HLFindType.HL_FIND_FILES)
+
+            for (idx, _), directory_file in zip(paths, resolved):
+                items[idx] = directory_file
+
+        archive_attribute = _archive_attributes.get(Package.get_type())
+        files = {}
+        ids = []
+
+        for directory_file in items:
+            if directory_file is None:
+                ids.append(None)
+                continue
+            elif not isinstance(directory_file, HLDirectoryFile):
+                raise HLError("Cannot read {0}, it is not a file.".format(
+                        directory_file.get_path()))
+
+            file_id = directory_file.get_id()
+            ids.append(file_id)
+
+            if file_id not in files:
+                files[file_id] = (_get_archive(directory_file,
+                        archive_attribute), file_id, directory_file)
+
+        reads = []
+        offsets = {}
+        total = 0
+
+        for _, file_id, directory_file in sorted(files.values(),
+                key=lambda entry: entry[:2]):
+            size = directory_file.get_size()
+            reads.append((directory_file, total, size))
+            offsets[file_id] = (total, size)
+            total += size
+
+        arena = bytearray(total)
+
+        if total:
+            # Each file is read straight to its offset in arena, so the
+            # base object must outlive the reads.
+            base = _c.c_char.from_buffer(arena)
+            address = _c.addressof(base)
+
+            for directory_file, offset, size in reads:
+                _read_file_into(directory_file, address + offset, size)
+
+            del base
+
+        view = memoryview(arena)
+        views = []
+
+        for file_id in ids:
+            if file_id is None:
+                views.append(None)
+            else:
+                offset, size = offsets[file_id]
+                views.append(view[offset:offset + size])
+
+        return arena, views
+
     @staticmethod
     # hlUInt hlPackageGetAttributeCount();
     def get_attribute_count():
@@ -1762,10 +2458,11 @@ class Package(object):
         """
         pointer = hlVoidPtr()
 
-        if not _hl.hlPackageCreateStream(directory_file, _c.byref(result)):
+        if not _hl.hlPackageCreateStream(directory_file, _c.byref(pointer)):
             raise HLError("Failed to create stream from directory "
                     "file {0}.".format(directory_file.get_name()))
 
+        _metric_counters["streams_created"] += 1
         return HLStream(pointer)
 
     @staticmethod
@@ -1773,32 +2470,115 @@ class Package(object):
     def release_stream(stream):
         """Releases the given stream."""
         _hl.hlPackageReleaseStream(stream)
+        _metric_counters["streams_released"] += 1
 
 
-class NCFFile(object):
-    """A collection of static methods for dealing with NCF packages."""
+class HLFragmentationReport(_collections.namedtuple("HLFragmentationReport",
+        ["allocated_blocks", "used_blocks", "block_length",
+        "fragmented_blocks", "files"])):
+    """The result of GCFFile.get_fragmentation_report().
 
-    @staticmethod
-    # const hlChar *hlNCFFileGetRootPath();
-    def get_root_path():
-        """Returns the NCF's root path.
+    Attributes:
+        allocated_blocks: The number of blocks allocated in the package.
 
-        Raises:
-            HLError: If there is an error getting the root path.
-        """
-        result = _hl.hlNCFFileGetRootPath()
+        used_blocks: The number of blocks holding file data.
 
-        if result is None:
-            raise HLError("Failed to get root path.")
+        block_length: The length of a block in bytes.
 
-        return result.decode(_unicode_encoding)
+        fragmented_blocks: The estimated number of blocks, over all
+            files, that do not directly follow the previous block of
+            their file. Each costs a seek when the file is read.
 
-    @staticmethod
-    # hlVoid hlNCFFileSetRootPath(const hlChar *lpRootPath);
-    def set_root_path(root_path):
-        """Sets the NCF's root path."""
-        root_path = _encode(root_path)
-        _hl.hlNCFFileSetRootPath(root_path)
+        files: A list of (path, size, blocks, fragmented_blocks) tuples
+            for fragmented files, most fragmented blocks first. Paths
+            are relative to the package root.
+    """
+
+    @property
+    def fragmentation(self):
+        """The fraction of used blocks that are fragmented."""
+        if self.used_blocks == 0:
+            return 0.0
+
+        return float(self.fragmented_blocks) / self.used_blocks
+
+
+class GCFFile(object):
+    """A collection of static methods for dealing with GCF packages."""
+
+    @staticmethod
+    def get_fragmentation_report():
+        """Returns fragmentation statistics for the bound GCF package.
+
+        Reads the HL_GCF_ITEM_FRAGMENTATION attribute (the percentage
+        of a file's blocks that are out of place) of every file, along
+        with the package's block counts, in a single pass over the
+        directory.
+
+        Returns:
+            An HLFragmentationReport.
+
+        Raises:
+            HLError: If the bound package is not a GCF package. Or if
+                there is an error reading its attributes.
+        """
+        if Package.get_type() != HLPackageType.HL_PACKAGE_GCF:
+            raise HLError("Fragmentation is only reported for GCF packages.")
+
+        hlpa = HLPackageAttribute
+        allocated_blocks = Package.get_attribute(
+                hlpa.HL_GCF_PACKAGE_ALLOCATED_BLOCKS).get()
+        used_blocks = Package.get_attribute(
+                hlpa.HL_GCF_PACKAGE_USED_BLOCKS).get()
+        block_length = Package.get_attribute(
+                hlpa.HL_GCF_PACKAGE_BLOCK_LENGTH).get()
+
+        total_fragmented = 0
+        files = []
+
+        for path, directory_file in Package.get_root().iter_files():
+            fragmentation = Package.get_item_attribute(directory_file,
+                    hlpa.HL_GCF_ITEM_FRAGMENTATION).get()
+
+            if fragmentation <= 0:
+                continue
+
+            size = directory_file.get_size_on_disk()
+            blocks = (size + block_length - 1) // block_length
+            fragmented = int(round(blocks * fragmentation / 100.0))
+            total_fragmented += fragmented
+            files.append((path, size, blocks, fragmented))
+
+        files.sort(key=lambda f: f[3], reverse=True)
+
+        return HLFragmentationReport(allocated_blocks, used_blocks,
+                block_length, total_fragmented, files)
+
+
+class NCFFile(object):
+    """A collection of static methods for dealing with NCF packages."""
+
+    @staticmethod
+    # const hlChar *hlNCFFileGetRootPath();
+    def get_root_path():
+        """Returns the NCF's root path.
+
+        Raises:
+            HLError: If there is an error getting the root path.
+        """
+        result = _hl.hlNCFFileGetRootPath()
+
+        if result is None:
+            raise HLError("Failed to get root path.")
+
+        return result.decode(_unicode_encoding)
+
+    @staticmethod
+    # hlVoid hlNCFFileSetRootPath(const hlChar *lpRootPath);
+    def set_root_path(root_path):
+        """Sets the NCF's root path."""
+        root_path = _encode(root_path)
+        _hl.hlNCFFileSetRootPath(root_path)
 
 
 class WADFile(object):
@@ -1961,17 +2741,35 @@ class WADFile(object):
 
 _unicode_encoding = _sys.getdefaultencoding()
 
+# See set_progress_throttle().
+_progress_min_bytes = 0
+_progress_min_seconds = 0.0
+
 
 def _encode(string):
     """Encode a unicode string using the set encoding."""
-    version = _sys.version_info[0]
-
-    if ((version == 2 and isinstance(string, unicode)) or
-            (version == 3 and isinstance(string, str))):
+    if isinstance(string, _text_type):
         return string.encode(_unicode_encoding)
-    else:
-        # Good luck.
-        return string
+
+    # Good luck.
+    return string
+
+
+def _normalize_path(path):
+    """Returns path with "/" separators and no empty components."""
+    if isinstance(path, bytes) and not isinstance(path, str):
+        path = path.decode(_unicode_encoding)
+
+    return "/".join(name for name in path.replace("\\", "/").split("/")
+            if name)
+
+
+def _path_key(path, find_type):
+    """Returns the key of a normalized path in a path index."""
+    if find_type & HLFindType.HL_FIND_CASE_SENSITIVE:
+        return path
+
+    return path.lower()
 
 
 def set_unicode_encoding(encoding):
@@ -1991,31 +2789,104 @@ def get_unicode_encoding():
     return _unicode_encoding
 
 
+def set_progress_throttle(min_bytes=0, min_seconds=0.0):
+    """Sets how often progress callbacks are called.
+
+    A progress tick (HL_PROC_EXTRACT_FILE_PROGRESS, etc.) is passed on to
+    the callback once at least min_bytes have been processed or
+    min_seconds have passed since the previous call, and always when an
+    item completes. If both are 0, the default, every tick is passed on.
+    Cancellation by deadline or cancel_event is checked on every tick
+    regardless.
+    """
+    global _progress_min_bytes, _progress_min_seconds
+    _progress_min_bytes = min_bytes
+    _progress_min_seconds = min_seconds
+
+
+def get_progress_throttle():
+    """Returns a tuple of (min_bytes, min_seconds).
+
+    See set_progress_throttle().
+    """
+    return _progress_min_bytes, _progress_min_seconds
+
+
 def _get_const_compatible_buffer(buf, n):
     """Returns buffer that can be passed as const pointer to C function."""
     if len(buf) < n:
         raise HLError("Buffer length ({0}) is smaller than "
-                "requested length ({1}).".format(len_buf), n)
-
-    version = _sys.version_info[0]
+                "requested length ({1}).".format(len(buf), n))
 
     # Can pass strings directly to C functions taking const pointers.
-    if not (version == 2 and isinstance(buf, str) or
-            version == 3 and isinstance(buf, bytes)):
+    if not isinstance(buf, bytes):
         try:
             # Can create ctypes buffer from writeable buffers.
             buf = (_c.c_byte * n).from_buffer(buf)
-            print("writeable buf")
         except TypeError:
             # Cannot create ctypes buffer from non-writeable buffers.
             # Fall back on copying the buffer if type supports it.
-            print("other buf")
             buf = (_c.c_byte * n).from_buffer_copy(buf)
-            print("other buf success")
 
     return buf
 
 
+def load(path=None):
+    """Loads the C library.
+
+    The library is loaded automatically, from the default path, the
+    first time one of its functions is needed. Call this beforehand to
+    load it from elsewhere, or to report a missing library early.
+    Calling it again without a path, or with the same path, does
+    nothing.
+
+    Args:
+        path: The path or name of the library, or an object providing
+            its functions (e.g. a ctypes.CDLL). Defaults to the
+            HLLIB_LIBRARY environment variable if set, else "libhl.so"
+            ("HLLib" on Windows) on the system's library search path.
+
+    Raises:
+        HLError: If another library is already loaded, if the library
+            cannot be loaded, or if its version does not match this
+            module's.
+    """
+    with _load_lock:
+        if _hl.library is not None:
+            if path is not None and path != _hl.path:
+                raise HLError("HLLib is already loaded from {0}.".format(
+                        _hl.path))
+
+            return
+
+        if path is None:
+            path = _os.environ.get("HLLIB_LIBRARY") or _default_library_path
+
+        if isinstance(path, _string_types):
+            try:
+                library = _library_loader.LoadLibrary(path)
+            except OSError as ex:
+                raise HLError("Failed to load HLLib from {0}: {1}".format(
+                        path, ex))
+        else:
+            library = path
+
+        _hl.library = library
+        _hl.path = path
+
+        try:
+            version_number = get_value(HLOption.HL_VERSION, hlUInt)
+        except Exception:
+            _hl.clear()
+            raise
+
+        if HL_VERSION_NUMBER != version_number:
+            _hl.clear()
+            raise HLError("Python module version ({0}) and C library "
+                    "version ({1}) do not match.".format(HL_VERSION_NUMBER,
+                    version_number))
+
+
 # hlVoid hlInitialize();
 def initialize():
     """Initialize the library."""
@@ -2025,6 +2896,7 @@ def initialize():
 # hlVoid hlShutdown();
 def shutdown():
     """Perform cleanup and shutdown the library."""
+    _release_streams()
     _hl.hlShutdown()
 
 
@@ -2235,6 +3107,11 @@ def get_value(option, hl_type=None):
     return function(option)
 
 
+# hlVoid hlSetBoolean(HLOption eOption, hlBool bValue);
+def _set_boolean(option, value):
+    _hl.hlSetBoolean(option, value)
+
+
 # TODO Define callback setters more succinctly.
 
 
@@ -2351,127 +3228,292 @@ def _set_proc_size_ex(option, callback):
 
 # typedef hlVoid (*PExtractItemStartProc) (const HLDirectoryItem *pItem);
 _proc_extract_item_start_type = _callback_factory(None, hlVoidPtr)
-_proc_extract_item_start = None
+_extract_item_start_callback = None
 
 
-def _set_proc_extract_item_start(option, callback):
-    def wrapper(handle):
-        callback(_hl_directory_instance(handle))
+def _extract_item_start(handle):
+    item = _hl_directory_instance(handle)
+
+    if _trace_recorder is not None:
+        _trace_recorder.begin(item.get_name(), "extract")
+
+    if _extract_item_start_callback is not None:
+        _extract_item_start_callback(item)
 
-    global _proc_extract_item_start
-    _proc_extract_item_start = _proc_extract_item_start_type(wrapper)
-    _hl.hlSetVoid(option, _proc_extract_item_start)
+
+_proc_extract_item_start = _proc_extract_item_start_type(_extract_item_start)
+
+
+def _set_proc_extract_item_start(option, callback):
+    global _extract_item_start_callback
+    _extract_item_start_callback = callback
+    _update_proc_extract_item()
 
 
 # typedef hlVoid (*PExtractItemEndProc) (const HLDirectoryItem *pItem,
 #       hlBool bSuccess);
 _proc_extract_item_end_type = _callback_factory(None, hlVoidPtr, hlBool)
-_proc_extract_item_end = None
+_extract_item_end_callback = None
+
+
+def _extract_item_end(handle, success):
+    item = _hl_directory_instance(handle)
+
+    if _extract_item_end_callback is not None:
+        _extract_item_end_callback(item, success)
+
+    if _trace_recorder is not None:
+        _trace_recorder.end(item.get_name(), "extract",
+                {"success": bool(success)})
+
+
+_proc_extract_item_end = _proc_extract_item_end_type(_extract_item_end)
 
 
 def _set_proc_extract_item_end(option, callback):
-    def wrapper(handle, success):
-        callback(_hl_directory_instance(handle), success)
+    global _extract_item_end_callback
+    _extract_item_end_callback = callback
+    _update_proc_extract_item()
 
-    global _proc_extract_item_end
-    _proc_extract_item_end = _proc_extract_item_end_type(wrapper)
-    _hl.hlSetVoid(option, _proc_extract_item_end)
 
+# Whether the item start and end trampolines are registered with HLLib.
+_proc_extract_item_installed = False
 
-# typedef hlVoid (*PExtractFileProgressProc) (const HLDirectoryItem *pFile,
-#       hlUInt uiBytesExtracted, hlUInt uiBytesTotal, hlBool *pCancel);
-_proc_extract_file_progress_type = _callback_factory(None, hlVoidPtr,
-        hlUInt, hlUInt, _c.POINTER(hlBool))
-_proc_extract_file_progress = None
 
+def _update_proc_extract_item():
+    """Registers the item start/end trampolines while anything needs them.
 
-def _set_proc_extract_file_progress(option, callback):
-    def wrapper(handle, bytes_extracted, bytes_total, cancel):
-        try:
-            callback(_hl_directory_instance(handle),
-                    bytes_extracted, bytes_total)
-        except HLCancel:
-            cancel[0] = True
+    They are needed by the callbacks set for HL_PROC_EXTRACT_ITEM_START
+    and HL_PROC_EXTRACT_ITEM_END, and by the trace recorder.
+    """
+    global _proc_extract_item_installed
+    needed = (_extract_item_start_callback is not None or
+            _extract_item_end_callback is not None or
+            _trace_recorder is not None)
 
-    global _proc_extract_file_progress
-    _proc_extract_file_progress = _proc_extract_file_progress_type(wrapper)
-    _hl.hlSetVoid(option, _proc_extract_file_progress)
+    if needed and not _proc_extract_item_installed:
+        _hl.hlSetVoid(HLOption.HL_PROC_EXTRACT_ITEM_START,
+                _proc_extract_item_start)
+        _hl.hlSetVoid(HLOption.HL_PROC_EXTRACT_ITEM_END,
+                _proc_extract_item_end)
+    elif not needed and _proc_extract_item_installed:
+        _hl.hlSetVoid(HLOption.HL_PROC_EXTRACT_ITEM_START, None)
+        _hl.hlSetVoid(HLOption.HL_PROC_EXTRACT_ITEM_END, None)
 
+    _proc_extract_item_installed = needed
 
-# typedef hlVoid (*PValidateFileProgressProc) (const HLDirectoryItem *pFile,
-#       hlUInt uiBytesValidated, hlUInt uiBytesTotal, hlBool *pCancel);
-_proc_validate_file_progress_type = _callback_factory(None, hlVoidPtr,
-        hlUInt, hlUInt, _c.POINTER(hlBool))
-_proc_validate_file_progress = None
 
+class _Cancellation(object):
+    """A deadline and/or event that cancels the current operation.
 
-def _set_proc_validate_file_progress(option, callback):
-    def wrapper(handle, bytes_validated, bytes_total, cancel):
-        try:
-            callback(_hl_directory_instance(handle),
-                    bytes_validated, bytes_total)
-        except HLCancel:
-            cancel[0] = True
+    While active (see _cancellable()), the progress callbacks cancel
+    the operation in progress at their next tick once the deadline has
+    passed or the event is set.
+    """
 
-    global _proc_validate_file_progress
-    _proc_validate_file_progress = _proc_validate_file_progress_type(wrapper)
-    _hl.hlSetVoid(option, _proc_validate_file_progress)
+    def __init__(self, deadline, cancel_event):
+        self.deadline = deadline
+        self.cancel_event = cancel_event
+        self.triggered = False
 
+    def check(self):
+        """Raises HLCancel if the operation should be canceled."""
+        if ((self.deadline is not None and _time.time() >= self.deadline) or
+                (self.cancel_event is not None and
+                self.cancel_event.is_set())):
+            self.triggered = True
+            raise HLCancel()
 
-# typedef hlVoid (*PDefragmentProgressProc) (const HLDirectoryItem *pFile,
-#       hlUInt uiFilesDefragmented, hlUInt uiFilesTotal,
-#       hlUInt uiBytesDefragmented, hlUInt uiBytesTotal, hlBool *pCancel);
-_proc_defragment_progress_type = _callback_factory(None, hlVoidPtr,
-        hlUInt, hlUInt, hlUInt, hlUInt, _c.POINTER(hlBool))
-_proc_defragment_progress = None
 
+_cancellation = None
+
+
+@_contextlib.contextmanager
+def _cancellable(deadline, cancel_event, progress):
+    """Makes progress callbacks cancel on deadline or cancel_event.
+
+    Args:
+        deadline: A time.time() value, or None.
+
+        cancel_event: A threading.Event (or similar), or None.
+
+        progress: The _ProgressProc through which the operation reports
+            progress.
+
+    Yields:
+        The active _Cancellation, or None if both deadline and
+        cancel_event are None.
+    """
+    global _cancellation
+
+    if deadline is None and cancel_event is None:
+        yield None
+        return
+
+    progress.install()
+    _cancellation = _Cancellation(deadline, cancel_event)
+
+    try:
+        yield _cancellation
+    finally:
+        _cancellation = None
+
+        if progress.callback is None:
+            progress.uninstall()
+
+
+class _ProgressProc(object):
+    """Trampoline for one of the HL_PROC_*_PROGRESS options.
+
+    Progress is reported by HLLib every few kilobytes, so ticks are
+    throttled according to set_progress_throttle() before reaching the
+    Python callback. Ticks carry running totals, so skipped ticks are
+    coalesced into the next delivered one, and the tick completing an
+    item is always delivered. The item wrapper is reused for as long as
+    ticks concern the same item.
+
+    The trampoline is registered with HLLib only while there is a
+    callback or an active _Cancellation that needs it.
+    """
+
+    def __init__(self, option, proc_type, per_item=True):
+        """Initializes the trampoline.
+
+        Args:
+            option: The HL_PROC_*_PROGRESS option.
+
+            proc_type: The ctypes function type of the callback.
+
+            per_item: Whether the byte counts of ticks are per item, as
+                for extraction and validation, rather than running
+                totals for the whole package, as for defragmentation.
+        """
+        self.option = option
+        self.callback = None
+        self._proc = proc_type(self._tick)
+        self._installed = False
+        self._per_item = per_item
+        self._handle = None
+        self._item = None
+        self._bytes_handle = None
+        self._delivered_bytes = 0
+        self._delivered_time = 0.0
+
+    def set_callback(self, callback):
+        self.callback = callback
+
+        if callback is None:
+            self.uninstall()
+        else:
+            self.install()
+
+    def install(self):
+        if not self._installed:
+            _hl.hlSetVoid(self.option, self._proc)
+            self._installed = True
+
+    def uninstall(self):
+        # The ctypes function object is kept so HLLib can never be left
+        # holding a dangling pointer.
+        if self._installed:
+            _hl.hlSetVoid(self.option, None)
+            self._installed = False
+            self._handle = self._item = None
+
+    def _tick(self, handle, *args):
+        cancel = args[-1]
+        args = args[:-1]
 
-def _set_proc_defragment_progress(option, callback):
-    def wrapper(handle, files_defragmented, files_total,
-            bytes_defragmented, bytes_total, cancel):
         try:
-            callback(_hl_directory_instance(handle), files_defragmented,
-                    files_total, bytes_defragmented, bytes_total)
+            if self.callback is not None and self._should_deliver(handle,
+                    args[-2], args[-1]):
+                if handle != self._handle:
+                    self._handle = handle
+                    self._item = _hl_directory_instance(handle)
+
+                self._delivered_bytes = args[-2]
+                self._delivered_time = _time.time()
+                self.callback(self._item, *args)
+
+            if _cancellation is not None:
+                _cancellation.check()
         except HLCancel:
             cancel[0] = True
 
-    global _proc_defragment_progress
-    _proc_defragment_progress = _proc_defragment_progress_type(wrapper)
-    _hl.hlSetVoid(option, _proc_defragment_progress)
+    def _should_deliver(self, handle, bytes_done, bytes_total):
+        if self._per_item and handle != self._bytes_handle:
+            self._bytes_handle = handle
+            self._delivered_bytes = 0
+        elif bytes_done < self._delivered_bytes:
+            # A new operation started counting from 0.
+            self._delivered_bytes = 0
+
+        if bytes_done >= bytes_total:
+            return True
+
+        if not _progress_min_bytes and not _progress_min_seconds:
+            return True
+
+        if (_progress_min_bytes and
+                bytes_done - self._delivered_bytes >= _progress_min_bytes):
+            return True
+
+        return bool(_progress_min_seconds and
+                _time.time() - self._delivered_time >= _progress_min_seconds)
+
+
+# typedef hlVoid (*PExtractFileProgressProc) (const HLDirectoryItem *pFile,
+#       hlUInt uiBytesExtracted, hlUInt uiBytesTotal, hlBool *pCancel);
+_extract_file_progress = _ProgressProc(
+        HLOption.HL_PROC_EXTRACT_FILE_PROGRESS,
+        _callback_factory(None, hlVoidPtr, hlUInt, hlUInt,
+                _c.POINTER(hlBool)))
+
+# typedef hlVoid (*PValidateFileProgressProc) (const HLDirectoryItem *pFile,
+#       hlUInt uiBytesValidated, hlUInt uiBytesTotal, hlBool *pCancel);
+_validate_file_progress = _ProgressProc(
+        HLOption.HL_PROC_VALIDATE_FILE_PROGRESS,
+        _callback_factory(None, hlVoidPtr, hlUInt, hlUInt,
+                _c.POINTER(hlBool)))
 
+# typedef hlVoid (*PDefragmentProgressProc) (const HLDirectoryItem *pFile,
+#       hlUInt uiFilesDefragmented, hlUInt uiFilesTotal,
+#       hlUInt uiBytesDefragmented, hlUInt uiBytesTotal, hlBool *pCancel);
+_defragment_progress = _ProgressProc(
+        HLOption.HL_PROC_DEFRAGMENT_PROGRESS,
+        _callback_factory(None, hlVoidPtr, hlUInt, hlUInt, hlUInt, hlUInt,
+                _c.POINTER(hlBool)), per_item=False)
 
 # typedef hlVoid (*PDefragmentProgressExProc) (const HLDirectoryItem *pFile,
 #       hlUInt uiFilesDefragmented, hlUInt uiFilesTotal,
 #       hlULongLong uiBytesDefragmented, hlULongLong uiBytesTotal,
 #       hlBool *pCancel);
-_proc_defragment_progress_ex_type = _callback_factory(None, hlVoidPtr,
-        hlUInt, hlUInt, hlULongLong, hlULongLong, _c.POINTER(hlBool))
-_proc_defragment_progress_ex = None
-
+_defragment_progress_ex = _ProgressProc(
+        HLOption.HL_PROC_DEFRAGMENT_PROGRESS_EX,
+        _callback_factory(None, hlVoidPtr, hlUInt, hlUInt, hlULongLong,
+                hlULongLong, _c.POINTER(hlBool)), per_item=False)
+
+_progress_procs = {
+    HLOption.HL_PROC_EXTRACT_FILE_PROGRESS: _extract_file_progress,
+    HLOption.HL_PROC_VALIDATE_FILE_PROGRESS: _validate_file_progress,
+    HLOption.HL_PROC_DEFRAGMENT_PROGRESS: _defragment_progress,
+    HLOption.HL_PROC_DEFRAGMENT_PROGRESS_EX: _defragment_progress_ex,
+}
 
-def _set_proc_defragment_progress_ex(option, callback):
-    def wrapper(handle, files_defragmented, files_total,
-            bytes_defragmented, bytes_total, cancel):
-        try:
-            callback(_hl_directory_instance(handle), files_defragmented,
-                    files_total, bytes_defragmented, bytes_total)
-        except HLCancel:
-            cancel[0] = True
 
-    global _proc_defragment_progress_ex
-    _proc_defragment_progress_ex = _proc_defragment_progress_ex_type(wrapper)
-    _hl.hlSetVoid(option, _proc_defragment_progress_ex)
+def _set_proc_progress(option, callback):
+    _progress_procs[option].set_callback(callback)
 
 
 _setters = {
-    (HLOption.HL_OVERWRITE_FILES, hlBool): _hl.hlSetBoolean,
-    (HLOption.HL_OVERWRITE_FILES, None): _hl.hlSetBoolean,
+    (HLOption.HL_OVERWRITE_FILES, hlBool): _set_boolean,
+    (HLOption.HL_OVERWRITE_FILES, None): _set_boolean,
 
-    (HLOption.HL_READ_ENCRYPTED, hlBool): _hl.hlSetBoolean,
-    (HLOption.HL_READ_ENCRYPTED, None): _hl.hlSetBoolean,
+    (HLOption.HL_READ_ENCRYPTED, hlBool): _set_boolean,
+    (HLOption.HL_READ_ENCRYPTED, None): _set_boolean,
 
-    (HLOption.HL_FORCE_DEFRAGMENT, hlBool): _hl.hlSetBoolean,
-    (HLOption.HL_FORCE_DEFRAGMENT, None): _hl.hlSetBoolean,
+    (HLOption.HL_FORCE_DEFRAGMENT, hlBool): _set_boolean,
+    (HLOption.HL_FORCE_DEFRAGMENT, None): _set_boolean,
 
     (HLOption.HL_PROC_OPEN, hlVoidPtr): _set_proc_open,
     (HLOption.HL_PROC_OPEN, None): _set_proc_open,
@@ -2514,24 +3556,24 @@ _setters = {
         _set_proc_extract_item_end,
 
     (HLOption.HL_PROC_EXTRACT_FILE_PROGRESS, hlVoidPtr):
-        _set_proc_extract_file_progress,
+        _set_proc_progress,
     (HLOption.HL_PROC_EXTRACT_FILE_PROGRESS, None):
-        _set_proc_extract_file_progress,
+        _set_proc_progress,
 
     (HLOption.HL_PROC_VALIDATE_FILE_PROGRESS, hlVoidPtr):
-        _set_proc_validate_file_progress,
+        _set_proc_progress,
     (HLOption.HL_PROC_VALIDATE_FILE_PROGRESS, None):
-        _set_proc_validate_file_progress,
+        _set_proc_progress,
 
     (HLOption.HL_PROC_DEFRAGMENT_PROGRESS, hlVoidPtr):
-        _set_proc_defragment_progress,
+        _set_proc_progress,
     (HLOption.HL_PROC_DEFRAGMENT_PROGRESS, None):
-        _set_proc_defragment_progress,
+        _set_proc_progress,
 
     (HLOption.HL_PROC_DEFRAGMENT_PROGRESS_EX, hlVoidPtr):
-        _set_proc_defragment_progress_ex,
+        _set_proc_progress,
     (HLOption.HL_PROC_DEFRAGMENT_PROGRESS_EX, None):
-        _set_proc_defragment_progress_ex,
+        _set_proc_progress,
 }
 
 
@@ -2571,528 +3613,1712 @@ def set_value(option, value, hl_type=None):
     return function(option, value)
 
 
-# Ctypes Function Specifications
+# Package utilities
 
-# hlVoid hlInitialize();
-_hl.hlInitialize.argtypes = []
-_hl.hlInitialize.restype = None
+# Item attributes holding the CRC-32 of a file's contents, by package type.
+_crc_attributes = {
+    HLPackageType.HL_PACKAGE_SGA: HLPackageAttribute.HL_SGA_ITEM_CRC,
+    HLPackageType.HL_PACKAGE_VBSP: HLPackageAttribute.HL_VBSP_ZIP_ITEM_CRC,
+    HLPackageType.HL_PACKAGE_VPK: HLPackageAttribute.HL_VPK_ITEM_CRC,
+    HLPackageType.HL_PACKAGE_ZIP: HLPackageAttribute.HL_ZIP_ITEM_CRC,
+}
 
-# hlVoid hlShutdown();
-_hl.hlShutdown.argtypes = []
-_hl.hlShutdown.restype = None
 
-# Get/Set
+def _get_crc(directory_file, crc_attribute):
+    """Returns the file's CRC-32 as recorded by the bound package.
+
+    Returns None if the package type records no CRC, or if there is
+    none for this file (e.g. BSP lumps outside the pakfile).
+    """
+    if crc_attribute is None:
+        return None
 
-# hlBool hlGetBoolean(HLOption eOption);
-_hl.hlGetBoolean.argtypes = [hlInt]
-_hl.hlGetBoolean.restype = hlBool
+    try:
+        attribute = Package.get_item_attribute(directory_file, crc_attribute)
+        return attribute.get() & 0xffffffff
+    except HLError:
+        return None
 
-# hlBool hlGetBooleanValidate(HLOption eOption, hlBool *pValue);
-_hl.hlGetBooleanValidate.argtypes = [hlInt, _c.POINTER(hlBool)]
-_hl.hlGetBooleanValidate.restype = hlBool
 
-# hlVoid hlSetBoolean(HLOption eOption, hlBool bValue);
-_hl.hlSetBoolean.argtypes = [hlInt, hlBool]
-_hl.hlSetBoolean.restype = None
+# Item attributes holding the index of the archive that a file's
+# contents are stored in, by package type.
+_archive_attributes = {
+    HLPackageType.HL_PACKAGE_VPK: HLPackageAttribute.HL_VPK_ITEM_ARCHIVE,
+}
 
-# hlInt hlGetInteger(HLOption eOption);
-_hl.hlGetInteger.argtypes = [hlInt]
-_hl.hlGetInteger.restype = hlInt
 
-#hlBool hlGetIntegerValidate(HLOption eOption, hlInt *pValue);
-_hl.hlGetIntegerValidate.argtypes = [hlInt, _c.POINTER(hlInt)]
-_hl.hlGetIntegerValidate.restype = hlBool
+def _get_archive(directory_file, archive_attribute):
+    """Returns the index of the archive holding the file's contents.
 
-# hlVoid hlSetInteger(HLOption eOption, hlInt iValue);
-_hl.hlSetInteger.argtypes = [hlInt, hlInt]
-_hl.hlSetInteger.restype = None
+    Returns 0 if the package type has a single archive, or if the
+    attribute cannot be read for this file.
+    """
+    if archive_attribute is None:
+        return 0
 
-# hlUInt hlGetUnsignedInteger(HLOption eOption);
-_hl.hlGetUnsignedInteger.argtypes = [hlInt]
-_hl.hlGetUnsignedInteger.restype = hlUInt
+    try:
+        attribute = Package.get_item_attribute(directory_file,
+                archive_attribute)
+        return attribute.get()
+    except HLError:
+        return 0
 
-# hlBool hlGetUnsignedIntegerValidate(HLOption eOption, hlUInt *pValue);
-_hl.hlGetUnsignedIntegerValidate.argtypes = [hlInt, _c.POINTER(hlUInt)]
-_hl.hlGetUnsignedIntegerValidate.restype = hlBool
 
-# hlVoid hlSetUnsignedInteger(HLOption eOption, hlUInt iValue);
-_hl.hlSetUnsignedInteger.argtypes = [hlInt, hlUInt]
-_hl.hlSetUnsignedInteger.restype = None
+def _read_file_into(directory_file, address, size):
+    """Reads size bytes of the file's contents to the given address."""
+    with directory_file.open() as stream:
+        bytes_read = 0
 
-# hlLongLong hlGetLongLong(HLOption eOption);
-_hl.hlGetLongLong.argtypes = [hlInt]
-_hl.hlGetLongLong.restype = hlLongLong
+        while bytes_read < size:
+            count = _hl.hlStreamRead(stream, address + bytes_read,
+                    size - bytes_read)
 
-# hlBool hlGetLongLongValidate(HLOption eOption, hlLongLong *pValue);
-_hl.hlGetLongLongValidate.argtypes = [hlInt, _c.POINTER(hlLongLong)]
-_hl.hlGetLongLongValidate.restype = hlBool
+            if count == 0:
+                raise HLError("Failed to read file at {0}.".format(
+                        directory_file.get_path()))
 
-# hlVoid hlSetLongLong(HLOption eOption, hlLongLong iValue);
-_hl.hlSetLongLong.argtypes = [hlInt, hlLongLong]
-_hl.hlSetLongLong.restype = None
+            bytes_read += count
 
-# hlULongLong hlGetUnsignedLongLong(HLOption eOption);
-_hl.hlGetUnsignedLongLong.argtypes = [hlInt]
-_hl.hlGetUnsignedLongLong.restype = hlULongLong
 
-# hlBool hlGetUnsignedLongLongValidate(HLOption eOption, hlULongLong *pValue);
-_hl.hlGetUnsignedLongLongValidate.argtypes = [hlInt, _c.POINTER(hlULongLong)]
-_hl.hlGetUnsignedLongLongValidate.restype = hlBool
+def _get_file_crc(directory_file):
+    """Returns the CRC-32 of the file's contents, read via a stream."""
+    crc = 0
 
-# hlVoid hlSetUnsignedLongLong(HLOption eOption, hlULongLong iValue);
-_hl.hlSetUnsignedLongLong.argtypes = [hlInt, hlULongLong]
-_hl.hlSetUnsignedLongLong.restype = None
+    for chunk in directory_file.iter_chunks():
+        crc = _zlib.crc32(chunk, crc)
 
-# hlFloat hlGetFloat(HLOption eOption);
-_hl.hlGetFloat.argtypes = [hlInt]
-_hl.hlGetFloat.restype = hlFloat
+    return crc & 0xffffffff
 
-# hlBool hlGetFloatValidate(HLOption eOption, hlFloat *pValue);
-_hl.hlGetFloatValidate.argtypes = [hlInt, _c.POINTER(hlFloat)]
-_hl.hlGetFloatValidate.restype = hlBool
 
-# hlVoid hlSetFloat(HLOption eOption, hlFloat fValue);
-_hl.hlSetFloat.argtypes = [hlInt, hlFloat]
-_hl.hlSetFloat.restype = None
+def _get_file_digest(directory_file):
+    """Returns the SHA-1 of the file's contents, read via a stream."""
+    digest = _hashlib.sha1()
 
-# const hlChar *hlGetString(HLOption eOption);
-_hl.hlGetString.argtypes = [hlInt]
-_hl.hlGetString.restype = hlString
+    for chunk in directory_file.iter_chunks():
+        digest.update(chunk)
 
-# hlBool hlGetStringValidate(HLOption eOption, const hlChar **pValue);
-_hl.hlGetStringValidate.argtypes = [hlInt, _c.POINTER(hlString)]
-_hl.hlGetStringValidate.restype = hlBool
+    return digest.digest()
 
-# hlVoid hlSetString(HLOption eOption, const hlChar *lpValue);
-_hl.hlSetString.argtypes = [hlInt, hlString]
-_hl.hlSetString.restype = None
 
-# const hlVoid *hlGetVoid(HLOption eOption);
-_hl.hlGetVoid.argtypes = [hlInt]
-_hl.hlGetVoid.restype = hlVoidPtr
+def _index_package(package_id):
+    """Binds package_id and maps its file paths to file information.
 
-# hlBool hlGetVoidValidate(HLOption eOption, const hlVoid **pValue);
-_hl.hlGetVoidValidate.argtypes = [hlInt, _c.POINTER(hlVoidPtr)]
-_hl.hlGetVoidValidate.restype = hlBool
-
-# hlVoid hlSetVoid(HLOption eOption, const hlVoid *pValue);
-_hl.hlSetVoid.argtypes = [hlInt, hlVoidPtr]
-_hl.hlSetVoid.restype = None
-
-# Attributes
-
-# hlBool hlAttributeGetBoolean(HLAttribute *pAttribute);
-_hl.hlAttributeGetBoolean.argtypes = [_c.POINTER(HLAttribute)]
-_hl.hlAttributeGetBoolean.restype = hlBool
-
-# hlVoid hlAttributeSetBoolean(HLAttribute *pAttribute,
-#       const hlChar *lpName, hlBool bValue);
-_hl.hlAttributeSetBoolean.argtypes = [
-        _c.POINTER(HLAttribute), hlString, hlBool]
-_hl.hlAttributeSetBoolean.restype = None
+    Paths are relative to the package root and use "/" as the separator.
+    Values are tuples of the file, its size, and its recorded CRC-32
+    (or None).
+    """
+    Package.bind_package(package_id)
+    crc_attribute = _crc_attributes.get(Package.get_type())
+    index = {}
+
+    for path, directory_file in Package.get_root().iter_files():
+        index[path] = (directory_file, directory_file.get_size(),
+                _get_crc(directory_file, crc_attribute))
+
+    return index
+
+
+HLDiff = _collections.namedtuple("HLDiff", ["added", "removed", "changed"])
+
+
+def diff(package_a, package_b):
+    """Compares the files in two open packages without extracting them.
+
+    Files are matched by path. A file in both packages is changed if
+    the sizes differ, or if the CRC-32s recorded by the packages (see
+    the HL_*_ITEM_CRC attributes) differ. If only one package records
+    a CRC-32 for the file, the other file's CRC-32 is computed from its
+    contents. If neither does, both files' contents are hashed.
+
+    The package that was bound before the call, if any, is bound again
+    before returning.
+
+    Args:
+        package_a: The ID of the old package, as returned by
+            Package.create_package().
+
+        package_b: The ID of the new package.
+
+    Returns:
+        An HLDiff whose added, removed and changed attributes are sorted
+        lists of the paths (relative to the package root, using "/" as
+        the separator) added in package_b, removed from package_a, and
+        changed between them.
+
+    Raises:
+        HLError: If there is an error reading either package.
+    """
+    previous_package = _bound_package_id
+
+    try:
+        files_a = _index_package(package_a)
+        files_b = _index_package(package_b)
+
+        added = sorted(path for path in files_b if path not in files_a)
+        removed = sorted(path for path in files_a if path not in files_b)
+        changed = []
+
+        for path in sorted(path for path in files_a if path in files_b):
+            file_a, size_a, crc_a = files_a[path]
+            file_b, size_b, crc_b = files_b[path]
 
-# hlInt hlAttributeGetInteger(HLAttribute *pAttribute);
-_hl.hlAttributeGetInteger.argtypes = [_c.POINTER(HLAttribute)]
-_hl.hlAttributeGetInteger.restype = hlInt
-
-# hlVoid hlAttributeSetInteger(HLAttribute *pAttribute,
-#       const hlChar *lpName, hlInt iValue);
-_hl.hlAttributeSetInteger.argtypes = [_c.POINTER(HLAttribute), hlString, hlInt]
-_hl.hlAttributeSetInteger.restype = None
-
-# hlUInt hlAttributeGetUnsignedInteger(HLAttribute *pAttribute);
-_hl.hlAttributeGetUnsignedInteger.argtypes = [_c.POINTER(HLAttribute)]
-_hl.hlAttributeGetUnsignedInteger.restype = hlInt
-
-# hlVoid hlAttributeSetUnsignedInteger(HLAttribute *pAttribute,
-#       const hlChar *lpName, hlUInt uiValue, hlBool bHexadecimal);
-_hl.hlAttributeSetUnsignedInteger.argtypes = [
-        _c.POINTER(HLAttribute), hlString, hlUInt, hlBool]
-_hl.hlAttributeSetUnsignedInteger.restype = None
-
-# hlFloat hlAttributeGetFloat(HLAttribute *pAttribute);
-_hl.hlAttributeGetFloat.argtypes = [_c.POINTER(HLAttribute)]
-_hl.hlAttributeGetFloat.restype = hlFloat
-
-# hlVoid hlAttributeSetFloat(HLAttribute *pAttribute,
-#       const hlChar *lpName, hlFloat fValue);
-_hl.hlAttributeSetFloat.argtypes = [_c.POINTER(HLAttribute), hlString, hlFloat]
-_hl.hlAttributeSetFloat.restype = None
-
-# const hlChar *hlAttributeGetString(HLAttribute *pAttribute);
-_hl.hlAttributeGetString.argtypes = [_c.POINTER(HLAttribute)]
-_hl.hlAttributeGetString.restype = hlString
-
-# hlVoid hlAttributeSetString(HLAttribute *pAttribute,
-#       const hlChar *lpName, const hlChar *lpValue);
-_hl.hlAttributeSetString.argtypes = [
-        _c.POINTER(HLAttribute), hlString, hlString]
-_hl.hlAttributeSetString.restype = None
-
-# Directory Item
-
-# HLDirectoryItemType hlItemGetType(const HLDirectoryItem *pItem);
-_hl.hlItemGetType.argtypes = [hlVoidPtr]
-_hl.hlItemGetType.restype = hlInt
-
-# const hlChar *hlItemGetName(const HLDirectoryItem *pItem);
-_hl.hlItemGetName.argtypes = [hlVoidPtr]
-_hl.hlItemGetName.restype = hlString
-
-# hlUInt hlItemGetID(const HLDirectoryItem *pItem);
-_hl.hlItemGetID.argtypes = [hlVoidPtr]
-_hl.hlItemGetID.restype = hlUInt
-
-# const hlVoid *hlItemGetData(const HLDirectoryItem *pItem);
-_hl.hlItemGetData.argtypes = [hlVoidPtr]
-_hl.hlItemGetData.restype = hlVoidPtr
-
-# hlUInt hlItemGetPackage(const HLDirectoryItem *pItem);
-_hl.hlItemGetPackage.argtypes = [hlVoidPtr]
-_hl.hlItemGetPackage.restype = hlUInt
-
-# HLDirectoryItem *hlItemGetParent(HLDirectoryItem *pItem);
-_hl.hlItemGetParent.argtypes = [hlVoidPtr]
-_hl.hlItemGetParent.restype = hlVoidPtr
-
-# hlBool hlItemGetSize(const HLDirectoryItem *pItem, hlUInt *pSize);
-_hl.hlItemGetSize.argtypes = [hlVoidPtr, _c.POINTER(hlUInt)]
-_hl.hlItemGetSize.restype = hlBool
-
-# hlBool hlItemGetSizeEx(const HLDirectoryItem *pItem, hlULongLong *pSize);
-_hl.hlItemGetSizeEx.argtypes = [hlVoidPtr, _c.POINTER(hlULongLong)]
-_hl.hlItemGetSizeEx.restype = hlBool
-
-# hlBool hlItemGetSizeOnDisk(const HLDirectoryItem *pItem, hlUInt *pSize);
-_hl.hlItemGetSizeOnDisk.argtypes = [hlVoidPtr, _c.POINTER(hlUInt)]
-_hl.hlItemGetSizeOnDisk.restype = hlBool
-
-# hlBool hlItemGetSizeOnDiskEx(const HLDirectoryItem *pItem,
-#       hlULongLong *pSize);
-_hl.hlItemGetSizeOnDiskEx.argtypes = [hlVoidPtr, _c.POINTER(hlULongLong)]
-_hl.hlItemGetSizeOnDiskEx.restype = hlBool
-
-# hlVoid hlItemGetPath(const HLDirectoryItem *pItem,
-#       hlChar *lpPath, hlUInt uiPathSize);
-_hl.hlItemGetPath.argtypes = [hlVoidPtr, hlString, hlUInt]
-_hl.hlItemGetPath.restype = None
-
-# hlBool hlItemExtract(HLDirectoryItem *pItem, const hlChar *lpPath);
-_hl.hlItemExtract.argtypes = [hlVoidPtr, hlString]
-_hl.hlItemExtract.restype = hlBool
-
-# Directory Folder
-
-# hlUInt hlFolderGetCount(const HLDirectoryItem *pItem);
-_hl.hlFolderGetCount.argtypes = [hlVoidPtr]
-_hl.hlFolderGetCount.restype = hlUInt
-
-# HLDirectoryItem *hlFolderGetItem(HLDirectoryItem *pItem, hlUInt uiIndex);
-_hl.hlFolderGetItem.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlFolderGetItem.restype = hlVoidPtr
-
-# HLDirectoryItem *hlFolderGetItemByName(HLDirectoryItem *pItem,
-#       const hlChar *lpName, HLFindType eFind);
-_hl.hlFolderGetItemByName.argtypes = [hlVoidPtr, hlString, hlInt]
-_hl.hlFolderGetItemByName.restype = hlVoidPtr
-
-# HLDirectoryItem *hlFolderGetItemByPath(HLDirectoryItem *pItem,
-#       const hlChar *lpPath, HLFindType eFind);
-_hl.hlFolderGetItemByPath.argtypes = [hlVoidPtr, hlString, hlInt]
-_hl.hlFolderGetItemByPath.restype = hlVoidPtr
-
-# hlVoid hlFolderSort(HLDirectoryItem *pItem,
-#       HLSortField eField, HLSortOrder eOrder, hlBool bRecurse);
-_hl.hlFolderSort.argtypes = [hlVoidPtr, hlInt, hlInt, hlBool]
-_hl.hlFolderSort.restype = None
-
-# HLDirectoryItem *hlFolderFindFirst(HLDirectoryItem *pFolder,
-#       const hlChar *lpSearch, HLFindType eFind);
-_hl.hlFolderFindFirst.argtypes = [hlVoidPtr, hlString, hlInt]
-_hl.hlFolderFindFirst.restype = hlVoidPtr
-
-# HLDirectoryItem *hlFolderFindNext(HLDirectoryItem *pFolder,
-#       HLDirectoryItem *pItem, const hlChar *lpSearch, HLFindType eFind);
-_hl.hlFolderFindNext.argtypes = [hlVoidPtr, hlVoidPtr, hlString, hlInt]
-_hl.hlFolderFindNext.restype = hlVoidPtr
-
-# hlUInt hlFolderGetSize(const HLDirectoryItem *pItem, hlBool bRecurse);
-_hl.hlFolderGetSize.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetSize.restype = hlUInt
-
-# hlULongLong hlFolderGetSizeEx(const HLDirectoryItem *pItem, hlBool bRecurse);
-_hl.hlFolderGetSizeEx.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetSizeEx.restype = hlULongLong
-
-# hlUInt hlFolderGetSizeOnDisk(const HLDirectoryItem *pItem, hlBool bRecurse);
-_hl.hlFolderGetSizeOnDisk.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetSizeOnDisk.restype = hlUInt
+            if size_a != size_b:
+                is_changed = True
+            elif crc_a is not None and crc_b is not None:
+                is_changed = crc_a != crc_b
+            elif crc_a is not None:
+                Package.bind_package(package_b)
+                is_changed = crc_a != _get_file_crc(file_b)
+            elif crc_b is not None:
+                Package.bind_package(package_a)
+                is_changed = crc_b != _get_file_crc(file_a)
+            else:
+                Package.bind_package(package_a)
+                digest_a = _get_file_digest(file_a)
+                Package.bind_package(package_b)
+                is_changed = digest_a != _get_file_digest(file_b)
 
-# hlULongLong hlFolderGetSizeOnDiskEx(const HLDirectoryItem *pItem,
-#       hlBool bRecurse);
-_hl.hlFolderGetSizeOnDiskEx.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetSizeOnDiskEx.restype = hlULongLong
-
-# hlUInt hlFolderGetFolderCount(const HLDirectoryItem *pItem, hlBool bRecurse);
-_hl.hlFolderGetFolderCount.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetFolderCount.restype = hlUInt
-
-# hlUInt hlFolderGetFileCount(const HLDirectoryItem *pItem, hlBool bRecurse);
-_hl.hlFolderGetFileCount.argtypes = [hlVoidPtr, hlBool]
-_hl.hlFolderGetFileCount.restype = hlUInt
-
-# Directory File
+            if is_changed:
+                changed.append(path)
 
-# hlUInt hlFileGetExtractable(const HLDirectoryItem *pItem);
-_hl.hlFileGetExtractable.argtypes = [hlVoidPtr]
-_hl.hlFileGetExtractable.restype = hlUInt
+        return HLDiff(added, removed, changed)
+    finally:
+        if previous_package is not None:
+            Package.bind_package(previous_package)
 
-# HLValidation hlFileGetValidation(const HLDirectoryItem *pItem);
-_hl.hlFileGetValidation.argtypes = [hlVoidPtr]
-_hl.hlFileGetValidation.restype = hlInt
 
-# hlUInt hlFileGetSize(const HLDirectoryItem *pItem);
-_hl.hlFileGetSize.argtypes = [hlVoidPtr]
-_hl.hlFileGetSize.restype = hlUInt
+def _open_package(package_path, file_mode, ncf_root=None):
+    """Creates, binds and opens a package, and returns its ID."""
+    package_type = Package.get_package_type_from_file(package_path)
 
-# hlUInt hlFileGetSizeOnDisk(const HLDirectoryItem *pItem);
-_hl.hlFileGetSizeOnDisk.argtypes = [hlVoidPtr]
-_hl.hlFileGetSizeOnDisk.restype = hlUInt
+    if package_type == HLPackageType.HL_PACKAGE_NONE:
+        raise HLError("Unsupported package type for {0}.".format(
+                package_path))
 
-# hlBool hlFileCreateStream(HLDirectoryItem *pItem, HLStream **pStream);
-_hl.hlFileCreateStream.argtypes = [hlVoidPtr, hlVoidPtr]
-_hl.hlFileCreateStream.restype = hlBool
+    package_id = Package.create_package(package_type)
 
-# hlVoid hlFileReleaseStream(HLDirectoryItem *pItem, HLStream *pStream);
-_hl.hlFileReleaseStream.argtypes = [hlVoidPtr, hlVoidPtr]
-_hl.hlFileReleaseStream.restype = None
+    try:
+        Package.bind_package(package_id)
+        Package.open_file(package_path, file_mode)
+    except HLError:
+        Package.delete_package(package_id)
+        raise
 
-# Stream
-
-# HLStreamType hlStreamGetType(const HLStream *pStream);
-_hl.hlStreamGetType.argtypes = [hlVoidPtr]
-_hl.hlStreamGetType.restype = hlInt
-
-# hlBool hlStreamGetOpened(const HLStream *pStream);
-_hl.hlStreamGetOpened.argtypes = [hlVoidPtr]
-_hl.hlStreamGetOpened.restype = hlBool
+    if package_type == HLPackageType.HL_PACKAGE_NCF and ncf_root is not None:
+        NCFFile.set_root_path(ncf_root)
 
-# hlUInt hlStreamGetMode(const HLStream *pStream);
-_hl.hlStreamGetMode.argtypes = [hlVoidPtr]
-_hl.hlStreamGetMode.restype = hlUInt
+    return package_id
 
-# hlBool hlStreamOpen(HLStream *pStream, hlUInt uiMode);
-_hl.hlStreamOpen.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlStreamOpen.restype = hlBool
-
-# hlVoid hlStreamClose(HLStream *pStream);
-_hl.hlStreamClose.argtypes = [hlVoidPtr]
-_hl.hlStreamClose.restype = None
-
-# hlUInt hlStreamGetStreamSize(const HLStream *pStream);
-_hl.hlStreamGetStreamSize.argtypes = [hlVoidPtr]
-_hl.hlStreamGetStreamSize.restype = hlUInt
-
-# hlULongLong hlStreamGetStreamSizeEx(const HLStream *pStream);
-_hl.hlStreamGetStreamSizeEx.argtypes = [hlVoidPtr]
-_hl.hlStreamGetStreamSizeEx.restype = hlULongLong
-
-# hlUInt hlStreamGetStreamPointer(const HLStream *pStream);
-_hl.hlStreamGetStreamPointer.argtypes = [hlVoidPtr]
-_hl.hlStreamGetStreamPointer.restype = hlUInt
 
-# hlULongLong hlStreamGetStreamPointerEx(const HLStream *pStream);
-_hl.hlStreamGetStreamPointerEx.argtypes = [hlVoidPtr]
-_hl.hlStreamGetStreamPointerEx.restype = hlULongLong
+def _close_package(package_id):
+    """Binds, closes and deletes a package opened by _open_package()."""
+    Package.bind_package(package_id)
+    Package.close()
+    Package.delete_package(package_id)
 
-# hlUInt hlStreamSeek(HLStream *pStream,
-#       hlLongLong iOffset, HLSeekMode eSeekMode);
-_hl.hlStreamSeek.argtypes = [hlVoidPtr, hlLongLong, hlInt]
-_hl.hlStreamSeek.restype = hlUInt
 
-# hlULongLong hlStreamSeekEx(HLStream *pStream,
-#       hlLongLong iOffset, HLSeekMode eSeekMode);
-_hl.hlStreamSeekEx.argtypes = [hlVoidPtr, hlLongLong, hlInt]
-_hl.hlStreamSeekEx.restype = hlULongLong
+def _list_files(package_path, file_mode, ncf_root=None):
+    """Returns a list of (path, size) tuples for a package's files.
+
+    The package is opened and closed with a handle of its own, and the
+    previously bound package is bound again afterwards.
+    """
+    previous_package = _bound_package_id
+    package_id = _open_package(package_path, file_mode, ncf_root)
+
+    try:
+        return [(path, directory_file.get_size()) for path, directory_file
+                in Package.get_root().iter_files()]
+    finally:
+        _close_package(package_id)
+
+        if previous_package is not None:
+            Package.bind_package(previous_package)
+
+
+def _partition_by_size(files, count):
+    """Splits (path, size) tuples into count lists of similar total size.
+
+    Largest files are placed first, each into the currently smallest
+    shard. Empty shards are dropped.
+    """
+    shards = [(0, idx, []) for idx in range(count)]
+
+    for path, size in sorted(files, key=lambda f: f[1], reverse=True):
+        total, idx, paths = _heapq.heappop(shards)
+        paths.append(path)
+        _heapq.heappush(shards, (total + size, idx, paths))
+
+    return [paths for _, _, paths in sorted(shards, key=lambda s: s[1])
+            if paths]
+
+
+# The package root in pool worker processes, and the error raised while
+# opening it, if any. See _map_shards().
+_worker_root = None
+_worker_error = None
+
+
+def _init_worker(library_path, package_path, file_mode, ncf_root):
+    global _worker_root, _worker_error
+
+    try:
+        # Workers that are not forked start without the library loaded.
+        if library_path is not None:
+            load(library_path)
+
+        initialize()
+        _open_package(package_path, file_mode, ncf_root)
+        _worker_root = Package.get_root()
+    except HLError as ex:
+        # Raising here would make the pool restart the worker forever.
+        _worker_error = ex
+
+
+def _run_shard(task):
+    function, paths = task
+
+    if _worker_error is not None:
+        raise _worker_error
+
+    return function(paths)
+
+
+def _map_shards(package_path, file_mode, ncf_root, files, jobs, function):
+    """Applies function to shards of files across worker processes.
+
+    Each worker process opens the package once, with a handle of its
+    own, since HLLib's state cannot be shared between processes. Files
+    are split into several shards per worker, balanced by size, so
+    that workers finishing early can pick up more work.
+
+    Args:
+        files: A list of (path, size) tuples.
+
+        jobs: The number of worker processes.
+
+        function: A module-level function taking a list of paths, run
+            in the worker processes with the package bound and
+            _worker_root set.
+
+    Yields:
+        The results of function, in order of completion.
+    """
+    shards = _partition_by_size(files, jobs * 4)
+    library_path = (_hl.path if isinstance(_hl.path, _string_types)
+            else None)
+    pool = _multiprocessing.Pool(jobs, _init_worker,
+            (library_path, package_path, file_mode, ncf_root))
+
+    try:
+        tasks = [(function, paths) for paths in shards]
+
+        for result in pool.imap_unordered(_run_shard, tasks):
+            yield result
+
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _verify_crc_shard(paths):
+    crc_attribute = _crc_attributes.get(Package.get_type())
+    results = []
+
+    for path in paths:
+        directory_file = _worker_root.get_item_by_path(
+                path, HLFindType.HL_FIND_FILES)
+
+        if directory_file is None:
+            results.append((path, 0, None, None))
+            continue
+
+        expected = _get_crc(directory_file, crc_attribute)
+
+        if expected is None:
+            results.append((path, 0, None, None))
+            continue
+
+        try:
+            actual = _get_file_crc(directory_file)
+        except HLError:
+            actual = None
+
+        results.append((path, directory_file.get_size(), expected, actual))
+
+    return results
+
+
+def _validate_shard(paths):
+    results = []
+
+    for path in paths:
+        directory_file = _worker_root.get_item_by_path(
+                path, HLFindType.HL_FIND_FILES)
+
+        if directory_file is None:
+            results.append((path, HLValidation.HL_VALIDATES_ERROR))
+        else:
+            results.append((path, directory_file.get_validation()))
+
+    return results
+
+
+def validate_files(package_path, paths=None,
+        file_mode=HLFileMode.HL_MODE_READ, jobs=None, ncf_root=None,
+        progress=None):
+    """Validates files in a package using multiple processes.
+
+    Equivalent to calling HLDirectoryFile.get_validation() on each file,
+    but the files are split into shards of similar total size, and
+    validated by worker processes, each with its own handle to the
+    package. The caller's bound package is left bound.
+
+    Args:
+        package_path: The path of the package to validate.
+
+        paths: The paths of the files to validate, relative to the
+            package root and using "/" as the separator. Defaults to
+            every file in the package.
+
+        file_mode: The mode(s) with which to open the package.
+            See HLFileMode.
+
+        jobs: The number of worker processes. Defaults to the number
+            of CPUs.
+
+        ncf_root: The root path for NCF packages.
+
+        progress: A function called in the calling process each time a
+            shard has been validated, with the number of files and bytes
+            in the shard.
+
+    Returns:
+        A dict mapping each path to its HLValidation value. Paths that
+        do not name a file map to HL_VALIDATES_ERROR.
+
+    Raises:
+        HLError: If there is an error opening the package.
+    """
+    if paths is not None and not paths:
+        return {}
+
+    files = _list_files(package_path, file_mode, ncf_root)
+    sizes = dict(files)
 
-# hlBool hlStreamReadChar(HLStream *pStream, hlChar *pChar);
-_hl.hlStreamReadChar.argtypes = [hlVoidPtr, hlString]
-_hl.hlStreamReadChar.restype = hlBool
+    if paths is not None:
+        files = [(path, sizes.get(path, 0)) for path in set(paths)]
 
-# hlUInt hlStreamRead(HLStream *pStream, hlVoid *lpData, hlUInt uiBytes);
-_hl.hlStreamRead.argtypes = [hlVoidPtr, hlVoidPtr, hlUInt]
-_hl.hlStreamRead.restype = hlUInt
+    validations = {}
 
-# hlBool hlStreamWriteChar(HLStream *pStream, hlChar iChar);
-_hl.hlStreamWriteChar.argtypes = [hlVoidPtr, hlChar]
-_hl.hlStreamWriteChar.restype = hlBool
+    if not files:
+        return validations
 
-# hlUInt hlStreamWrite(HLStream *pStream,
-#       const hlVoid *lpData, hlUInt uiBytes);
-_hl.hlStreamWrite.argtypes = [hlVoidPtr, hlVoidPtr, hlUInt]
-_hl.hlStreamWrite.restype = hlUInt
+    for results in _map_shards(package_path, file_mode, ncf_root, files,
+            jobs or _multiprocessing.cpu_count(), _validate_shard):
+        validations.update(results)
+
+        if progress is not None:
+            progress(len(results), sum(sizes.get(path, 0)
+                    for path, _ in results))
+
+    return validations
+
+
+class ValidationCache(object):
+    """A sidecar store of file validation results for a package.
+
+    Results from HLDirectoryFile.get_validation() are keyed by item ID,
+    along with the data archive holding the file's contents (see
+    HL_VPK_ITEM_ARCHIVE). They are returned as they are while the path,
+    size and modification time of the package file, and of that
+    archive (e.g. one of the _NNN.vpk archives of a _dir.vpk), are
+    unchanged. A change to an archive discards only the results for
+    the files stored in it, but a change to the package file itself
+    (a _dir.vpk, or a package with no separate archives) discards them
+    all, since item IDs may no longer refer to the same files. A file's
+    recorded size and CRC-32 stay the same when its contents are
+    corrupted in place, which is just what validation has to catch, so
+    they cannot show that a result still holds.
+
+    Canceled and errored validations are not cached.
+
+    Use as a context manager, or call save(), to write the store.
+    """
+
+    def __init__(self, package_path, cache_path=None):
+        """Loads the store for a package.
+
+        Args:
+            package_path: The path of the package.
+
+            cache_path: The path of the store. Defaults to the package
+                path with ".hlvalidation" appended.
+        """
+        self._path = cache_path or package_path + ".hlvalidation"
+        self._package = self._get_fingerprint(package_path)
+        self._archives = {}
+        self._entries = {}
+
+        for path in _get_archive_paths(package_path):
+            # Keyed by archive index, from the NNN of name_NNN.vpk.
+            self._archives[str(int(path[-7:-4]))] = (
+                    self._get_fingerprint(path))
+
+        try:
+            with open(self._path) as f:
+                data = _json.load(f)
+        except (EnvironmentError, ValueError):
+            data = {}
+
+        if data.get("package") == self._package:
+            archives = data.get("archives", {})
+
+            # Files whose archive is not one of the package's archives
+            # are stored in the package file itself.
+            for file_id, entry in data.get("entries", {}).items():
+                archive = str(entry[1])
+
+                if archives.get(archive) == self._archives.get(archive):
+                    self._entries[file_id] = entry
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+
+    @staticmethod
+    def _get_fingerprint(path):
+        stat = _os.stat(path)
+        return [_os.path.abspath(path), stat.st_size, stat.st_mtime]
+
+    def lookup(self, directory_file):
+        """Returns the cached validation for a file, or None."""
+        entry = self._entries.get(str(directory_file.get_id()))
+        return None if entry is None else entry[0]
+
+    def store(self, directory_file, validation):
+        """Caches the validation for a file."""
+        v = HLValidation
+
+        if validation in (v.HL_VALIDATES_CANCELED, v.HL_VALIDATES_ERROR):
+            return
+
+        archive = _get_archive(directory_file,
+                _archive_attributes.get(Package.get_type()))
+        self._entries[str(directory_file.get_id())] = [validation, archive]
+
+    def get_validation(self, directory_file):
+        """As HLDirectoryFile.get_validation(), but using the cache."""
+        validation = self.lookup(directory_file)
+
+        if validation is None:
+            validation = directory_file.get_validation()
+            self.store(directory_file, validation)
+
+        return validation
+
+    def save(self):
+        """Writes the store, replacing the previous one."""
+        temp_path = self._path + ".tmp"
+
+        with open(temp_path, "w") as f:
+            _json.dump({"package": self._package,
+                    "archives": self._archives, "entries": self._entries}, f)
+
+        if _os.name == "nt" and _os.path.exists(self._path):
+            # Renaming over an existing file fails on Windows.
+            _os.remove(self._path)
+
+        _os.rename(temp_path, self._path)
+
+
+def _get_archive_paths(package_path):
+    """Returns the paths of the data archives a package refers to.
+
+    Only VPK packages are split this way: "name_dir.vpk" refers to
+    "name_000.vpk", "name_001.vpk", etc. in the same directory.
+    """
+    directory, name = _os.path.split(_os.path.abspath(package_path))
+
+    if not name.lower().endswith("_dir.vpk"):
+        return []
+
+    prefix = name[:-len("dir.vpk")]
+    paths = []
+
+    for archive_name in _os.listdir(directory):
+        number = archive_name[len(prefix):-len(".vpk")]
+
+        if (len(archive_name) == len(prefix) + 7 and
+                archive_name[:len(prefix)].lower() == prefix.lower() and
+                archive_name.lower().endswith(".vpk") and number.isdigit()):
+            paths.append(_os.path.join(directory, archive_name))
+
+    return sorted(paths)
+
+
+class HLVerifyResult(_collections.namedtuple("HLVerifyResult",
+        ["files", "bytes", "seconds", "mismatches", "unchecked"])):
+    """The result of verify_crcs().
+
+    Attributes:
+        files: The number of files whose CRC-32 was checked.
+
+        bytes: The number of bytes read.
+
+        seconds: The wall time taken.
+
+        mismatches: A list of (path, expected_crc, actual_crc) tuples
+            for files whose contents do not match their recorded CRC-32.
+            actual_crc is None if the file could not be read.
+
+        unchecked: A list of paths of files with no recorded CRC-32.
+    """
+
+    @property
+    def throughput(self):
+        """The number of bytes read per second."""
+        return self.bytes / self.seconds if self.seconds > 0 else 0.0
+
+
+def verify_crcs(package_path, file_mode=HLFileMode.HL_MODE_READ,
+        jobs=None, ncf_root=None, progress=None):
+    """Verifies the recorded CRC-32 of each file in a package.
+
+    Unlike HLDirectoryFile.get_validation(), which for several formats
+    only returns HL_VALIDATES_ASSUMED_OK, this reads every file and
+    compares its contents against the CRC-32 recorded by the package
+    (see the HL_*_ITEM_CRC attributes for VPK, ZIP, BSP pakfile and
+    SGA packages). Files are read in parallel by worker processes,
+    each with its own handle to the package. The caller's bound
+    package is left bound.
+
+    Args:
+        package_path: The path of the package to verify.
+
+        file_mode: The mode(s) with which to open the package.
+            See HLFileMode.
+
+        jobs: The number of worker processes. Defaults to the number
+            of CPUs.
+
+        ncf_root: The root path for NCF packages.
+
+        progress: A function called in the calling process each time a
+            shard has been verified, with the number of files and bytes
+            in the shard, including files without a recorded CRC-32.
+
+    Returns:
+        An HLVerifyResult.
+
+    Raises:
+        HLError: If there is an error opening the package.
+    """
+    start = _time.time()
+    files = _list_files(package_path, file_mode, ncf_root)
+    sizes = dict(files)
+    checked = byte_count = 0
+    mismatches = []
+    unchecked = []
+
+    for results in _map_shards(package_path, file_mode, ncf_root, files,
+            jobs or _multiprocessing.cpu_count(), _verify_crc_shard):
+        for path, size, expected, actual in results:
+            if expected is None:
+                unchecked.append(path)
+                continue
+
+            checked += 1
+            byte_count += size
+
+            if actual != expected:
+                mismatches.append((path, expected, actual))
+
+        if progress is not None:
+            progress(len(results), sum(sizes[path]
+                    for path, _, _, _ in results))
+
+    return HLVerifyResult(checked, byte_count, _time.time() - start,
+            sorted(mismatches), sorted(unchecked))
+
+
+class MemoryBudgetPolicy(object):
+    """Opens the bound package in the fastest mode that fits a budget.
+
+    Modes are tried from fastest to cheapest: quick file mapping, which
+    maps the whole package at once; file mapping, which maps views as
+    they are needed; and no file mapping, which reads views into memory
+    allocated for them. Quick file mapping is only tried for packages
+    no larger than the budget. After opening, and whenever check() is
+    called, HL_PACKAGE_TOTAL_MEMORY_ALLOCATED is compared against the
+    budget, and the package is reopened in the next cheaper mode while
+    it is over.
+
+    Attributes:
+        budget: The memory budget in bytes.
+
+        file_mode: The mode the package is currently open with.
+    """
+
+    # Mapping flags from fastest to cheapest.
+    _MAPPING_MODES = [
+        HLFileMode.HL_MODE_QUICK_FILEMAPPING,
+        0,
+        HLFileMode.HL_MODE_NO_FILEMAPPING,
+    ]
+
+    def __init__(self, budget):
+        """Initializes the policy with a budget in bytes."""
+        self.budget = budget
+        self.file_mode = None
+        self._file_name = None
+        self._base_mode = None
+        self._ncf_root = None
+        self._level = None
+
+    def open_file(self, file_name, file_mode=HLFileMode.HL_MODE_READ,
+            ncf_root=None):
+        """Opens file_name with the bound package.
+
+        Args:
+            file_name: The path of the file to open.
+
+            file_mode: The mode(s) with which to open the package.
+                HL_MODE_NO_FILEMAPPING and HL_MODE_QUICK_FILEMAPPING are
+                ignored; the policy picks the mapping mode.
+
+            ncf_root: The root path for NCF packages.
+
+        Returns:
+            The mode the package was opened with.
+
+        Raises:
+            HLError: If there is an error opening the package.
+        """
+        self._file_name = file_name
+        self._base_mode = file_mode & ~(HLFileMode.HL_MODE_NO_FILEMAPPING |
+                HLFileMode.HL_MODE_QUICK_FILEMAPPING)
+        self._ncf_root = ncf_root
+        self._level = 0 if _os.path.getsize(file_name) <= self.budget else 1
+        self._open()
+
+        while self._over_budget():
+            self._reopen()
+
+        return self.file_mode
+
+    def check(self):
+        """Reopens the package in a cheaper mode if it is over budget.
+
+        Reopening invalidates every HLDirectoryItem and HLStream of the
+        package, so only call this between operations, and look up
+        items again if it returns True.
+
+        Returns:
+            True if the package was reopened.
+
+        Raises:
+            HLError: If there is an error reopening the package.
+        """
+        if not self._over_budget():
+            return False
+
+        self._reopen()
+
+        while self._over_budget():
+            self._reopen()
+
+        return True
+
+    def get_memory_allocated(self):
+        """Returns the bound package's mapping memory allocated in bytes."""
+        return get_value(HLOption.HL_PACKAGE_TOTAL_MEMORY_ALLOCATED,
+                hlULongLong)
+
+    def _over_budget(self):
+        return (self._level < len(self._MAPPING_MODES) - 1 and
+                self.get_memory_allocated() > self.budget)
+
+    def _open(self):
+        self.file_mode = self._base_mode | self._MAPPING_MODES[self._level]
+        Package.open_file(self._file_name, self.file_mode)
+
+        if (self._ncf_root is not None and
+                Package.get_type() == HLPackageType.HL_PACKAGE_NCF):
+            NCFFile.set_root_path(self._ncf_root)
+
+    def _reopen(self):
+        Package.close()
+        self._level += 1
+        self._open()
+
+
+# Tracing
+
+
+class TraceRecorder(object):
+    """Records events in the Chrome trace event format.
+
+    Once set with set_trace_recorder(), package opening and closing,
+    defragmentation, and the extraction and validation of each item are
+    recorded. Applications can record their own spans with
+    trace_span(). Saved traces can be viewed in chrome://tracing or
+    https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.events = []
+        self._pid = _os.getpid()
+        self._start = _time.time()
+
+    def begin(self, name, category, args=None):
+        """Records the beginning of a span."""
+        self._add("B", name, category, args)
+
+    def end(self, name, category, args=None):
+        """Records the end of the most recently begun span."""
+        self._add("E", name, category, args)
+
+    @_contextlib.contextmanager
+    def span(self, name, category, args=None):
+        """Records a span around the body of a with statement."""
+        self.begin(name, category, args)
+
+        try:
+            yield
+        finally:
+            self.end(name, category)
+
+    def save(self, path):
+        """Writes the recorded events to path as JSON."""
+        with open(path, "w") as f:
+            _json.dump({"traceEvents": self.events,
+                    "displayTimeUnit": "ms"}, f)
+
+    def _add(self, phase, name, category, args):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": phase,
+            "ts": int((_time.time() - self._start) * 1e6),
+            "pid": self._pid,
+            "tid": _threading.current_thread().ident,
+        }
+
+        if args:
+            event["args"] = args
+
+        self.events.append(event)
+
+
+_trace_recorder = None
+
+
+def set_trace_recorder(recorder):
+    """Sets the TraceRecorder recording HLLib activity, or None."""
+    global _trace_recorder
+    _trace_recorder = recorder
+    _update_proc_extract_item()
+
+
+def get_trace_recorder():
+    """Returns the TraceRecorder set by set_trace_recorder(), or None."""
+    return _trace_recorder
+
+
+@_contextlib.contextmanager
+def trace_span(name, category, args=None):
+    """Records a span with the current TraceRecorder, if any."""
+    if _trace_recorder is None:
+        yield
+        return
+
+    with _trace_recorder.span(name, category, args):
+        yield
+
+
+# Metrics
+
+# Counts of wrapper objects and stream operations. See get_metrics().
+_metric_counters = {
+    "items_created": 0,
+    "streams_created": 0,
+    "streams_released": 0,
+    "streams_opened": 0,
+    "streams_closed": 0,
+    "streams_leaked": 0,
+}
+
+# The number of open MetricsExporters. Item wrappers are counted only
+# while there is one, see _count_items().
+_exporter_count = 0
+
+
+def _init_counted_item(self, handle):
+    self._as_parameter_ = handle
+    _metric_counters["items_created"] += 1
+
+
+def _count_items(count):
+    """Starts or stops counting item wrappers as exporters come and go.
+
+    Counting replaces HLDirectoryItem.__init__, so that creating items
+    costs nothing extra while no exporter is open.
+    """
+    global _exporter_count
+    _exporter_count += count
+
+    if _exporter_count > 0:
+        HLDirectoryItem.__init__ = _init_counted_item
+    else:
+        HLDirectoryItem.__init__ = _init_item
+
+
+_init_item = HLDirectoryItem.__init__
+
+# Packages created with Package.create_package() and not yet deleted,
+# as package ID -> [package type, path passed to Package.open_file()].
+_packages = {}
+
+# The ID last passed to Package.bind_package().
+_bound_package_id = None
+
+# Name, Prometheus type and help text of each metric.
+_metric_descriptions = [
+    ("hllib_packages", "gauge",
+        "Packages created and not yet deleted."),
+    ("hllib_package_size_bytes", "gauge",
+        "Size of the package."),
+    ("hllib_package_mapping_allocations", "gauge",
+        "Number of mapping allocations made by the package."),
+    ("hllib_package_mapping_memory_allocated_bytes", "gauge",
+        "Mapping memory allocated by the package."),
+    ("hllib_package_mapping_memory_used_bytes", "gauge",
+        "Mapping memory in use by the package."),
+    ("hllib_items_created_total", "counter",
+        "HLDirectoryItem wrappers created while exporting."),
+    ("hllib_streams_created_total", "counter",
+        "Streams created."),
+    ("hllib_streams_live", "gauge",
+        "Streams created and not yet released."),
+    ("hllib_streams_open", "gauge",
+        "Streams opened and not yet closed."),
+    ("hllib_streams_leaked_total", "counter",
+        "Streams left for a StreamPool to release."),
+]
+
+# E.g. HL_PACKAGE_GCF -> "gcf".
+_package_type_names = dict((value, name[len("HL_PACKAGE_"):].lower())
+        for name, value in vars(HLPackageType).items()
+        if name.startswith("HL_PACKAGE_"))
+
+_package_metric_options = [
+    ("hllib_package_size_bytes", HLOption.HL_PACKAGE_SIZE),
+    ("hllib_package_mapping_allocations",
+        HLOption.HL_PACKAGE_TOTAL_ALLOCATIONS),
+    ("hllib_package_mapping_memory_allocated_bytes",
+        HLOption.HL_PACKAGE_TOTAL_MEMORY_ALLOCATED),
+    ("hllib_package_mapping_memory_used_bytes",
+        HLOption.HL_PACKAGE_TOTAL_MEMORY_USED),
+]
+
+
+def get_metrics():
+    """Samples metrics for every package and for the Python wrappers.
+
+    Each package created with Package.create_package() is bound in turn
+    to read its HL_PACKAGE_SIZE, HL_PACKAGE_TOTAL_ALLOCATIONS, etc.
+    Packages that are not open are skipped. The previously bound
+    package is bound again afterwards, or if none was, none is left
+    bound.
+
+    Like the rest of HLLib, this must not be called concurrently with
+    other calls into the library.
+
+    Returns:
+        A list of (name, labels, value) tuples, where labels is a dict.
+    """
+    c = _metric_counters
+    samples = [
+        ("hllib_packages", {}, len(_packages)),
+        ("hllib_items_created_total", {}, c["items_created"]),
+        ("hllib_streams_created_total", {}, c["streams_created"]),
+        ("hllib_streams_live", {},
+            c["streams_created"] - c["streams_released"]),
+        ("hllib_streams_open", {},
+            c["streams_opened"] - c["streams_closed"]),
+        ("hllib_streams_leaked_total", {}, c["streams_leaked"]),
+    ]
+
+    previous_package = _bound_package_id
+
+    try:
+        for package_id, (package_type, path) in sorted(_packages.items()):
+            labels = {"package_id": str(package_id),
+                    "type": _package_type_names.get(package_type,
+                    str(package_type))}
+
+            if path is not None:
+                labels["path"] = path
+
+            try:
+                Package.bind_package(package_id)
+                values = [(name, get_value(option, hlULongLong))
+                        for name, option in _package_metric_options]
+            except HLError:
+                # Not open.
+                continue
+
+            samples.extend((name, labels, value) for name, value in values)
+    finally:
+        if previous_package is not None:
+            Package.bind_package(previous_package)
+        elif _bound_package_id is not None:
+            _unbind_package()
+
+    return samples
+
+
+def _unbind_package():
+    """Leaves no package bound.
+
+    HLLib has no call for this, but deleting the bound package unbinds
+    it, so a throwaway package is bound and deleted.
+    """
+    package_id = Package.create_package(HLPackageType.HL_PACKAGE_VPK)
+
+    try:
+        Package.bind_package(package_id)
+    finally:
+        Package.delete_package(package_id)
+
+
+def format_metrics(samples):
+    """Returns samples from get_metrics() in Prometheus text format."""
+    lines = []
+
+    for name, metric_type, help_text in _metric_descriptions:
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} {1}".format(name, metric_type))
+
+        for sample_name, labels, value in samples:
+            if sample_name != name:
+                continue
+
+            if labels:
+                lines.append("{0}{{{1}}} {2}".format(name, ",".join(
+                        '{0}="{1}"'.format(key, _escape_label(labels[key]))
+                        for key in sorted(labels)), value))
+            else:
+                lines.append("{0} {1}".format(name, value))
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+class MetricsExporter(object):
+    """Exports metrics in Prometheus text format.
+
+    Since HLLib is not thread-safe, metrics are only sampled when
+    sample() is called, e.g. between requests or from a periodic task
+    on the thread using HLLib. Each sample is written to a file (for
+    node_exporter's textfile collector, say) and/or served over HTTP
+    from a background thread, which only ever hands out the last
+    sample. Item wrappers are counted from when an exporter is created
+    until it is closed.
+    """
+
+    def __init__(self, path=None, port=None, host="127.0.0.1"):
+        """Initializes the exporter.
+
+        Args:
+            path: The file to write each sample to, or None.
+
+            port: The port to serve the last sample on at /metrics, or
+                None. 0 picks a free port; see the port attribute.
+
+            host: The address to serve on.
+        """
+        self.path = path
+        self.port = None
+        self._text = format_metrics([])
+        self._server = None
+        self._closed = False
+
+        if port is not None:
+            self._start_server(host, port)
+
+        _count_items(1)
+
+    def sample(self):
+        """Samples metrics, then writes and serves them.
+
+        Returns:
+            The metrics in Prometheus text format.
+        """
+        text = format_metrics(get_metrics())
+        self._text = text
+
+        if self.path is not None:
+            temp_path = self.path + ".tmp"
+
+            with open(temp_path, "w") as f:
+                f.write(text)
+
+            if _os.name == "nt" and _os.path.exists(self.path):
+                _os.remove(self.path)
+
+            _os.rename(temp_path, self.path)
+
+        return text
+
+    def close(self):
+        """Stops serving metrics."""
+        if not self._closed:
+            self._closed = True
+            _count_items(-1)
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _start_server(self, host, port):
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+        except ImportError:
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = exporter._text.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type",
+                        "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        self.port = self._server.server_address[1]
+        thread = _threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+
+# Profiling
+
+
+class HLProfileEntry(_collections.namedtuple("HLProfileEntry",
+        ["calls", "seconds", "bytes"])):
+    """Statistics for one C library function. See get_profile().
+
+    Attributes:
+        calls: The number of calls.
+
+        seconds: The total time spent in calls, including ctypes
+            argument conversion, but not the Python callbacks they made
+            (progress callbacks, etc.), nor the calls those made.
+
+        bytes: The number of bytes read or written by the calls, for
+            functions that move data (hlStreamRead(), etc.), else 0.
+    """
+
+
+# Functions counting the bytes moved by a call, given its arguments
+# and result.
+_profile_byte_counters = {
+    "hlStreamRead": lambda args, result: result,
+    "hlStreamWrite": lambda args, result: result,
+    "hlStreamReadChar": lambda args, result: 1 if result else 0,
+    "hlStreamWriteChar": lambda args, result: 1 if result else 0,
+    "hlPackageOpenMemory": lambda args, result: args[1],
+}
+
+_profile_timer = getattr(_time, "perf_counter", _time.time)
+
+# Statistics by function name as [calls, seconds, bytes] lists, and the
+# unwrapped functions, while profiling is enabled.
+_profile = None
+_profile_start = None
+_profiled_functions = {}
+_profile_report_registered = False
+
+# Per-thread time spent in Python callbacks during the innermost C
+# library call in progress, as callback_seconds.
+_profile_local = _threading.local()
+
+
+def _profile_function(name, function):
+    stats = _profile.setdefault(name, [0, 0.0, 0])
+    count_bytes = _profile_byte_counters.get(name)
+    timer = _profile_timer
+    local = _profile_local
+
+    def wrapper(*args):
+        outer_seconds = getattr(local, "callback_seconds", 0.0)
+        local.callback_seconds = 0.0
+        start = timer()
+
+        try:
+            result = function(*args)
+        finally:
+            # Calls made from callbacks are counted on their own, so
+            # the callback time is left out to not count them twice.
+            stats[0] += 1
+            stats[1] += timer() - start - local.callback_seconds
+            local.callback_seconds = outer_seconds
+
+        if count_bytes is not None:
+            stats[2] += count_bytes(args, result)
+
+        return result
+
+    wrapper.__name__ = name
+    return wrapper
+
+
+def _profile_callback(function, args):
+    start = _profile_timer()
+
+    try:
+        return function(*args)
+    finally:
+        _profile_local.callback_seconds = (getattr(_profile_local,
+                "callback_seconds", 0.0) + _profile_timer() - start)
+
+
+def enable_profiling(report=True):
+    """Starts profiling calls into the C library.
+
+    Every function of the C library, including those first used after
+    this call, is wrapped to count its calls, the time spent in them and
+    the bytes they move. Time spent in Python callbacks made by a call
+    is not counted as part of it. Comparing the total time spent in the
+    C library against wall time shows how much time goes to Python code
+    (e.g. creating item wrappers) instead.
+
+    Args:
+        report: Whether to print a report to stderr at exit.
+    """
+    global _profile, _profile_start, _profile_report_registered
+
+    if _profile is not None:
+        return
+
+    _profile = {}
+    _profile_start = _profile_timer()
+
+    for name, function in list(vars(_hl).items()):
+        if name.startswith("hl"):
+            _profiled_functions[name] = function
+            setattr(_hl, name, _profile_function(name, function))
+
+    if report and not _profile_report_registered:
+        _atexit.register(_print_profile)
+        _profile_report_registered = True
+
+
+def disable_profiling():
+    """Stops profiling and unwraps the C library functions."""
+    global _profile
+
+    for name, function in _profiled_functions.items():
+        setattr(_hl, name, function)
+
+    _profiled_functions.clear()
+    _profile = None
+
+
+def reset_profiling():
+    """Zeroes the statistics collected so far."""
+    global _profile_start
+
+    if _profile is not None:
+        for stats in _profile.values():
+            stats[:] = [0, 0.0, 0]
+
+        _profile_start = _profile_timer()
+
+
+def get_profile():
+    """Returns a snapshot of the statistics collected so far.
+
+    Returns:
+        A tuple of the wall time in seconds since profiling was enabled
+        or reset, and a dict mapping the name of each C library function
+        called to an HLProfileEntry.
+
+    Raises:
+        HLError: If profiling is not enabled.
+    """
+    if _profile is None:
+        raise HLError("Profiling is not enabled.")
+
+    return (_profile_timer() - _profile_start,
+            dict((name, HLProfileEntry(*stats))
+            for name, stats in _profile.items() if stats[0]))
+
+
+def _print_profile():
+    if _profile is None:
+        return
+
+    wall_seconds, profile = get_profile()
+    entries = sorted(profile.items(), key=lambda e: e[1].seconds,
+            reverse=True)
+    calls = sum(entry.calls for entry in profile.values())
+    seconds = sum(entry.seconds for entry in profile.values())
+
+    lines = ["HLLib profile: {0:.3f} s wall time, {1:.3f} s ({2:.1%}) in {3} "
+            "C library calls.".format(wall_seconds, seconds,
+            seconds / wall_seconds if wall_seconds > 0 else 0.0, calls),
+            "{0:>10} {1:>10} {2:>10} {3:>14}  {4}".format(
+            "Calls", "Seconds", "us/call", "Bytes", "Function")]
+
+    for name, entry in entries:
+        lines.append("{0:>10} {1:>10.3f} {2:>10.2f} {3:>14}  {4}".format(
+                entry.calls, entry.seconds,
+                entry.seconds / entry.calls * 1e6, entry.bytes, name))
+
+    _sys.stderr.write("\n".join(lines) + "\n")
+
+
+# Ctypes Function Specifications
+
+# Argument and return types of each C library function, bound by
+# _Library the first time the function is used.
+_signatures = {
+    # hlVoid hlInitialize();
+    "hlInitialize": ([], None),
+
+    # hlVoid hlShutdown();
+    "hlShutdown": ([], None),
+
+    # Get/Set
+
+    # hlBool hlGetBoolean(HLOption eOption);
+    "hlGetBoolean": ([hlInt], hlBool),
+
+    # hlBool hlGetBooleanValidate(HLOption eOption, hlBool *pValue);
+    "hlGetBooleanValidate": ([hlInt, _c.POINTER(hlBool)], hlBool),
+
+    # hlVoid hlSetBoolean(HLOption eOption, hlBool bValue);
+    "hlSetBoolean": ([hlInt, hlBool], None),
+
+    # hlInt hlGetInteger(HLOption eOption);
+    "hlGetInteger": ([hlInt], hlInt),
+
+    #hlBool hlGetIntegerValidate(HLOption eOption, hlInt *pValue);
+    "hlGetIntegerValidate": ([hlInt, _c.POINTER(hlInt)], hlBool),
+
+    # hlVoid hlSetInteger(HLOption eOption, hlInt iValue);
+    "hlSetInteger": ([hlInt, hlInt], None),
+
+    # hlUInt hlGetUnsignedInteger(HLOption eOption);
+    "hlGetUnsignedInteger": ([hlInt], hlUInt),
+
+    # hlBool hlGetUnsignedIntegerValidate(HLOption eOption, hlUInt *pValue);
+    "hlGetUnsignedIntegerValidate": ([hlInt, _c.POINTER(hlUInt)], hlBool),
+
+    # hlVoid hlSetUnsignedInteger(HLOption eOption, hlUInt iValue);
+    "hlSetUnsignedInteger": ([hlInt, hlUInt], None),
+
+    # hlLongLong hlGetLongLong(HLOption eOption);
+    "hlGetLongLong": ([hlInt], hlLongLong),
+
+    # hlBool hlGetLongLongValidate(HLOption eOption, hlLongLong *pValue);
+    "hlGetLongLongValidate": ([hlInt, _c.POINTER(hlLongLong)], hlBool),
+
+    # hlVoid hlSetLongLong(HLOption eOption, hlLongLong iValue);
+    "hlSetLongLong": ([hlInt, hlLongLong], None),
+
+    # hlULongLong hlGetUnsignedLongLong(HLOption eOption);
+    "hlGetUnsignedLongLong": ([hlInt], hlULongLong),
+
+    # hlBool hlGetUnsignedLongLongValidate(HLOption eOption,
+    #       hlULongLong *pValue);
+    "hlGetUnsignedLongLongValidate": (
+            [hlInt, _c.POINTER(hlULongLong)], hlBool),
+
+    # hlVoid hlSetUnsignedLongLong(HLOption eOption, hlULongLong iValue);
+    "hlSetUnsignedLongLong": ([hlInt, hlULongLong], None),
+
+    # hlFloat hlGetFloat(HLOption eOption);
+    "hlGetFloat": ([hlInt], hlFloat),
+
+    # hlBool hlGetFloatValidate(HLOption eOption, hlFloat *pValue);
+    "hlGetFloatValidate": ([hlInt, _c.POINTER(hlFloat)], hlBool),
+
+    # hlVoid hlSetFloat(HLOption eOption, hlFloat fValue);
+    "hlSetFloat": ([hlInt, hlFloat], None),
+
+    # const hlChar *hlGetString(HLOption eOption);
+    "hlGetString": ([hlInt], hlString),
+
+    # hlBool hlGetStringValidate(HLOption eOption, const hlChar **pValue);
+    "hlGetStringValidate": ([hlInt, _c.POINTER(hlString)], hlBool),
+
+    # hlVoid hlSetString(HLOption eOption, const hlChar *lpValue);
+    "hlSetString": ([hlInt, hlString], None),
+
+    # const hlVoid *hlGetVoid(HLOption eOption);
+    "hlGetVoid": ([hlInt], hlVoidPtr),
+
+    # hlBool hlGetVoidValidate(HLOption eOption, const hlVoid **pValue);
+    "hlGetVoidValidate": ([hlInt, _c.POINTER(hlVoidPtr)], hlBool),
+
+    # hlVoid hlSetVoid(HLOption eOption, const hlVoid *pValue);
+    "hlSetVoid": ([hlInt, hlVoidPtr], None),
+
+    # Attributes
+
+    # hlBool hlAttributeGetBoolean(HLAttribute *pAttribute);
+    "hlAttributeGetBoolean": ([_c.POINTER(HLAttribute)], hlBool),
+
+    # hlVoid hlAttributeSetBoolean(HLAttribute *pAttribute,
+    #       const hlChar *lpName, hlBool bValue);
+    "hlAttributeSetBoolean": (
+            [_c.POINTER(HLAttribute), hlString, hlBool], None),
+
+    # hlInt hlAttributeGetInteger(HLAttribute *pAttribute);
+    "hlAttributeGetInteger": ([_c.POINTER(HLAttribute)], hlInt),
+
+    # hlVoid hlAttributeSetInteger(HLAttribute *pAttribute,
+    #       const hlChar *lpName, hlInt iValue);
+    "hlAttributeSetInteger": (
+            [_c.POINTER(HLAttribute), hlString, hlInt], None),
+
+    # hlUInt hlAttributeGetUnsignedInteger(HLAttribute *pAttribute);
+    "hlAttributeGetUnsignedInteger": ([_c.POINTER(HLAttribute)], hlInt),
+
+    # hlVoid hlAttributeSetUnsignedInteger(HLAttribute *pAttribute,
+    #       const hlChar *lpName, hlUInt uiValue, hlBool bHexadecimal);
+    "hlAttributeSetUnsignedInteger": (
+            [_c.POINTER(HLAttribute), hlString, hlUInt, hlBool], None),
+
+    # hlFloat hlAttributeGetFloat(HLAttribute *pAttribute);
+    "hlAttributeGetFloat": ([_c.POINTER(HLAttribute)], hlFloat),
+
+    # hlVoid hlAttributeSetFloat(HLAttribute *pAttribute,
+    #       const hlChar *lpName, hlFloat fValue);
+    "hlAttributeSetFloat": (
+            [_c.POINTER(HLAttribute), hlString, hlFloat], None),
+
+    # const hlChar *hlAttributeGetString(HLAttribute *pAttribute);
+    "hlAttributeGetString": ([_c.POINTER(HLAttribute)], hlString),
+
+    # hlVoid hlAttributeSetString(HLAttribute *pAttribute,
+    #       const hlChar *lpName, const hlChar *lpValue);
+    "hlAttributeSetString": (
+            [_c.POINTER(HLAttribute), hlString, hlString], None),
+
+    # Directory Item
+
+    # HLDirectoryItemType hlItemGetType(const HLDirectoryItem *pItem);
+    "hlItemGetType": ([hlVoidPtr], hlInt),
+
+    # const hlChar *hlItemGetName(const HLDirectoryItem *pItem);
+    "hlItemGetName": ([hlVoidPtr], hlString),
+
+    # hlUInt hlItemGetID(const HLDirectoryItem *pItem);
+    "hlItemGetID": ([hlVoidPtr], hlUInt),
+
+    # const hlVoid *hlItemGetData(const HLDirectoryItem *pItem);
+    "hlItemGetData": ([hlVoidPtr], hlVoidPtr),
+
+    # hlUInt hlItemGetPackage(const HLDirectoryItem *pItem);
+    "hlItemGetPackage": ([hlVoidPtr], hlUInt),
+
+    # HLDirectoryItem *hlItemGetParent(HLDirectoryItem *pItem);
+    "hlItemGetParent": ([hlVoidPtr], hlVoidPtr),
+
+    # hlBool hlItemGetSize(const HLDirectoryItem *pItem, hlUInt *pSize);
+    "hlItemGetSize": ([hlVoidPtr, _c.POINTER(hlUInt)], hlBool),
+
+    # hlBool hlItemGetSizeEx(const HLDirectoryItem *pItem, hlULongLong *pSize);
+    "hlItemGetSizeEx": ([hlVoidPtr, _c.POINTER(hlULongLong)], hlBool),
+
+    # hlBool hlItemGetSizeOnDisk(const HLDirectoryItem *pItem, hlUInt *pSize);
+    "hlItemGetSizeOnDisk": ([hlVoidPtr, _c.POINTER(hlUInt)], hlBool),
+
+    # hlBool hlItemGetSizeOnDiskEx(const HLDirectoryItem *pItem,
+    #       hlULongLong *pSize);
+    "hlItemGetSizeOnDiskEx": ([hlVoidPtr, _c.POINTER(hlULongLong)], hlBool),
+
+    # hlVoid hlItemGetPath(const HLDirectoryItem *pItem,
+    #       hlChar *lpPath, hlUInt uiPathSize);
+    "hlItemGetPath": ([hlVoidPtr, hlString, hlUInt], None),
+
+    # hlBool hlItemExtract(HLDirectoryItem *pItem, const hlChar *lpPath);
+    "hlItemExtract": ([hlVoidPtr, hlString], hlBool),
+
+    # Directory Folder
+
+    # hlUInt hlFolderGetCount(const HLDirectoryItem *pItem);
+    "hlFolderGetCount": ([hlVoidPtr], hlUInt),
+
+    # HLDirectoryItem *hlFolderGetItem(HLDirectoryItem *pItem, hlUInt uiIndex);
+    "hlFolderGetItem": ([hlVoidPtr, hlUInt], hlVoidPtr),
+
+    # HLDirectoryItem *hlFolderGetItemByName(HLDirectoryItem *pItem,
+    #       const hlChar *lpName, HLFindType eFind);
+    "hlFolderGetItemByName": ([hlVoidPtr, hlString, hlInt], hlVoidPtr),
+
+    # HLDirectoryItem *hlFolderGetItemByPath(HLDirectoryItem *pItem,
+    #       const hlChar *lpPath, HLFindType eFind);
+    "hlFolderGetItemByPath": ([hlVoidPtr, hlString, hlInt], hlVoidPtr),
+
+    # hlVoid hlFolderSort(HLDirectoryItem *pItem,
+    #       HLSortField eField, HLSortOrder eOrder, hlBool bRecurse);
+    "hlFolderSort": ([hlVoidPtr, hlInt, hlInt, hlBool], None),
+
+    # HLDirectoryItem *hlFolderFindFirst(HLDirectoryItem *pFolder,
+    #       const hlChar *lpSearch, HLFindType eFind);
+    "hlFolderFindFirst": ([hlVoidPtr, hlString, hlInt], hlVoidPtr),
+
+    # HLDirectoryItem *hlFolderFindNext(HLDirectoryItem *pFolder,
+    #       HLDirectoryItem *pItem, const hlChar *lpSearch, HLFindType eFind);
+    "hlFolderFindNext": ([hlVoidPtr, hlVoidPtr, hlString, hlInt], hlVoidPtr),
+
+    # hlUInt hlFolderGetSize(const HLDirectoryItem *pItem, hlBool bRecurse);
+    "hlFolderGetSize": ([hlVoidPtr, hlBool], hlUInt),
+
+    # hlULongLong hlFolderGetSizeEx(const HLDirectoryItem *pItem,
+    #       hlBool bRecurse);
+    "hlFolderGetSizeEx": ([hlVoidPtr, hlBool], hlULongLong),
+
+    # hlUInt hlFolderGetSizeOnDisk(const HLDirectoryItem *pItem,
+    #       hlBool bRecurse);
+    "hlFolderGetSizeOnDisk": ([hlVoidPtr, hlBool], hlUInt),
+
+    # hlULongLong hlFolderGetSizeOnDiskEx(const HLDirectoryItem *pItem,
+    #       hlBool bRecurse);
+    "hlFolderGetSizeOnDiskEx": ([hlVoidPtr, hlBool], hlULongLong),
+
+    # hlUInt hlFolderGetFolderCount(const HLDirectoryItem *pItem,
+    #       hlBool bRecurse);
+    "hlFolderGetFolderCount": ([hlVoidPtr, hlBool], hlUInt),
+
+    # hlUInt hlFolderGetFileCount(const HLDirectoryItem *pItem,
+    #       hlBool bRecurse);
+    "hlFolderGetFileCount": ([hlVoidPtr, hlBool], hlUInt),
+
+    # Directory File
+
+    # hlUInt hlFileGetExtractable(const HLDirectoryItem *pItem);
+    "hlFileGetExtractable": ([hlVoidPtr], hlUInt),
+
+    # HLValidation hlFileGetValidation(const HLDirectoryItem *pItem);
+    "hlFileGetValidation": ([hlVoidPtr], hlInt),
+
+    # hlUInt hlFileGetSize(const HLDirectoryItem *pItem);
+    "hlFileGetSize": ([hlVoidPtr], hlUInt),
+
+    # hlUInt hlFileGetSizeOnDisk(const HLDirectoryItem *pItem);
+    "hlFileGetSizeOnDisk": ([hlVoidPtr], hlUInt),
+
+    # hlBool hlFileCreateStream(HLDirectoryItem *pItem, HLStream **pStream);
+    "hlFileCreateStream": ([hlVoidPtr, hlVoidPtr], hlBool),
+
+    # hlVoid hlFileReleaseStream(HLDirectoryItem *pItem, HLStream *pStream);
+    "hlFileReleaseStream": ([hlVoidPtr, hlVoidPtr], None),
+
+    # Stream
+
+    # HLStreamType hlStreamGetType(const HLStream *pStream);
+    "hlStreamGetType": ([hlVoidPtr], hlInt),
+
+    # hlBool hlStreamGetOpened(const HLStream *pStream);
+    "hlStreamGetOpened": ([hlVoidPtr], hlBool),
+
+    # hlUInt hlStreamGetMode(const HLStream *pStream);
+    "hlStreamGetMode": ([hlVoidPtr], hlUInt),
+
+    # hlBool hlStreamOpen(HLStream *pStream, hlUInt uiMode);
+    "hlStreamOpen": ([hlVoidPtr, hlUInt], hlBool),
+
+    # hlVoid hlStreamClose(HLStream *pStream);
+    "hlStreamClose": ([hlVoidPtr], None),
+
+    # hlUInt hlStreamGetStreamSize(const HLStream *pStream);
+    "hlStreamGetStreamSize": ([hlVoidPtr], hlUInt),
+
+    # hlULongLong hlStreamGetStreamSizeEx(const HLStream *pStream);
+    "hlStreamGetStreamSizeEx": ([hlVoidPtr], hlULongLong),
+
+    # hlUInt hlStreamGetStreamPointer(const HLStream *pStream);
+    "hlStreamGetStreamPointer": ([hlVoidPtr], hlUInt),
+
+    # hlULongLong hlStreamGetStreamPointerEx(const HLStream *pStream);
+    "hlStreamGetStreamPointerEx": ([hlVoidPtr], hlULongLong),
+
+    # hlUInt hlStreamSeek(HLStream *pStream,
+    #       hlLongLong iOffset, HLSeekMode eSeekMode);
+    "hlStreamSeek": ([hlVoidPtr, hlLongLong, hlInt], hlUInt),
+
+    # hlULongLong hlStreamSeekEx(HLStream *pStream,
+    #       hlLongLong iOffset, HLSeekMode eSeekMode);
+    "hlStreamSeekEx": ([hlVoidPtr, hlLongLong, hlInt], hlULongLong),
+
+    # hlBool hlStreamReadChar(HLStream *pStream, hlChar *pChar);
+    "hlStreamReadChar": ([hlVoidPtr, hlString], hlBool),
+
+    # hlUInt hlStreamRead(HLStream *pStream, hlVoid *lpData, hlUInt uiBytes);
+    "hlStreamRead": ([hlVoidPtr, hlVoidPtr, hlUInt], hlUInt),
+
+    # hlBool hlStreamWriteChar(HLStream *pStream, hlChar iChar);
+    "hlStreamWriteChar": ([hlVoidPtr, hlChar], hlBool),
+
+    # hlUInt hlStreamWrite(HLStream *pStream,
+    #       const hlVoid *lpData, hlUInt uiBytes);
+    "hlStreamWrite": ([hlVoidPtr, hlVoidPtr, hlUInt], hlUInt),
+
+    # Package
+
+    # hlBool hlBindPackage(hlUInt uiPackage);
+    "hlBindPackage": ([hlUInt], hlBool),
+
+    # HLPackageType hlGetPackageTypeFromName(const hlChar *lpName);
+    "hlGetPackageTypeFromName": ([hlString], hlInt),
+
+    # HLPackageType hlGetPackageTypeFromMemory(const hlVoid *lpBuffer,
+    #       hlUInt uiBufferSize);
+    "hlGetPackageTypeFromMemory": ([hlVoidPtr, hlUInt], hlInt),
+
+    # HLPackageType hlGetPackageTypeFromStream(HLStream *pStream);
+    "hlGetPackageTypeFromStream": ([hlVoidPtr], hlInt),
+
+    # hlBool hlCreatePackage(HLPackageType ePackageType, hlUInt *uiPackage);
+    "hlCreatePackage": ([hlInt, _c.POINTER(hlUInt)], hlBool),
+
+    # hlVoid hlDeletePackage(hlUInt uiPackage);
+    "hlDeletePackage": ([hlUInt], None),
+
+    # HLPackageType hlPackageGetType();
+    "hlPackageGetType": ([], hlInt),
+
+    # const hlChar *hlPackageGetExtension();
+    "hlPackageGetExtension": ([], hlString),
+
+    # const hlChar *hlPackageGetDescription();
+    "hlPackageGetDescription": ([], hlString),
+
+    # hlBool hlPackageGetOpened();
+    "hlPackageGetOpened": ([], hlBool),
+
+    # hlBool hlPackageOpenFile(const hlChar *lpFileName, hlUInt uiMode);
+    "hlPackageOpenFile": ([hlString, hlUInt], hlBool),
+
+    # hlBool hlPackageOpenMemory(hlVoid *lpData,
+    #       hlUInt uiBufferSize, hlUInt uiMode);
+    "hlPackageOpenMemory": ([hlVoidPtr, hlUInt, hlUInt], hlBool),
+
+    # hlBool hlPackageOpenProc(hlVoid *pUserData, hlUInt uiMode);
+    "hlPackageOpenProc": ([hlVoidPtr, hlUInt], hlBool),
+
+    # hlBool hlPackageOpenStream(HLStream *pStream, hlUInt uiMode);
+    "hlPackageOpenStream": ([hlVoidPtr, hlUInt], hlBool),
+
+    # hlVoid hlPackageClose();
+    "hlPackageClose": ([], None),
+
+    # hlBool hlPackageDefragment();
+    "hlPackageDefragment": ([], hlBool),
+
+    # HLDirectoryItem *hlPackageGetRoot();
+    "hlPackageGetRoot": ([], hlVoidPtr),
+
+    # hlUInt hlPackageGetAttributeCount();
+    "hlPackageGetAttributeCount": ([], hlUInt),
+
+    # const hlChar *hlPackageGetAttributeName(HLPackageAttribute eAttribute);
+    "hlPackageGetAttributeName": ([hlInt], hlString),
+
+    # hlBool hlPackageGetAttribute(HLPackageAttribute eAttribute,
+    #       HLAttribute *pAttribute);
+    "hlPackageGetAttribute": ([hlInt, _c.POINTER(HLAttribute)], hlBool),
+
+    # hlUInt hlPackageGetItemAttributeCount();
+    "hlPackageGetItemAttributeCount": ([], hlUInt),
+
+    # const hlChar *hlPackageGetItemAttributeName(,
+    #       HLPackageAttribute eAttribute);
+    "hlPackageGetItemAttributeName": ([hlInt], hlString),
+
+    # hlBool hlPackageGetItemAttribute(const HLDirectoryItem *pItem,
+    #       HLPackageAttribute eAttribute, HLAttribute *pAttribute);
+    "hlPackageGetItemAttribute": (
+            [hlVoidPtr, hlInt, _c.POINTER(HLAttribute)], hlBool),
+
+    # hlBool hlPackageGetExtractable(const HLDirectoryItem *pFile,
+    #       hlBool *pExtractable);
+    "hlPackageGetExtractable": ([hlVoidPtr, _c.POINTER(hlBool)], hlBool),
+
+    # hlBool hlPackageGetFileSize(const HLDirectoryItem *pFile, hlUInt *pSize);
+    "hlPackageGetFileSize": ([hlVoidPtr, _c.POINTER(hlUInt)], hlBool),
+
+    # hlBool hlPackageGetFileSizeOnDisk(const HLDirectoryItem *pFile,
+    #       hlUInt *pSize);
+    "hlPackageGetFileSizeOnDisk": ([hlVoidPtr, _c.POINTER(hlUInt)], hlBool),
+
+    # hlBool hlPackageCreateStream(const HLDirectoryItem *pFile,
+    #       HLStream **pStream);
+    "hlPackageCreateStream": ([hlVoidPtr, _c.POINTER(hlVoidPtr)], hlBool),
+
+    # hlVoid hlPackageReleaseStream(HLStream *pStream);
+    "hlPackageReleaseStream": ([hlVoidPtr], None),
+
+    # const hlChar *hlNCFFileGetRootPath();
+    "hlNCFFileGetRootPath": ([], hlString),
+
+    # hlVoid hlNCFFileSetRootPath(const hlChar *lpRootPath);
+    "hlNCFFileSetRootPath": ([], None),
+
+    # hlBool hlWADFileGetImageSizePaletted(const HLDirectoryItem *pFile,
+    #       hlUInt *uiPaletteDataSize, hlUInt *uiPixelDataSize);
+    "hlWADFileGetImageSizePaletted": (
+            [hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt)], hlBool),
+
+    # hlBool hlWADFileGetImageDataPaletted(const HLDirectoryItem *pFile,
+    #       hlUInt *uiWidth, hlUInt *uiHeight, hlByte **lpPaletteData,
+    #       hlByte **lpPixelData);
+    "hlWADFileGetImageDataPaletted": ([
+            hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt),
+            _c.POINTER(hlByte), _c.POINTER(hlByte)], hlBool),
+
+    # hlBool hlWADFileGetImageSize(const HLDirectoryItem *pFile,
+    #       hlUInt *uiPixelDataSize);
+    "hlWADFileGetImageSize": ([hlVoidPtr, hlUInt], hlBool),
+
+    # hlBool hlWADFileGetImageData(const HLDirectoryItem *pFile,
+    #       hlUInt *uiWidth, hlUInt *uiHeight, hlByte **lpPixelData);
+    "hlWADFileGetImageData": ([
+            hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt),
+            _c.POINTER(_c.POINTER(hlByte))], hlBool),
+}
 
-# Package
-
-# hlBool hlBindPackage(hlUInt uiPackage);
-_hl.hlBindPackage.argtypes = [hlUInt]
-_hl.hlBindPackage.restype = hlBool
-
-# HLPackageType hlGetPackageTypeFromName(const hlChar *lpName);
-_hl.hlGetPackageTypeFromName.argtypes = [hlString]
-_hl.hlGetPackageTypeFromName.restype = hlInt
-
-# HLPackageType hlGetPackageTypeFromMemory(const hlVoid *lpBuffer,
-#       hlUInt uiBufferSize);
-_hl.hlGetPackageTypeFromMemory.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlGetPackageTypeFromMemory.restype = hlInt
-
-# HLPackageType hlGetPackageTypeFromStream(HLStream *pStream);
-_hl.hlGetPackageTypeFromStream.argtypes = [hlVoidPtr]
-_hl.hlGetPackageTypeFromStream.restype = hlInt
-
-# hlBool hlCreatePackage(HLPackageType ePackageType, hlUInt *uiPackage);
-_hl.hlCreatePackage.argtypes = [hlInt, _c.POINTER(hlUInt)]
-_hl.hlCreatePackage.restype = hlBool
-
-# hlVoid hlDeletePackage(hlUInt uiPackage);
-_hl.hlDeletePackage.argtypes = [hlUInt]
-_hl.hlDeletePackage.restype = None
-
-# HLPackageType hlPackageGetType();
-_hl.hlPackageGetType.argtypes = []
-_hl.hlPackageGetType.restype = hlInt
-
-# const hlChar *hlPackageGetExtension();
-_hl.hlPackageGetExtension.argtypes = []
-_hl.hlPackageGetExtension.restype = hlString
-
-# const hlChar *hlPackageGetDescription();
-_hl.hlPackageGetDescription.argtypes = []
-_hl.hlPackageGetDescription.restype = hlString
-
-# hlBool hlPackageGetOpened();
-_hl.hlPackageGetOpened.argtypes = []
-_hl.hlPackageGetOpened.restype = hlBool
-
-# hlBool hlPackageOpenFile(const hlChar *lpFileName, hlUInt uiMode);
-_hl.hlPackageOpenFile.argtypes = [hlString, hlUInt]
-_hl.hlPackageOpenFile.restype = hlBool
-
-# hlBool hlPackageOpenMemory(hlVoid *lpData,
-#       hlUInt uiBufferSize, hlUInt uiMode);
-_hl.hlPackageOpenMemory.argtypes = [hlVoidPtr, hlUInt, hlUInt]
-_hl.hlPackageOpenMemory.restype = hlBool
-
-# hlBool hlPackageOpenProc(hlVoid *pUserData, hlUInt uiMode);
-_hl.hlPackageOpenProc.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlPackageOpenProc.restype = hlBool
-
-# hlBool hlPackageOpenStream(HLStream *pStream, hlUInt uiMode);
-_hl.hlPackageOpenStream.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlPackageOpenStream.restype = hlBool
-
-# hlVoid hlPackageClose();
-_hl.hlPackageClose.argtypes = []
-_hl.hlPackageClose.restype = None
-
-# hlBool hlPackageDefragment();
-_hl.hlPackageDefragment.argtypes = []
-_hl.hlPackageDefragment.restype = hlBool
-
-# HLDirectoryItem *hlPackageGetRoot();
-_hl.hlPackageGetRoot.argtypes = []
-_hl.hlPackageGetRoot.restype = hlVoidPtr
-
-# hlUInt hlPackageGetAttributeCount();
-_hl.hlPackageGetAttributeCount.argtypes = []
-_hl.hlPackageGetAttributeCount.restype = hlUInt
-
-# const hlChar *hlPackageGetAttributeName(HLPackageAttribute eAttribute);
-_hl.hlPackageGetAttributeName.argtypes = [hlInt]
-_hl.hlPackageGetAttributeName.restype = hlString
-
-# hlBool hlPackageGetAttribute(HLPackageAttribute eAttribute,
-#       HLAttribute *pAttribute);
-_hl.hlPackageGetAttribute.argtypes = [hlInt, _c.POINTER(HLAttribute)]
-_hl.hlPackageGetAttribute.restype = hlBool
-
-# hlUInt hlPackageGetItemAttributeCount();
-_hl.hlPackageGetItemAttributeCount.argtypes = []
-_hl.hlPackageGetItemAttributeCount.restype = hlUInt
-
-# const hlChar *hlPackageGetItemAttributeName(HLPackageAttribute eAttribute);
-_hl.hlPackageGetItemAttributeName.argtypes = [hlInt]
-_hl.hlPackageGetItemAttributeName.restype = hlString
-
-# hlBool hlPackageGetItemAttribute(const HLDirectoryItem *pItem,
-#       HLPackageAttribute eAttribute, HLAttribute *pAttribute);
-_hl.hlPackageGetItemAttribute.argtypes = [
-        hlVoidPtr, hlInt, _c.POINTER(HLAttribute)]
-_hl.hlPackageGetItemAttribute.restype = hlBool
-
-# hlBool hlPackageGetExtractable(const HLDirectoryItem *pFile,
-#       hlBool *pExtractable);
-_hl.hlPackageGetExtractable.argtypes = [hlVoidPtr, _c.POINTER(hlBool)]
-_hl.hlPackageGetExtractable.restype = hlBool
-
-# hlBool hlPackageGetFileSize(const HLDirectoryItem *pFile, hlUInt *pSize);
-_hl.hlPackageGetFileSize.argtypes = [hlVoidPtr, _c.POINTER(hlUInt)]
-_hl.hlPackageGetFileSize.restype = hlBool
-
-# hlBool hlPackageGetFileSizeOnDisk(const HLDirectoryItem *pFile,
-#       hlUInt *pSize);
-_hl.hlPackageGetFileSizeOnDisk.argtypes = [hlVoidPtr, _c.POINTER(hlUInt)]
-_hl.hlPackageGetFileSizeOnDisk.restype = hlBool
-
-# hlBool hlPackageCreateStream(const HLDirectoryItem *pFile,
-#       HLStream **pStream);
-_hl.hlPackageCreateStream.argtypes = [hlVoidPtr, _c.POINTER(hlVoidPtr)]
-_hl.hlPackageCreateStream.restype = hlBool
-
-# hlVoid hlPackageReleaseStream(HLStream *pStream);
-_hl.hlPackageReleaseStream.argtypes = [hlVoidPtr]
-_hl.hlPackageReleaseStream.restype = None
-
-# const hlChar *hlNCFFileGetRootPath();
-_hl.hlNCFFileGetRootPath.argtypes = []
-_hl.hlNCFFileGetRootPath.restype = hlString
-
-# hlVoid hlNCFFileSetRootPath(const hlChar *lpRootPath);
-_hl.hlNCFFileSetRootPath.argtypes = []
-_hl.hlNCFFileSetRootPath.restype = None
-
-# hlBool hlWADFileGetImageSizePaletted(const HLDirectoryItem *pFile,
-#       hlUInt *uiPaletteDataSize, hlUInt *uiPixelDataSize);
-_hl.hlWADFileGetImageSizePaletted.argtypes = [
-        hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt)]
-_hl.hlWADFileGetImageSizePaletted.restype = hlBool
-
-# hlBool hlWADFileGetImageDataPaletted(const HLDirectoryItem *pFile,
-#       hlUInt *uiWidth, hlUInt *uiHeight, hlByte **lpPaletteData,
-#       hlByte **lpPixelData);
-_hl.hlWADFileGetImageDataPaletted.argtypes = [
-        hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt),
-        _c.POINTER(hlByte), _c.POINTER(hlByte)]
-_hl.hlWADFileGetImageDataPaletted.restype = hlBool
-
-# hlBool hlWADFileGetImageSize(const HLDirectoryItem *pFile,
-#       hlUInt *uiPixelDataSize);
-_hl.hlWADFileGetImageSize.argtypes = [hlVoidPtr, hlUInt]
-_hl.hlWADFileGetImageSize.restype = hlBool
-
-# hlBool hlWADFileGetImageData(const HLDirectoryItem *pFile,
-#       hlUInt *uiWidth, hlUInt *uiHeight, hlByte **lpPixelData);
-_hl.hlWADFileGetImageData.argtypes = [
-        hlVoidPtr, _c.POINTER(hlUInt), _c.POINTER(hlUInt),
-        _c.POINTER(_c.POINTER(hlByte))]
-_hl.hlWADFileGetImageData.restype = hlBool
-
-
-# Version Check
-
-_version_number = get_value(HLOption.HL_VERSION, hlUInt)
-
-if HL_VERSION_NUMBER != _version_number:
-    raise HLError("Python module version ({0}) and C library version ({1}) "
-            "do not match.".format(HL_VERSION_NUMBER, _version_number))
+if _os.environ.get("HLLIB_PROFILE"):
+    enable_profiling()
@@ -0,0 +1,626 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import collections
+import hllib as hl
+import multiprocessing
+import multiprocessing.pool
+import struct
+import time
+import zlib
+
+try:
+    import lzma
+except ImportError:
+    # Python 2 has no lzma module.
+    lzma = None
+
+args = None
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP_LZMA = 14
+
+COMPRESSION_METHODS = {
+    "store": ZIP_STORED,
+    "deflate": ZIP_DEFLATED,
+    "lzma": ZIP_LZMA,
+}
+
+READ_CHUNK_SIZE = 1 << 20
+
+# Files larger than this are split into READ_CHUNK_SIZE chunks as they
+# are read, compressed chunk by chunk on the thread pool and streamed
+# into the archive, rather than read whole.
+STREAM_SIZE = 16 << 20
+
+# Dictionary sizes used by xz for presets 0 through 9.
+LZMA_DICT_SIZES = [1 << 18, 1 << 20, 1 << 21, 1 << 22, 1 << 22,
+        1 << 23, 1 << 23, 1 << 24, 1 << 25, 1 << 26]
+
+
+def main():
+    global args
+    args = parse_arguments()
+
+    hl.initialize()
+
+    package_opened = False
+    package_created = False
+
+    try:
+        package_type = hl.Package.get_package_type_from_file(args.package)
+
+        if package_type == hl.HLPackageType.HL_PACKAGE_NONE:
+            raise hl.HLError("Error loading {0}:\nUnsupported "
+                    "package type.".format(args.package))
+
+        package_id = hl.Package.create_package(package_type)
+        package_created = True
+
+        hl.Package.bind_package(package_id)
+
+        hl.Package.open_file(args.package, get_file_mode())
+        package_opened = True
+
+        if package_type == hl.HLPackageType.HL_PACKAGE_NCF:
+            hl.NCFFile.set_root_path(args.ncfroot)
+
+        if not args.silent:
+            print(args.package + " opened.")
+
+        start = time.time()
+
+        with open(args.output, "wb") as f:
+            writer = ZipWriter(f)
+            file_count, byte_count = repack(hl.Package.get_root(), writer,
+                    COMPRESSION_METHODS[args.compression], args.level,
+                    args.jobs)
+            writer.close()
+
+        if not args.silent:
+            elapsed = max(time.time() - start, 1e-6)
+            print("\nWrote {0} file{1} ({2} B) to {3} in {4:.1f} s "
+                    "({5:.1f} MB/s).".format(file_count,
+                    "" if file_count == 1 else "s", byte_count,
+                    args.output, elapsed, byte_count / elapsed / 1e6))
+
+    finally:
+        if package_opened:
+            hl.Package.close()
+
+            if not args.silent:
+                print(args.package + " closed.")
+
+        if package_created:
+            hl.Package.delete_package(package_id)
+
+        hl.shutdown()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(
+            description="Convert a package to a ZIP archive.")
+
+    parser.add_argument('-p', '--package', required=True,
+            help='Package to load.')
+
+    parser.add_argument('-o', '--output', required=True,
+            help='Archive to write.')
+
+    parser.add_argument('-c', '--compression', default="deflate",
+            choices=sorted(COMPRESSION_METHODS),
+            help='Compression method for archive entries.')
+
+    parser.add_argument('-l', '--level', type=int, default=6,
+            choices=range(10), metavar="{0-9}",
+            help='Compression level.')
+
+    parser.add_argument('-j', '--jobs', type=int,
+            default=multiprocessing.cpu_count(),
+            help='Number of compression threads.')
+
+    parser.add_argument('-s', '--silent', action='store_true',
+            help='Silent mode.')
+
+    parser.add_argument('-m', '--filemapping', action='store_true',
+            help='Use file mapping.')
+
+    parser.add_argument('-q', '--quick-filemapping', action='store_true',
+            help='Use quick file mapping.')
+
+    parser.add_argument('-v', '--volatile', action='store_true',
+            help='Allow volatile access.')
+
+    parser.add_argument('-n', '--ncfroot',
+            help="NCF file's root path.")
+
+    return parser
+
+
+def parse_arguments():
+    parser = get_argument_parser()
+    args = parser.parse_args()
+
+    if args.quick_filemapping:
+        args.filemapping = True
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1.")
+
+    if args.compression == "lzma" and lzma is None:
+        parser.error("LZMA compression requires the lzma module.")
+
+    return args
+
+
+def get_file_mode():
+    file_mode = hl.HLFileMode.HL_MODE_READ
+
+    if not args.filemapping:
+        file_mode |= hl.HLFileMode.HL_MODE_NO_FILEMAPPING
+
+    if args.quick_filemapping:
+        file_mode |= hl.HLFileMode.HL_MODE_QUICK_FILEMAPPING
+
+    if args.volatile:
+        file_mode |= hl.HLFileMode.HL_MODE_VOLATILE
+
+    return file_mode
+
+
+def repack(folder, writer, method, level, jobs, max_pending_bytes=1 << 28):
+    """Writes every file in folder to writer, compressing in parallel.
+
+    Files are read through streams on the calling thread, since HLLib
+    is not thread-safe, and compressed on a pool of threads. zlib and
+    lzma release the GIL while compressing. Entries are written in
+    directory order, and at most max_pending_bytes of uncompressed data
+    (or 4 files per thread) are held in memory at once. Files larger
+    than STREAM_SIZE are instead streamed through the writer a chunk at
+    a time, once the pending files are written (see write_large_file()).
+
+    Returns:
+        A tuple of the number of files and bytes written.
+    """
+    pool = multiprocessing.pool.ThreadPool(jobs)
+    pending = collections.deque()
+    pending_bytes = 0
+    file_count = byte_count = 0
+
+    try:
+        for path, directory_file in folder.iter_files():
+            if not directory_file.get_extractable():
+                if not args.silent:
+                    print("  Skipping {0}: not extractable.".format(path))
+                continue
+
+            size = directory_file.get_size()
+
+            if size > STREAM_SIZE:
+                while pending:
+                    pending_bytes -= write_pending(writer, pending)
+
+                write_large_file(writer, pool, path, directory_file, method,
+                        level, size, jobs)
+
+                if not args.silent:
+                    print("  {0}: OK ({1} B)".format(path, size))
+
+                file_count += 1
+                byte_count += size
+                continue
+
+            data = read_file(directory_file)
+            result = pool.apply_async(compress, (data, method, level))
+            pending.append((path, len(data), result))
+            pending_bytes += len(data)
+
+            while pending and (pending_bytes > max_pending_bytes or
+                    len(pending) >= jobs * 4):
+                pending_bytes -= write_pending(writer, pending)
+
+            file_count += 1
+            byte_count += len(data)
+
+        while pending:
+            write_pending(writer, pending)
+    finally:
+        pool.terminate()
+
+    return file_count, byte_count
+
+
+def write_pending(writer, pending):
+    """Writes the oldest pending entry and returns its size."""
+    path, size, result = pending.popleft()
+    method, crc, payload = result.get()
+    writer.write_entry(path, method, crc, size, payload)
+
+    if not args.silent:
+        print("  {0}: OK ({1} B)".format(path, size))
+
+    return size
+
+
+def write_large_file(writer, pool, path, directory_file, method, level,
+        size, jobs):
+    """Writes a file too large to hold in memory, compressing in parallel.
+
+    If compression does not shrink the data, the entry is written again,
+    stored, which means reading the file a second time.
+    """
+    compressed_size = writer.write_stream_entry(path, method, size,
+            compress_chunks(pool, directory_file.iter_chunks(READ_CHUNK_SIZE),
+            method, level, jobs))
+
+    if method != ZIP_STORED and compressed_size >= size:
+        writer.remove_last_entry()
+        writer.write_stream_entry(path, ZIP_STORED, size,
+                compress_chunks(pool,
+                directory_file.iter_chunks(READ_CHUNK_SIZE), ZIP_STORED,
+                level, jobs))
+
+
+def compress_chunks(pool, chunks, method, level, jobs):
+    """Compresses consecutive chunks of a file's data.
+
+    Deflate chunks are compressed on pool, each by its own compressor
+    ending in a full flush (a finish for the last chunk), so that their
+    output joins into one deflate stream, as pigz does. A raw LZMA
+    stream cannot be split like that, so LZMA chunks are compressed in
+    order on the calling thread.
+
+    Yields:
+        Tuples of the CRC-32 and length of a chunk, and the payload bytes
+        it compressed to, in order, for ZipWriter.write_stream_entry().
+    """
+    if method == ZIP_LZMA:
+        prefix, compressor = get_compressor(method, level)
+        yield 0, 0, prefix
+
+        for chunk in chunks:
+            yield (zlib.crc32(chunk) & 0xffffffff, len(chunk),
+                    compressor.compress(chunk))
+
+        yield 0, 0, compressor.flush()
+        return
+
+    pending = collections.deque()
+    chunks = iter(chunks)
+    chunk = next(chunks, None)
+
+    while chunk is not None:
+        next_chunk = next(chunks, None)
+        pending.append(pool.apply_async(compress_chunk,
+                (chunk, method, level, next_chunk is None)))
+        chunk = next_chunk
+
+        if len(pending) >= jobs * 4:
+            yield pending.popleft().get()
+
+    while pending:
+        yield pending.popleft().get()
+
+
+def compress_chunk(data, method, level, final):
+    """Compresses one chunk of a file for compress_chunks().
+
+    Returns:
+        A tuple of the CRC-32 and length of data, and the payload bytes.
+    """
+    crc = zlib.crc32(data) & 0xffffffff
+
+    if method == ZIP_DEFLATED:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        payload = compressor.compress(data) + compressor.flush(
+                zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+    else:
+        payload = data
+
+    return crc, len(data), payload
+
+
+def crc32_combine(crc1, crc2, length2):
+    """Returns the CRC-32 of two pieces of data joined together.
+
+    Ported from zlib's crc32_combine(), which the zlib module does not
+    expose.
+
+    Args:
+        crc1: The CRC-32 of the first piece.
+
+        crc2: The CRC-32 of the second piece.
+
+        length2: The length of the second piece.
+    """
+    if length2 <= 0:
+        return crc1
+
+    shift = _crc32_shifts.get(length2)
+
+    if shift is None:
+        # Operator for one zero bit, then squared up to eight (a byte).
+        odd = [0xedb88320] + [1 << n for n in range(31)]
+        shift = _gf2_matrix_square(_gf2_matrix_square(
+                _gf2_matrix_square(odd)))
+        total = [1 << n for n in range(32)]
+        length = length2
+
+        while length:
+            if length & 1:
+                total = [_gf2_matrix_times(shift, v) for v in total]
+
+            length >>= 1
+
+            if length:
+                shift = _gf2_matrix_square(shift)
+
+        shift = _crc32_shifts[length2] = total
+
+    return _gf2_matrix_times(shift, crc1) ^ crc2
+
+
+# Memoized crc32_combine() operators by length. Every chunk of a file
+# but the last has the same length, so there are few of them.
+_crc32_shifts = {}
+
+
+def _gf2_matrix_times(matrix, vector):
+    total = 0
+    i = 0
+
+    while vector:
+        if vector & 1:
+            total ^= matrix[i]
+
+        vector >>= 1
+        i += 1
+
+    return total
+
+
+def _gf2_matrix_square(matrix):
+    return [_gf2_matrix_times(matrix, row) for row in matrix]
+
+
+def read_file(directory_file):
+    """Returns the contents of directory_file as a bytearray."""
+    data = bytearray()
+
+    for chunk in directory_file.iter_chunks(READ_CHUNK_SIZE):
+        data += chunk
+
+    return data
+
+
+def compress(data, method, level):
+    """Compresses data for storage in a ZIP archive.
+
+    Falls back to storing the data if compression does not shrink it.
+
+    Returns:
+        A tuple of the ZIP compression method used, the CRC-32 of data,
+        and the bytes to store.
+    """
+    crc = zlib.crc32(data) & 0xffffffff
+    prefix, compressor = get_compressor(method, level)
+
+    if compressor is None:
+        payload = data
+    else:
+        payload = prefix + compressor.compress(data) + compressor.flush()
+
+    if method != ZIP_STORED and len(payload) >= len(data):
+        method, payload = ZIP_STORED, data
+
+    return method, crc, payload
+
+
+def get_compressor(method, level):
+    """Returns a compressor for a ZIP compression method.
+
+    Returns:
+        A tuple of the bytes the payload starts with, and an object with
+        compress() and flush() methods (None for ZIP_STORED).
+    """
+    if method == ZIP_DEFLATED:
+        return b"", zlib.compressobj(level, zlib.DEFLATED, -15)
+    elif method == ZIP_LZMA:
+        dict_size = LZMA_DICT_SIZES[level]
+        lzma_filter = {"id": lzma.FILTER_LZMA1, "preset": level,
+                "dict_size": dict_size, "lc": 3, "lp": 0, "pb": 2}
+        # LZMA properties: (pb * 5 + lp) * 9 + lc, then dictionary size.
+        properties = struct.pack("<BI", (2 * 5 + 0) * 9 + 3, dict_size)
+        return (struct.pack("<BBH", 9, 4, len(properties)) + properties,
+                lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[lzma_filter]))
+    else:
+        return b"", None
+
+
+class ZipWriter(object):
+    """Writes a ZIP archive from precompressed entries.
+
+    Unlike zipfile.ZipFile, entries are handed over already compressed,
+    so compression can happen elsewhere (e.g. on other threads). ZIP64
+    records are written when the archive outgrows the classic format.
+    """
+
+    def __init__(self, f):
+        """Initializes instance with a writable, binary file object."""
+        self._file = f
+        self._offset = 0
+        self._central_directory = []
+
+        now = time.localtime()
+        self._dos_time = ((now.tm_hour << 11) | (now.tm_min << 5) |
+                (now.tm_sec // 2))
+        self._dos_date = (((now.tm_year - 1980) << 9) |
+                (now.tm_mon << 5) | now.tm_mday)
+
+    def write_entry(self, name, method, crc, size, payload):
+        """Writes a single entry.
+
+        Args:
+            name: The entry's path within the archive.
+
+            method: The ZIP compression method payload was produced with.
+
+            crc: The CRC-32 of the uncompressed data.
+
+            size: The size of the uncompressed data. Must be less than
+                4 GiB.
+
+            payload: The compressed data.
+        """
+        self._write_local_header(name, method, crc, len(payload), size)
+        self._write(payload)
+
+    def write_stream_entry(self, name, method, size, pieces):
+        """Writes a single entry from its payload, as it comes.
+
+        The CRC-32 and compressed size in the entry's local header are
+        filled in afterwards, so the file must be seekable. ZIP64 extra
+        fields are written if size needs them.
+
+        Args:
+            name: The entry's path within the archive.
+
+            method: The ZIP compression method the payload was produced
+                with.
+
+            size: The size of the uncompressed data.
+
+            pieces: An iterable of tuples of the CRC-32 and length of a
+                piece of the data, and the payload bytes it produced, in
+                order (see compress_chunks()).
+
+        Returns:
+            The size of the payload.
+
+        Raises:
+            HLError: If the pieces do not add up to size.
+        """
+        header_offset = self._offset
+        self._write_local_header(name, method, 0, 0, size)
+        payload_offset = self._offset
+        crc = 0
+        length = 0
+
+        for piece_crc, piece_length, payload in pieces:
+            crc = crc32_combine(crc, piece_crc, piece_length)
+            length += piece_length
+            self._write(payload)
+
+        if length != size:
+            raise hl.HLError("Expected {0} B for {1}, got {2} B.".format(
+                    size, name, length))
+
+        compressed_size = self._offset - payload_offset
+        entry = self._central_directory[-1]
+        self._central_directory[-1] = (entry[:4] + (crc, compressed_size) +
+                entry[6:])
+
+        # Patch the CRC-32 and compressed size into the local header.
+        self._file.seek(header_offset + 14)
+
+        if size >= 0xffffffff:
+            self._file.write(struct.pack("<I", crc))
+            self._file.seek(header_offset + 30 + len(entry[0]) + 12)
+            self._file.write(struct.pack("<Q", compressed_size))
+        else:
+            self._file.write(struct.pack("<II", crc, compressed_size))
+
+        self._file.seek(0, 2)
+        return compressed_size
+
+    def remove_last_entry(self):
+        """Removes the last entry written, truncating the file."""
+        offset = self._central_directory.pop()[7]
+        self._file.seek(offset)
+        self._file.truncate()
+        self._offset = offset
+
+    def _write_local_header(self, name, method, crc, compressed_size, size):
+        flags = 0
+        version = 20
+        extra = b""
+
+        try:
+            name = name.encode("ascii")
+        except UnicodeError:
+            name = name.encode("utf-8")
+            flags |= 0x800
+
+        if method == ZIP_LZMA:
+            # The LZMA stream is terminated by an end of stream marker.
+            flags |= 0x02
+            version = 63
+
+        self._central_directory.append((name, flags, version, method, crc,
+                compressed_size, size, self._offset))
+
+        if size >= 0xffffffff:
+            extra = struct.pack("<HHQQ", 0x0001, 16, size, compressed_size)
+            compressed_size = size = 0xffffffff
+            version = max(version, 45)
+
+        header = struct.pack("<IHHHHHIIIHH", 0x04034b50, version, flags,
+                method, self._dos_time, self._dos_date, crc, compressed_size,
+                size, len(name), len(extra))
+
+        self._write(header)
+        self._write(name)
+        self._write(extra)
+
+    def close(self):
+        """Writes the central directory. Does not close the file."""
+        start = self._offset
+
+        for (name, flags, version, method, crc, compressed_size, size,
+                offset) in self._central_directory:
+            extra = b""
+
+            if size >= 0xffffffff:
+                extra += struct.pack("<QQ", size, compressed_size)
+                compressed_size = size = 0xffffffff
+                version = max(version, 45)
+
+            if offset >= 0xffffffff:
+                extra += struct.pack("<Q", offset)
+                offset = 0xffffffff
+                version = max(version, 45)
+
+            if extra:
+                extra = struct.pack("<HH", 0x0001, len(extra)) + extra
+
+            self._write(struct.pack("<IHHHHHHIIIHHHHHII", 0x02014b50,
+                    version, version, flags, method, self._dos_time,
+                    self._dos_date, crc, compressed_size, size, len(name),
+                    len(extra), 0, 0, 0, 0, offset))
+            self._write(name)
+            self._write(extra)
+
+        count = len(self._central_directory)
+        size = self._offset - start
+
+        if count > 0xffff or size > 0xffffffff or start > 0xffffffff:
+            end = self._offset
+            self._write(struct.pack("<IQHHIIQQQQ", 0x06064b50, 44, 45, 45,
+                    0, 0, count, count, size, start))
+            self._write(struct.pack("<IIQI", 0x07064b50, 0, end, 1))
+            count = min(count, 0xffff)
+            size = min(size, 0xffffffff)
+            start = min(start, 0xffffffff)
+
+        self._write(struct.pack("<IHHHHIIH", 0x06054b50, 0, 0, count,
+                count, size, start, 0))
+
+    def _write(self, data):
+        self._file.write(data)
+        self._offset += len(data)
+
+
+if __name__ == '__main__':
+    main()
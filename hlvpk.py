@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import argparse
+import hllib as hl
+import os
+import shutil
+import struct
+import tempfile
+import zlib
+
+args = None
+
+VPK_SIGNATURE = 0x55aa1234
+
+# Archive index of entries whose data follows the tree in the _dir.vpk.
+VPK_DIR_ARCHIVE_INDEX = 0x7fff
+
+VPK_MAX_PRELOAD_BYTES = 0xffff
+
+READ_CHUNK_SIZE = 1 << 20
+
+
+def main():
+    global args
+    args = parse_arguments()
+
+    writer = VPKWriter(args.output, args.version,
+            args.archive_size << 20, args.preload)
+
+    if args.directory:
+        add_directory(writer, args.directory)
+        writer.close()
+        return
+
+    hl.initialize()
+
+    package_opened = False
+    package_created = False
+
+    try:
+        package_type = hl.Package.get_package_type_from_file(args.package)
+
+        if package_type == hl.HLPackageType.HL_PACKAGE_NONE:
+            raise hl.HLError("Error loading {0}:\nUnsupported "
+                    "package type.".format(args.package))
+
+        package_id = hl.Package.create_package(package_type)
+        package_created = True
+
+        hl.Package.bind_package(package_id)
+
+        hl.Package.open_file(args.package, hl.HLFileMode.HL_MODE_READ)
+        package_opened = True
+
+        if package_type == hl.HLPackageType.HL_PACKAGE_NCF:
+            hl.NCFFile.set_root_path(args.ncfroot)
+
+        add_folder(writer, hl.Package.get_root())
+        writer.close()
+
+    finally:
+        if package_opened:
+            hl.Package.close()
+
+        if package_created:
+            hl.Package.delete_package(package_id)
+
+        hl.shutdown()
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(
+            description="Write a VPK from a directory or package.")
+    source_group = parser.add_mutually_exclusive_group(required=True)
+
+    source_group.add_argument('-d', '--directory',
+            help='Directory to pack.')
+
+    source_group.add_argument('-p', '--package',
+            help='Package to repack.')
+
+    parser.add_argument('-o', '--output', required=True,
+            help='Output path without suffix, e.g. "pak01" writes '
+            'pak01_dir.vpk, pak01_000.vpk, etc.')
+
+    parser.add_argument('--version', type=int, default=2, choices=(1, 2),
+            help='VPK version.')
+
+    parser.add_argument('-a', '--archive-size', type=int, default=200,
+            help='Maximum size of each numbered archive in MiB. 0 stores '
+            'all data in the _dir.vpk.')
+
+    parser.add_argument('--preload', type=int, default=0,
+            help='Number of leading bytes of each file to store in the '
+            'directory tree.')
+
+    parser.add_argument('-n', '--ncfroot',
+            help="NCF file's root path.")
+
+    return parser
+
+
+def parse_arguments():
+    parser = get_argument_parser()
+    args = parser.parse_args()
+
+    if args.archive_size < 0:
+        parser.error("--archive-size must not be negative.")
+
+    if not 0 <= args.preload <= VPK_MAX_PRELOAD_BYTES:
+        parser.error("--preload must be between 0 and {0}.".format(
+                VPK_MAX_PRELOAD_BYTES))
+
+    return args
+
+
+def add_directory(writer, directory):
+    """Adds every file beneath directory to writer."""
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names.sort()
+
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            path = os.path.relpath(file_path, directory)
+            path = path.replace(os.sep, "/")
+
+            with open(file_path, "rb") as f:
+                writer.add_file(path, os.fstat(f.fileno()).st_size,
+                        iter(lambda: f.read(READ_CHUNK_SIZE), b""))
+
+
+def add_folder(writer, folder):
+    """Adds every file in folder, an HLDirectoryFolder, to writer."""
+    for path, directory_file in folder.iter_files():
+        if not directory_file.get_extractable():
+            print("  Skipping {0}: not extractable.".format(path))
+            continue
+
+        writer.add_file(path, directory_file.get_size(),
+                directory_file.iter_chunks(READ_CHUNK_SIZE))
+
+
+class VPKWriter(object):
+    """Writes a VPK package.
+
+    File data is streamed into numbered archives (<base>_000.vpk,
+    <base>_001.vpk, etc.) as files are added, and the directory tree
+    is written to <base>_dir.vpk when the writer is closed. Each
+    file's CRC-32 is computed as its data is written.
+    """
+
+    def __init__(self, base_path, version=2, archive_size=200 << 20,
+            preload_size=0):
+        """Initializes the writer.
+
+        Args:
+            base_path: Output path without the "_dir.vpk" suffix.
+
+            version: The VPK version to write, 1 or 2.
+
+            archive_size: The maximum size of each numbered archive.
+                Files larger than this get an archive of their own. If
+                0, file data is stored in the _dir.vpk after the tree.
+
+            preload_size: The maximum number of leading bytes of each
+                file to store in the directory tree.
+        """
+        if version not in (1, 2):
+            raise hl.HLError("Unsupported VPK version {0}.".format(version))
+
+        self._base_path = base_path
+        self._version = version
+        self._archive_size = archive_size
+        self._preload_size = min(preload_size, VPK_MAX_PRELOAD_BYTES)
+        self._entries = {}
+        self._archive = None
+        self._archive_index = -1
+        self._archive_offset = 0
+
+        if archive_size == 0:
+            self._archive = tempfile.TemporaryFile()
+            self._archive_index = VPK_DIR_ARCHIVE_INDEX
+
+    def add_file(self, path, size, chunks):
+        """Adds a file.
+
+        Args:
+            path: The file's path within the package, using "/" as the
+                separator.
+
+            size: The size of the file in bytes.
+
+            chunks: An iterable of bytes objects holding the file's data.
+
+        Raises:
+            HLError: If the data is not size bytes long.
+        """
+        directory, _, base_name = path.rpartition("/")
+        name, dot, extension = base_name.rpartition(".")
+
+        # An empty name or extension would end a list in the tree, so
+        # dotfiles (".gitignore") and trailing dots ("README.") keep
+        # their whole name and get no extension.
+        if not dot or not name or not extension:
+            name, extension = base_name, ""
+
+        if not name:
+            raise hl.HLError("Invalid file path {0}.".format(path))
+
+        preload_length = min(size, self._preload_size)
+        length = size - preload_length
+
+        if length > 0:
+            self._reserve(length)
+
+        preload = bytearray()
+        crc = 0
+        offset = self._archive_offset
+        written = 0
+
+        try:
+            for chunk in chunks:
+                if len(preload) + written + len(chunk) > size:
+                    raise hl.HLError("Expected {0} B for {1}, got "
+                            "more.".format(size, path))
+
+                crc = zlib.crc32(chunk, crc)
+
+                if len(preload) < preload_length:
+                    take = preload_length - len(preload)
+                    preload += chunk[:take]
+                    chunk = chunk[take:]
+
+                if chunk:
+                    self._archive.write(chunk)
+                    written += len(chunk)
+
+            if len(preload) + written != size:
+                raise hl.HLError("Expected {0} B for {1}, got {2} B.".format(
+                        size, path, len(preload) + written))
+        except Exception:
+            if written:
+                # Drop the partial data, so the next file starts at offset.
+                self._archive.seek(offset)
+                self._archive.truncate()
+
+            raise
+
+        self._archive_offset += written
+
+        archive_index = self._archive_index if length else VPK_DIR_ARCHIVE_INDEX
+        extension_entries = self._entries.setdefault(extension or " ", {})
+        directory_entries = extension_entries.setdefault(directory or " ", [])
+        directory_entries.append((name, crc & 0xffffffff, bytes(preload),
+                archive_index, offset if length else 0, length))
+
+    def close(self):
+        """Writes the directory tree and finishes the package."""
+        if self._archive_index == VPK_DIR_ARCHIVE_INDEX:
+            data_size = self._archive_offset
+        else:
+            data_size = 0
+
+            if self._archive is not None:
+                self._archive.close()
+
+        tree = self._build_tree()
+
+        if self._version == 1:
+            header = struct.pack("<III", VPK_SIGNATURE, 1, len(tree))
+        else:
+            header = struct.pack("<IIIIIII", VPK_SIGNATURE, 2, len(tree),
+                    data_size, 0, 0, 0)
+
+        with open(self._base_path + "_dir.vpk", "wb") as f:
+            f.write(header)
+            f.write(tree)
+
+            if data_size:
+                self._archive.seek(0)
+                shutil.copyfileobj(self._archive, f)
+
+        if self._archive_index == VPK_DIR_ARCHIVE_INDEX:
+            self._archive.close()
+
+        self._archive = None
+
+    def _reserve(self, length):
+        """Starts a new archive if length bytes don't fit in this one."""
+        if self._archive_index == VPK_DIR_ARCHIVE_INDEX:
+            return
+
+        if (self._archive is None or (self._archive_offset > 0 and
+                self._archive_offset + length > self._archive_size)):
+            if self._archive is not None:
+                self._archive.close()
+
+            self._archive_index += 1
+            self._archive_offset = 0
+            self._archive = open("{0}_{1:03d}.vpk".format(
+                    self._base_path, self._archive_index), "wb")
+
+    def _build_tree(self):
+        tree = bytearray()
+
+        for extension in sorted(self._entries):
+            tree += extension.encode("utf-8") + b"\0"
+
+            for directory in sorted(self._entries[extension]):
+                tree += directory.encode("utf-8") + b"\0"
+
+                for (name, crc, preload, archive_index, offset,
+                        length) in self._entries[extension][directory]:
+                    tree += name.encode("utf-8") + b"\0"
+                    tree += struct.pack("<IHHIIH", crc, len(preload),
+                            archive_index, offset, length, 0xffff)
+                    tree += preload
+
+                tree += b"\0"
+
+            tree += b"\0"
+
+        tree += b"\0"
+
+        return bytes(tree)
+
+
+if __name__ == '__main__':
+    main()